@@ -0,0 +1,270 @@
+import asyncio
+from functools import partial
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from redis.asyncio import StrictRedis
+
+from aim_library.events.dedupe import make_dedupe_window
+from aim_library.events.janitor import make_janitor
+from aim_library.events.metrics import observe_ack, observe_decode, observe_handler
+from aim_library.events.redisstream import (
+    RedisStream,
+    assign_partitions,
+    complete_digest,
+    consumer_stop,
+    create_consumer_file,
+    decode_item,
+    drop_duplicates,
+    ensure_result,
+    fail_digest,
+    is_really_not_empty,
+    make_consumer_name,
+    maybe_decode,
+    maybe_retrieve_correlation_id,
+    maybe_start_metrics_server,
+    maybe_start_stream_trimmer,
+    make_stream_entry,
+    partition_stream,
+    prepare_digest,
+    produce_handler_started,
+    record_processed,
+    record_produced_event,
+    run_handler,
+    set_consumer_context,
+    split_by_handler,
+    xadd_entry,
+)
+from aim_library.utils.redisclients import get_async_redis_client
+
+
+class AsyncRedisStream:
+    __broker = None
+
+    @classmethod
+    def get_broker(cls) -> StrictRedis:
+        if not cls.__broker:
+            cls.__broker = get_async_redis_client("events-stream", "broker")
+        return cls.__broker
+
+    @classmethod
+    def set_broker(cls, broker) -> None:
+        cls.__broker = broker
+
+
+# What coroutine handlers produce with: produce_one and produce_many would block the event loop on the blocking
+# client. Partitions, retention, the event context and the correlation index are handled as they are there; only
+# claim checks, which may upload on a blocking client, go through a thread.
+async def make_stream_entry_async(name: str, event: Any, codec: str = None) -> dict:
+    if RedisStream.get_claim_check():
+        return await asyncio.to_thread(make_stream_entry, name, event, codec)
+    return make_stream_entry(name, event, codec)
+
+
+async def produce_one_async(
+    name: str, event: Any, maxlen: int = None, codec: str = None, approximate: bool = False
+) -> str:
+    name = partition_stream(name, event)
+    entry = await make_stream_entry_async(name, event, codec)
+    trim = RedisStream.get_retention().xadd_args(name, maxlen, approximate)
+    id_ = await xadd_entry(AsyncRedisStream.get_broker(), name, event, entry, **trim)
+    record_produced_event(name, event, id_)
+    return id_
+
+
+async def produce_many_async(
+    name: str, events: Iterable[Any], maxlen: int = None, codec: str = None, approximate: bool = False
+) -> List[str]:
+    events = list(events)
+    if not events:
+        return []
+    names = [partition_stream(name, event) for event in events]
+    entries = [await make_stream_entry_async(name, event, codec) for name, event in zip(names, events)]
+    retention = RedisStream.get_retention()
+    async with AsyncRedisStream.get_broker().pipeline(transaction=False) as pipe:
+        for name, event, entry in zip(names, events, entries):
+            xadd_entry(pipe, name, event, entry, **retention.xadd_args(name, maxlen, approximate))
+        ids = await pipe.execute()
+    for name, event, id_ in zip(names, events, ids):
+        record_produced_event(name, event, id_)
+    return ids
+
+
+async def maybe_create_consumer_groups_async(broker, consumer_groups_config):
+    streams = consumer_groups_config["streams"]
+    group_name = consumer_groups_config["name"]
+    for stream in streams:
+        if not await broker.exists(stream) or not any(
+            [group_name == group["name"].decode("utf-8") for group in await broker.xinfo_groups(stream)]
+        ):
+            try:
+                await broker.xgroup_create(stream, group_name, mkstream=True)
+                print(f"Consumer group '{group_name}' created for stream {stream}")
+            except:
+                pass  # Same race as in maybe_create_consumer_groups
+
+
+async def digest_event_async(
+    stream_name: str, event: Any, event_id: str, registered_handlers: dict, fields: dict = None
+) -> None:
+    handler = prepare_digest(stream_name, event, event_id, registered_handlers)
+    if handler is None:
+        return
+    # Log production goes through the blocking client, so it runs in a thread (with a copy of this task's
+    # context) like plain function handlers do.
+    if not asyncio.iscoroutinefunction(handler):
+        await asyncio.to_thread(run_handler, handler, stream_name, event, event_id, fields)
+        return
+    try:
+        await asyncio.to_thread(produce_handler_started, handler, event)
+        start = perf_counter()
+        try:
+            result = ensure_result(await handler(stream_name, event, event_id))
+        except Exception:
+            observe_handler(event.event_type.name, perf_counter() - start, ok=False)
+            raise
+        observe_handler(event.event_type.name, perf_counter() - start, ok=result.is_ok())
+        await asyncio.to_thread(complete_digest, stream_name, result)
+    except Exception as exc:
+        entries = [fields] if fields else None
+        await asyncio.to_thread(fail_digest, stream_name, exc, handler, [event], [event_id], entries)
+        return
+    await asyncio.to_thread(record_processed, [event])
+
+
+async def ack_entries_async(broker, stream, group_name, ids) -> None:
+    # ack_entries on the async client: the retry scheduler (blocking client) only runs for retries taken here.
+    await broker.xack(stream, group_name, *ids)
+    retries = RedisStream.get_retry_scheduler()
+    if retries is not None and retries.taken:
+        await asyncio.to_thread(retries.acked, group_name, stream, ids)
+
+
+async def digest_in_order_async(
+    broker, stream_name, event_id, event, fields, group_name, handlers, after: Optional[asyncio.Task] = None
+) -> None:
+    # `after` is the task of the previous event of the same document on this stream. This one waits for it and, if
+    # it failed, stays pending behind it: the PEL hands both back in order, as the sync consumers would.
+    if after is not None:
+        await asyncio.wait([after])
+        if after.cancelled() or after.exception() is not None:
+            return
+    await digest_event_async(stream_name, event, event_id, handlers, fields)
+    start = perf_counter()
+    await ack_entries_async(broker, stream_name, group_name, [event_id])
+    observe_ack(stream_name, perf_counter() - start)
+    create_consumer_file(stream_name)
+
+
+async def reap(tasks: Set[asyncio.Task]) -> None:
+    # Re-raises the first handler exception, the sync consumers crash on them too, but only once the other events in
+    # flight are digested and acknowledged (or left pending), like the drain when the consumer stops.
+    done = {task for task in tasks if task.done()}
+    tasks -= done
+    failed = [task.exception() for task in done if not task.cancelled() and task.exception() is not None]
+    if not failed:
+        return
+    if tasks:
+        await asyncio.wait(tasks)
+        failed += [task.exception() for task in tasks if not task.cancelled() and task.exception() is not None]
+        tasks.clear()
+    raise failed[0]
+
+
+async def consume_forever_async(
+    *, consumer_group_config, consumer_id, registered_handlers, start_from, max_retries, concurrency
+):
+    broker = AsyncRedisStream.get_broker()
+    await maybe_create_consumer_groups_async(broker, consumer_group_config)
+    group_name = consumer_group_config["name"]
+    consumer_name = make_consumer_name(consumer_id, group_name)
+    streams = consumer_group_config["streams"]
+    set_consumer_context(consumer_name, group_name)
+    handler_names = [k.name for k in registered_handlers.keys()]
+    in_flight: Set[asyncio.Task] = set()
+    # Events run concurrently, except those of the same document on the same stream: each one waits for the last
+    # task of its (stream, correlation id), so partitioning keeps its per-document order here too.
+    tails: Dict[Tuple[str, str], asyncio.Task] = {}
+    # The janitor works through the blocking client, in a thread, so it never stalls running handlers.
+    janitor = make_janitor(RedisStream.get_broker(), consumer_group_config, consumer_name, max_retries)
+
+    def forget(key, task) -> None:
+        if tails.get(key) is task:
+            del tails[key]
+
+    def spawn_in_order(stream, event_id, event, fields) -> None:
+        key = (stream, maybe_retrieve_correlation_id(event))
+        after = tails.get(key) if key[1] else None
+        task = asyncio.create_task(
+            digest_in_order_async(broker, stream, event_id, event, fields, group_name, registered_handlers, after)
+        )
+        in_flight.add(task)
+        if key[1]:  # Events without a document have nothing to keep in order
+            tails[key] = task
+            task.add_done_callback(partial(forget, key))
+
+    async def spawn(stream, messages):
+        messages = await asyncio.to_thread(drop_duplicates, RedisStream.get_broker(), stream, group_name, messages)
+        accepted, rejected = split_by_handler(messages, handler_names)
+        if accepted:
+            start = perf_counter()
+            _, events = decode_item(accepted)
+            observe_decode(stream, perf_counter() - start, len(events))
+            for (event_id, fields), event in zip(accepted, events):
+                spawn_in_order(stream, event_id, event, fields)
+        if rejected:
+            await ack_entries_async(broker, stream, group_name, [message_id for message_id, _ in rejected])
+
+    while not consumer_stop.is_set():
+        await reap(in_flight)
+        free = concurrency - len(in_flight)
+        if free <= 0:
+            await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            continue
+        janitor.claim_count = free
+        for stream, claimed in await asyncio.to_thread(janitor.maybe_run):
+            await spawn(stream, claimed)
+            free -= len(claimed)
+        if free <= 0:
+            continue
+        count = max(1, free // len(streams))
+        messages_by_stream = await broker.xreadgroup(
+            group_name, consumer_name, {s: start_from for s in streams}, count=count, block=100
+        )
+        for stream, messages in filter(is_really_not_empty, messages_by_stream):
+            await spawn(maybe_decode(stream), messages)
+    if in_flight:
+        await asyncio.wait(in_flight)  # Drain: every started event is digested and acknowledged
+        await reap(in_flight)
+
+
+def start_async_redis_consumer(
+    consumer_group_config,
+    registered_handlers,
+    start_from=">",
+    consumer_id=None,
+    max_retries=None,
+    concurrency=None,
+):
+    max_retries = max_retries or consumer_group_config.get("max_retries", 1)
+    concurrency = concurrency or consumer_group_config.get("concurrency", 10)
+    maybe_start_metrics_server(consumer_group_config)
+    RedisStream.get_stream_codecs()  # A configured codec that isn't installed fails here, not mid-stream
+    consumer_group_config = assign_partitions(consumer_group_config)
+    maybe_start_stream_trimmer(consumer_group_config)
+    RedisStream.set_dedupe_window(make_dedupe_window(RedisStream.get_broker, consumer_group_config.get("dedupe")))
+    if not consumer_group_config["streams"]:
+        print(f"No stream partitions assigned to worker {consumer_group_config.get('worker_index', 0)}, idling")
+        while not consumer_stop.wait(1):
+            pass
+        return
+    asyncio.run(
+        consume_forever_async(
+            consumer_group_config=consumer_group_config,
+            consumer_id=consumer_id,
+            registered_handlers=registered_handlers,
+            start_from=start_from,
+            max_retries=max_retries,
+            concurrency=concurrency,
+        )
+    )
@@ -0,0 +1,110 @@
+from typing import Any, Dict, Optional
+
+from aim_library.events.metrics import metrics
+
+
+class AdaptiveBatchSize:
+    # Picks the XREADGROUP count for batch consumers. The time a batch takes from read to ack is tracked per event
+    # (EWMA), and the count is the number of events that fits in target_latency. Shrinking is immediate, since a
+    # batch that outlives retry_after gets claimed by another consumer; growing is capped at max_step per batch and
+    # only happens while there is a backlog (stream lag above the current size, or a full last batch when Redis
+    # doesn't report lag), so light traffic doesn't inflate the count for nothing.
+    def __init__(
+        self,
+        initial: int,
+        min_size: int = 1,
+        max_size: int = None,
+        target_latency: float = 30.0,
+        memory_budget: int = None,
+        smoothing: float = 0.3,
+        max_step: float = 2.0,
+        name: str = "",
+    ):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size or initial * 8)
+        self.size = float(min(max(initial, self.min_size), self.max_size))
+        self.target_latency = target_latency
+        self.memory_budget = memory_budget
+        self.smoothing = smoothing
+        self.max_step = max_step
+        self.name = name
+        self.seconds_per_event: Optional[float] = None
+        self.bytes_per_event: Optional[float] = None
+        self.lag: Optional[int] = None
+        self.last_full = False
+        self.throttled = 0
+        self._publish()
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.smoothing * (value - current)
+
+    def observe(self, events: int, seconds: float, nbytes: int = 0) -> None:
+        if events <= 0:
+            return
+        self.last_full = events >= int(self.size)
+        self.seconds_per_event = self._ewma(self.seconds_per_event, seconds / events)
+        if nbytes:
+            self.bytes_per_event = self._ewma(self.bytes_per_event, nbytes / events)
+        self._adjust()
+
+    def set_lag(self, lag: Optional[int]) -> None:
+        self.lag = lag
+
+    def _adjust(self) -> None:
+        if not self.seconds_per_event:
+            return
+        desired = self.target_latency / self.seconds_per_event
+        if desired < self.size:
+            self.size = desired
+        elif self.lag > self.size if self.lag is not None else self.last_full:
+            self.size = min(desired, self.size * self.max_step)
+        self.size = float(min(max(self.size, self.min_size), self.max_size))
+        self._publish()
+
+    def can_pull(self, in_flight_bytes: int = 0) -> bool:
+        if self.memory_budget and in_flight_bytes >= self.memory_budget:
+            self.throttled += 1
+            return False
+        return True
+
+    def next_size(self, in_flight_bytes: int = 0) -> int:
+        size = int(self.size)
+        if self.memory_budget and self.bytes_per_event:
+            size = min(size, int((self.memory_budget - in_flight_bytes) / self.bytes_per_event))
+        return max(self.min_size, size)
+
+    def _publish(self) -> None:
+        metrics.gauge("batch_size", group=self.name).set(int(self.size))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": int(self.size),
+            "seconds_per_event": self.seconds_per_event,
+            "bytes_per_event": self.bytes_per_event,
+            "lag": self.lag,
+            "throttled": self.throttled,
+        }
+
+
+def entries_size(entries) -> int:
+    return sum(len(value) for fields in entries for value in fields.values())
+
+
+def make_batch_size_controller(consumer_group_config) -> Optional[AdaptiveBatchSize]:
+    adaptive_config = consumer_group_config.get("adaptive_batching")
+    if not adaptive_config:
+        return None
+    if adaptive_config is True:
+        adaptive_config = {}
+    retry_after = consumer_group_config.get("retry_after", 300000)
+    return AdaptiveBatchSize(
+        consumer_group_config["batch_size"],
+        min_size=adaptive_config.get("min_size", 1),
+        max_size=adaptive_config.get("max_size"),
+        # Default to a quarter of retry_after (ms) so a slow batch is acked well before it can be claimed again.
+        target_latency=adaptive_config.get("target_latency", retry_after / 4000),
+        memory_budget=adaptive_config.get("memory_budget"),
+        smoothing=adaptive_config.get("smoothing", 0.3),
+        max_step=adaptive_config.get("max_step", 2.0),
+        name=consumer_group_config["name"],
+    )
@@ -0,0 +1,312 @@
+import copy
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from statistics import median
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from aim_library.events.batching import entries_size
+from aim_library.events.causalchain import CausalChain
+from aim_library.events.codecs import available_codecs, decode_event, encode_event
+from aim_library.events.eventcontext import EventContext
+from aim_library.events.events import (
+    DetectionEvent,
+    DocumentEvent,
+    EmbeddingEvent,
+    EventType,
+    FrameEvent,
+    MLEvent,
+)
+from aim_library.events.memorybroker import InMemoryBroker, install_memory_broker
+from aim_library.events.redisstream import (
+    BatchProducer,
+    RedisStream,
+    consumer_stop,
+    maybe_decode,
+    produce_many,
+    produce_one,
+    start_redis_consumer,
+)
+
+CALLS_PER_SAMPLE = 100
+BENCHMARK_STREAM = "benchmark"
+BENCHMARK_GROUP = "benchmark"
+
+
+def sample_events() -> List[Any]:
+    correlations = {"documents": "1687269350000-0", "ocr": "1687269351000-0"}
+    causations = [{"documents": "1687269350000-0"}, {"ocr": "1687269351000-0"}]
+    user_access = {"organization_id": "ORG-1", "user_id": "USER-1", "roles": ["admin"]}
+    lines = [{"text": f"line {i}", "bbox": [i, i, i + 100, i + 20], "confidence": 0.98} for i in range(20)]
+    events = [
+        DocumentEvent(
+            document_id="DOC-0001",
+            signature="a" * 64,
+            data={"filename": "receipt.pdf", "pages": 2, "user_access": user_access},
+            user_id="USER-1",
+            event_type=EventType.DOCUMENT_CREATED,
+        ),
+        MLEvent(
+            user_id="USER-1", source_id="DOC-0001", data={"lines": lines}, event_type=EventType.TEXT_LINES_CLASSIFIED
+        ),
+        DetectionEvent(detections={"id": "DET-1", "boxes": [[0.1, 0.2, 0.3, 0.4]] * 10, "scores": [0.9] * 10}),
+    ]
+    for event in events:
+        event.correlations = dict(correlations)
+        event.causations = list(causations)
+    return events
+
+
+def _timed(func, rounds: int) -> float:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return median(samples)
+
+
+def event_factories() -> Dict[str, Callable[[], Any]]:
+    # Events created at frame rate by the video pipeline, and the most common document event.
+    return {
+        "FrameEvent": lambda: FrameEvent(frame=None, worker_id="WORKER-1", stream_id="STREAM-1"),
+        "DetectionEvent": lambda: DetectionEvent(detections={"id": "DET-1", "boxes": [[0.1, 0.2, 0.3, 0.4]]}),
+        "EmbeddingEvent": lambda: EmbeddingEvent(embeddings={"id": "EMB-1", "vector": [0.5] * 8}),
+        "DocumentEvent": lambda: DocumentEvent(document_id="DOC-0001", signature="a" * 64, user_id="USER-1"),
+    }
+
+
+def per_call_us(func, samples: int) -> float:
+    return 1e6 * _timed(lambda: [func() for _ in range(CALLS_PER_SAMPLE)], samples) / CALLS_PER_SAMPLE
+
+
+def allocated_per_call(func, calls: int = 1000) -> float:
+    tracemalloc.start()
+    try:
+        kept = [func() for _ in range(calls)]
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (allocated - sys.getsizeof(kept)) / calls
+
+
+def benchmark_events(rounds: int = 2000, codec: str = "pickle") -> Dict[str, Dict[str, float]]:
+    # Per event: construction time and memory (instance, uuid and field containers), encode/decode time and size.
+    samples = max(5, rounds // CALLS_PER_SAMPLE)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, make in event_factories().items():
+        event = make()
+        encoded = encode_event(event, codec)
+        results[name] = {
+            "construct_us": per_call_us(make, samples),
+            "memory_bytes": allocated_per_call(make),
+            "encode_us": per_call_us(lambda: encode_event(event, codec), samples),
+            "decode_us": per_call_us(lambda: decode_event(encoded), samples),
+            "bytes_per_event": len(encoded),
+        }
+    return results
+
+
+def benchmark_codecs(events: Optional[List[Any]] = None, codecs: Optional[List[str]] = None, rounds: int = 2000):
+    events = events or sample_events()
+    results: Dict[str, Dict[str, float]] = {}
+    for codec_name in codecs or available_codecs():
+        encoded = [encode_event(event, codec_name) for event in events]
+        results[codec_name] = {
+            "bytes_per_event": sum(len(e) for e in encoded) / len(encoded),
+            "encode_us": 1e6 * _timed(lambda: [encode_event(e, codec_name) for e in events], rounds) / len(events),
+            "decode_us": 1e6 * _timed(lambda: [decode_event(e) for e in encoded], rounds) / len(events),
+        }
+    return results
+
+
+PIPELINE_STAGES = ("documents", "ocr", "classify", "redact", "index")
+
+
+def chained_event(depth: int, chain: Optional[CausalChain]) -> Any:
+    # A document event `depth` hops down the pipeline, the stages repeating as they do on replays.
+    correlations, causations = {}, []
+    for hop in range(depth):
+        stream = PIPELINE_STAGES[hop % len(PIPELINE_STAGES)]
+        ctx = EventContext(correlations, causations, {stream: f"{1687269350000 + hop}-0".encode()}, chain=chain)
+        correlations, causations = ctx.correlations, ctx.causations
+    event = DocumentEvent(document_id="DOC-0001", signature="a" * 64, user_id="USER-1")
+    event.correlations, event.causations = correlations, causations
+    return event
+
+
+def benchmark_causal_chain(depths=(1, 5, 20, 100, 500), codec: str = "pickle") -> Dict[str, Dict[str, float]]:
+    # Encoded size of an event by pipeline depth, with unbounded causations and with the default CausalChain.
+    return {
+        f"depth {depth}": {
+            "unbounded_bytes": len(encode_event(chained_event(depth, None), codec)),
+            "bounded_bytes": len(encode_event(chained_event(depth, CausalChain()), codec)),
+        }
+        for depth in depths
+    }
+
+
+class AckTimingBroker(InMemoryBroker):
+    # Remembers when every entry was first acknowledged, for handler-to-ack latencies.
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.acked_at: Dict[Any, float] = {}
+
+    def xack(self, name, groupname, *ids) -> int:
+        acked = super().xack(name, groupname, *ids)
+        now = time.perf_counter()
+        for id_ in ids:
+            self.acked_at.setdefault((maybe_decode(name), maybe_decode(id_)), now)
+        return acked
+
+
+def use_memory_broker(latency: float = 0.0) -> AckTimingBroker:
+    # Runs against the events-stream section of DEFAULT_CONFIG when it is set (log sink, claim checks...), a bare
+    # one otherwise. Nothing reaches Redis either way.
+    if "DEFAULT_CONFIG" not in os.environ:
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as config_file:
+            yaml.safe_dump({"events-stream": {"broker": {}}}, config_file)
+        os.environ["DEFAULT_CONFIG"] = config_file.name
+    return install_memory_broker(AckTimingBroker(latency))
+
+
+def numbered_events(n: int) -> List[Any]:
+    events = []
+    for i in range(n):
+        event = copy.copy(sample_events()[i % 3])
+        event.uuid = f"BENCHMARK-{i}"
+        events.append(event)
+    return events
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def stream_bytes_per_event(broker, stream: str) -> float:
+    entries = broker.xrange(stream)
+    return entries_size(fields for _, fields in entries) / max(1, len(entries))
+
+
+def benchmark_producers(broker: AckTimingBroker, n: int = 2000, codec: str = "pickle"):
+    def one_by_one(events):
+        for event in events:
+            produce_one(BENCHMARK_STREAM, event)
+
+    def with_batch_producer(events):
+        with BatchProducer() as producer:
+            for event in events:
+                producer.produce(BENCHMARK_STREAM, event)
+
+    producers: Dict[str, Callable[[List[Any]], Any]] = {
+        "produce_one": one_by_one,
+        "produce_many": lambda events: produce_many(BENCHMARK_STREAM, events),
+        "BatchProducer": with_batch_producer,
+    }
+    RedisStream.set_stream_codec(BENCHMARK_STREAM, codec)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, produce in producers.items():
+        broker.flushdb()
+        events = numbered_events(n)
+        start = time.perf_counter()
+        produce(events)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "events_per_s": n / elapsed,
+            "bytes_per_event": stream_bytes_per_event(broker, BENCHMARK_STREAM),
+        }
+    return results
+
+
+def benchmark_handlers(started: Dict[str, float], batch: bool) -> Dict[EventType, Callable]:
+    def handle(stream_name, events, event_id):
+        now = time.perf_counter()
+        for event in events if batch else [events]:
+            started[event.uuid] = now
+
+    return {event.event_type: handle for event in sample_events()}
+
+
+def consume(broker: AckTimingBroker, n: int, batch_size: int, codec: str, timeout: float = 120.0) -> Dict[str, float]:
+    # Produces n events, then runs start_redis_consumer in a thread until all of them are acknowledged.
+    broker.flushdb()
+    broker.acked_at.clear()
+    RedisStream.set_stream_codec(BENCHMARK_STREAM, codec)
+    broker.xgroup_create(BENCHMARK_STREAM, BENCHMARK_GROUP, id="0", mkstream=True)
+    events = numbered_events(n)
+    ids = [(BENCHMARK_STREAM, maybe_decode(id_)) for id_ in produce_many(BENCHMARK_STREAM, events)]
+    bytes_per_event = stream_bytes_per_event(broker, BENCHMARK_STREAM)
+    started: Dict[str, float] = {}
+    consumer_group_config = {"name": BENCHMARK_GROUP, "streams": [BENCHMARK_STREAM], "batch_size": batch_size}
+    errors: List[Exception] = []
+
+    def run_consumer():
+        try:
+            start_redis_consumer(consumer_group_config, benchmark_handlers(started, batch_size > 1), consumer_id="0")
+        except Exception as e:
+            errors.append(e)
+
+    consumer = threading.Thread(target=run_consumer, daemon=True)
+    start = time.perf_counter()
+    consumer.start()
+    while consumer.is_alive() and len(broker.acked_at) < n and time.perf_counter() - start < timeout:
+        time.sleep(0.001)
+    consumer_stop.set()
+    consumer.join()
+    consumer_stop.clear()
+    if errors:
+        raise errors[0]
+    latencies = [
+        broker.acked_at[id_] - started[event.uuid]
+        for id_, event in zip(ids, events)
+        if id_ in broker.acked_at and event.uuid in started
+    ]
+    elapsed = max(broker.acked_at.values(), default=start) - start
+    return {
+        "events_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": 1e3 * percentile(latencies, 0.5),
+        "p99_ms": 1e3 * percentile(latencies, 0.99),
+        "bytes_per_event": bytes_per_event,
+    }
+
+
+def benchmark_consumers(
+    broker: AckTimingBroker, n: int = 2000, codecs: Optional[List[str]] = None, batch_size: int = 50
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for codec_name in codecs or available_codecs():
+        results[f"single/{codec_name}"] = consume(broker, n, 1, codec_name)
+        results[f"batch/{codec_name}"] = consume(broker, n, batch_size, codec_name)
+    return results
+
+
+def print_results(title: str, results: Dict[str, Dict[str, float]]) -> None:
+    columns = list(next(iter(results.values())))
+    print(f"{f' {title} ':#^80}")
+    print(f"{'':<16}" + "".join(f"{c:>16}" for c in columns))
+    for name, row in results.items():
+        print(f"{name:<16}" + "".join(f"{row[c]:>16.2f}" for c in columns))
+
+
+def main() -> None:
+    rounds = int(os.getenv("BENCHMARK_ROUNDS", "2000"))
+    n = int(os.getenv("BENCHMARK_EVENTS", "2000"))
+    latency = float(os.getenv("BENCHMARK_LATENCY_MS", "0.2")) / 1000  # Simulated round trip to Redis
+    print_results("events", benchmark_events(rounds=rounds))
+    print_results("codecs", benchmark_codecs(rounds=rounds))
+    print_results("causal chain", benchmark_causal_chain())
+    broker = use_memory_broker(latency)
+    print_results(f"producers ({n} events)", benchmark_producers(broker, n))
+    print_results(f"consumers ({n} events)", benchmark_consumers(broker, n))
+
+
+if __name__ == "__main__":
+    main()
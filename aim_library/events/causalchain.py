@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Optional
+
+from aim_library.utils.common import uuid_factory
+
+DEFAULT_MAX_CAUSATIONS = 16
+DEFAULT_MAX_CORRELATIONS = 32
+TRACE_KEY = "@trace"  # Not a stream name: correlations are keyed by stream
+
+
+class CausalChain:
+    # Bounds what an event carries about its ancestry, so its size doesn't grow with the depth of the pipeline or
+    # with replays: correlations keep the ids of the first `max_correlations` streams of the chain (the root; later
+    # hops only update streams already there) and causations the last `max_causations` hops. 0 keeps everything.
+    #
+    # With `trace` the first event of a chain gets a trace id that every descendant carries in its correlations
+    # (under TRACE_KEY) and in its log event context. The logs of each hop record the consumed and the produced
+    # events, so the full chain can still be rebuilt from them after the causations have dropped it.
+    def __init__(
+        self,
+        max_causations: int = DEFAULT_MAX_CAUSATIONS,
+        max_correlations: int = DEFAULT_MAX_CORRELATIONS,
+        trace: bool = False,
+        make_trace_id=uuid_factory("TRACE"),
+    ):
+        self.max_causations = max_causations
+        self.max_correlations = max_correlations
+        self.trace = trace
+        self.make_trace_id = make_trace_id
+
+    def root_correlations(self) -> Dict[str, Any]:
+        return {TRACE_KEY: self.make_trace_id()} if self.trace else {}
+
+    def correlations(self, parent: Optional[dict], hop: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        correlations = dict(parent or {})
+        if self.trace and TRACE_KEY not in correlations:
+            correlations[TRACE_KEY] = self.make_trace_id()
+        streams = len(correlations) - (TRACE_KEY in correlations)
+        for stream, id_ in (hop or {}).items():
+            if stream in correlations or not self.max_correlations or streams < self.max_correlations:
+                streams += stream not in correlations
+                correlations[stream] = id_
+        return correlations
+
+    def causations(self, parent: Optional[list], hop: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        causations = list(parent or [])
+        if hop:
+            causations.append(hop)
+        if self.max_causations and len(causations) > self.max_causations:
+            del causations[: -self.max_causations]
+        return causations
+
+
+def trace_id(correlations: Optional[dict]) -> Optional[str]:
+    return (correlations or {}).get(TRACE_KEY)
+
+
+def make_causal_chain(chain_config: Optional[dict]) -> CausalChain:
+    # Always bounded: without config the defaults apply, `max_causations: 0` restores the unbounded list.
+    chain_config = chain_config or {}
+    return CausalChain(
+        max_causations=chain_config.get("max_causations", DEFAULT_MAX_CAUSATIONS),
+        max_correlations=chain_config.get("max_correlations", DEFAULT_MAX_CORRELATIONS),
+        trace=chain_config.get("trace", False),
+    )
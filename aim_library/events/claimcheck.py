@@ -0,0 +1,231 @@
+import copy
+import os
+import pickle
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from aim_library.events.codecs import event_state
+
+DEFAULT_THRESHOLD = 256 * 1024
+DEFAULT_FIELDS = ("data", "frame")
+
+MISSING = object()
+
+
+class BlobRef:
+    def __init__(self, store: str, key: str, size: int, compressed: bool = False, pickled: bool = False):
+        self.store = store
+        self.key = key
+        self.size = size
+        self.compressed = compressed
+        self.pickled = pickled
+
+    def __repr__(self) -> str:
+        return f"BlobRef({self.store}:{self.key}, {self.size} bytes)"
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, BlobRef) and (self.store, self.key) == (other.store, other.key)
+
+    def __hash__(self) -> int:
+        return hash((self.store, self.key))
+
+    def resolve(self) -> Any:
+        data = get_blob_store(self.store).get(self.key)
+        if self.compressed:
+            data = zlib.decompress(data)
+        return pickle.loads(data) if self.pickled else data
+
+
+class LocalBlobStore:
+    name = "local"
+
+    def __init__(self, path: str = None):
+        self.path = Path(path or os.getenv("CLAIM_CHECK_PATH", "/tmp/claim-check"))
+
+    def put(self, key: str, data: bytes) -> None:
+        filename = self.path / key
+        filename.parent.mkdir(parents=True, exist_ok=True)
+        filename.write_bytes(data)
+
+    def get(self, key: str) -> bytes:
+        return (self.path / key).read_bytes()
+
+    def delete(self, key: str) -> None:
+        (self.path / key).unlink(missing_ok=True)
+
+
+class S3BlobStore:
+    name = "s3"
+
+    def __init__(self, prefix: str = "claim-check/", s3=None):
+        self.prefix = prefix
+        self._s3 = s3
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            from aim_library.services.storage import S3
+
+            self._s3 = S3()
+        return self._s3
+
+    def put(self, key: str, data: bytes) -> None:
+        self.s3.upload_bytes(self.prefix + key, data)
+
+    def get(self, key: str) -> bytes:
+        return self.s3.download_bytes(self.prefix + key)
+
+    def delete(self, key: str) -> None:
+        self.s3.delete_one(self.prefix + key)
+
+
+_blob_stores: Dict[str, Any] = {}
+_store_factories = {LocalBlobStore.name: LocalBlobStore, S3BlobStore.name: S3BlobStore}
+
+
+def register_blob_store(store) -> None:
+    _blob_stores[store.name] = store
+
+
+def get_blob_store(name: str):
+    if name not in _blob_stores:
+        if name not in _store_factories:
+            raise ValueError(f"Unknown blob store '{name}'")
+        _blob_stores[name] = _store_factories[name]()
+    return _blob_stores[name]
+
+
+class ClaimCheckField:
+    # Data descriptor installed on an event class the first time one of its instances arrives with an offloaded
+    # field. Reading the attribute downloads the blob once and keeps the value on the instance; events that never
+    # touch the field never download it. Storage is delegated to whatever held the attribute before (a slot or
+    # the instance __dict__), so the class layout doesn't change.
+    def __init__(self, name: str, inner: Any = None, default: Any = MISSING):
+        self.name = name
+        self.inner = inner
+        self.default = default
+
+    def _load(self, obj):
+        if self.inner is not None:
+            return self.inner.__get__(obj, type(obj))
+        value = obj.__dict__.get(self.name, self.default)
+        if value is MISSING:
+            raise AttributeError(f"'{type(obj).__name__}' object has no attribute '{self.name}'")
+        return value
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self if self.default is MISSING else self.default
+        value = self._load(obj)
+        if isinstance(value, BlobRef):
+            value = value.resolve()
+            self.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        if self.inner is not None:
+            self.inner.__set__(obj, value)
+        else:
+            obj.__dict__[self.name] = value
+
+    def __delete__(self, obj):
+        if self.inner is not None:
+            self.inner.__delete__(obj)
+        else:
+            del obj.__dict__[self.name]
+
+
+def install_claim_check_field(cls: type, name: str) -> None:
+    if isinstance(cls.__dict__.get(name), ClaimCheckField):
+        return
+    inner, default = None, MISSING
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            attr = klass.__dict__[name]
+            if isinstance(attr, ClaimCheckField):
+                inner, default = attr.inner, attr.default
+            elif hasattr(type(attr), "__set__"):
+                inner = attr
+            else:
+                default = attr
+            break
+    setattr(cls, name, ClaimCheckField(name, inner, default))
+    cls._claim_checked = True
+
+
+def raw_value(event: Any, name: str) -> Any:
+    # Reads a field without resolving it, so re-producing an event keeps the reference instead of the blob.
+    attr = type(event).__dict__.get(name)
+    if isinstance(attr, ClaimCheckField):
+        return attr._load(event)
+    return getattr(event, name, None)
+
+
+class ClaimCheck:
+    def __init__(
+        self,
+        store: str = S3BlobStore.name,
+        threshold: int = DEFAULT_THRESHOLD,
+        fields: Iterable[str] = DEFAULT_FIELDS,
+        compress: bool = True,
+        compress_level: int = 1,
+    ):
+        get_blob_store(store)
+        self.store = store
+        self.threshold = threshold
+        self.fields = tuple(fields)
+        self.compress = compress
+        self.compress_level = compress_level
+
+    def _to_blob(self, value: Any):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value), False
+        if isinstance(value, (str, int, float, bool)):
+            return None, False  # Never large enough to be worth a round trip to the store
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), True
+
+    def offload(self, event: Any) -> Any:
+        offloaded = None
+        for name in self.fields:
+            value = raw_value(event, name)
+            if value is None or isinstance(value, BlobRef):
+                continue
+            data, pickled = self._to_blob(value)
+            if data is None or len(data) < self.threshold:
+                continue
+            size = len(data)
+            if self.compress:
+                data = zlib.compress(data, self.compress_level)
+            key = f"{event.event_type.name}/{event.uuid}/{name}"
+            get_blob_store(self.store).put(key, data)
+            # The producer keeps its own event untouched, only the copy that goes to Redis carries the reference.
+            offloaded = offloaded or copy.copy(event)
+            setattr(offloaded, name, BlobRef(self.store, key, size, self.compress, pickled))
+        return offloaded or event
+
+
+def attach_claim_checks(event: Any) -> bool:
+    attached = False
+    for name, value in event_state(event).items():
+        if isinstance(value, BlobRef):
+            install_claim_check_field(type(event), name)
+            attached = True
+    return attached
+
+
+def make_claim_check(claim_check_config: Optional[dict]) -> Optional[ClaimCheck]:
+    if not claim_check_config or not claim_check_config.get("enabled", True):
+        return None
+    store = claim_check_config.get("store", S3BlobStore.name)
+    if store == LocalBlobStore.name and claim_check_config.get("path"):
+        register_blob_store(LocalBlobStore(claim_check_config["path"]))
+    if store == S3BlobStore.name and claim_check_config.get("prefix"):
+        register_blob_store(S3BlobStore(claim_check_config["prefix"]))
+    return ClaimCheck(
+        store=store,
+        threshold=claim_check_config.get("threshold", DEFAULT_THRESHOLD),
+        fields=claim_check_config.get("fields", DEFAULT_FIELDS),
+        compress=claim_check_config.get("compress", True),
+        compress_level=claim_check_config.get("compress_level", 1),
+    )
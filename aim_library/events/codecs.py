@@ -0,0 +1,253 @@
+import pickle
+from dataclasses import fields, is_dataclass
+from enum import Enum
+from typing import Any, Dict, Tuple, Union
+
+from aim_library.events import events
+
+# Every pickle written with protocol >= 2 starts with the PROTO opcode (0x80). Entries produced before codecs
+# existed carry no header at all, so 0x80 doubles as the id of the pickle codec and keeps them readable.
+PICKLE_CODEC_ID = 0x80
+
+TypeKey = Union[int, str]
+
+
+class Codec:
+    codec_id: int = 0
+    name: str = ""
+
+    def encode(self, event: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, payload: bytes) -> Any:
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    codec_id = PICKLE_CODEC_ID
+    name = "pickle"
+
+    def encode(self, event: Any) -> bytes:
+        return pickle.dumps(event)
+
+    def decode(self, payload: bytes) -> Any:
+        return pickle.loads(payload)
+
+
+# Short, stable codes for the classes the msgpack codec knows about. Codes are part of the wire format: never reuse
+# or renumber them, only append. Classes without a code are encoded by their import path. Dataclass fields travel by
+# position, so adding or reordering fields of a registered class is a wire format change too.
+_class_codes: Dict[type, int] = {}
+_classes_by_code: Dict[int, type] = {}
+_classes_by_path: Dict[str, type] = {}
+_enum_codes: Dict[type, int] = {}
+_enums_by_code: Dict[int, type] = {}
+_layouts: Dict[type, tuple] = {}
+
+
+def register_event_class(cls: type, code: int) -> None:
+    if _classes_by_code.get(code, cls) is not cls:
+        raise ValueError(f"Event class code {code} is already used by {_classes_by_code[code].__name__}")
+    _class_codes[cls] = code
+    _classes_by_code[code] = cls
+
+
+def register_enum(enum_cls: type, code: int) -> None:
+    if _enums_by_code.get(code, enum_cls) is not enum_cls:
+        raise ValueError(f"Enum code {code} is already used by {_enums_by_code[code].__name__}")
+    _enum_codes[enum_cls] = code
+    _enums_by_code[code] = enum_cls
+
+
+def type_key(cls: type) -> TypeKey:
+    code = _class_codes.get(cls)
+    if code is not None:
+        return code
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def type_from_key(key: TypeKey) -> type:
+    if isinstance(key, int):
+        return _classes_by_code[key]
+    cls = _classes_by_path.get(key)
+    if cls is None:
+        module_name, qualname = key.split(":")
+        cls = __import__(module_name, fromlist=[qualname])
+        for name in qualname.split("."):
+            cls = getattr(cls, name)
+        _classes_by_path[key] = cls
+    return cls
+
+
+def layout(cls: type) -> tuple:
+    if cls not in _layouts:
+        _layouts[cls] = tuple(f.name for f in fields(cls)) if is_dataclass(cls) and cls in _class_codes else ()
+    return _layouts[cls]
+
+
+def event_state(event: Any) -> Dict[str, Any]:
+    # Events keep their fields in slots, other objects in their __dict__
+    if isinstance(event, events.BaseEvent):
+        return event.__getstate__()
+    return event.__dict__
+
+
+def set_event_state(event: Any, state: Dict[str, Any]) -> None:
+    if isinstance(event, events.BaseEvent):
+        event.__setstate__(state)
+    else:
+        event.__dict__.update(state)
+
+
+def split_state(event: Any):
+    # Enum members and attribute names are what bloats a pickled event, so enums travel as (code, value) pairs and
+    # fields of registered dataclasses as a plain tuple. Anything else stays in the extras dict.
+    extras = dict(event_state(event))
+    enums = {}
+    for name, value in extras.items():
+        if isinstance(value, Enum) and type(value) in _enum_codes:
+            enums[name] = (_enum_codes[type(value)], value.value)
+    for name in enums:
+        extras[name] = None
+    names = layout(type(event))
+    if not all(name in extras for name in names):
+        return (), extras, enums
+    return tuple(extras.pop(name) for name in names), extras, enums
+
+
+def build_event(key: TypeKey, values: tuple, extras: Dict[str, Any], enums: Dict[str, Any]) -> Any:
+    cls = type_from_key(key)
+    event = cls.__new__(cls)
+    state = {}
+    if values:
+        names = layout(cls)
+        if len(names) != len(values):
+            raise ValueError(f"Encoded {cls.__name__} has {len(values)} fields, expected {len(names)}")
+        state.update(zip(names, values))
+    state.update(extras)
+    for name, (enum_code, value) in enums.items():
+        state[name] = _enums_by_code[enum_code](value)
+    set_event_state(event, state)
+    return event
+
+
+# Registered events as msgpack: the class code, the dataclass fields by position, enums as codes and the remaining
+# attributes by name; values msgpack can't represent are pickled into an extension type. This is a size trade, not
+# a speed one. A flat event is about a third smaller than its pickle (313 vs 495 bytes for a DocumentEvent), while
+# an event carrying nested objects gains little (1035 vs 1148 bytes for an MLEvent). It is no faster than pickle,
+# which is C all the way down: splitting and rebuilding the event in Python puts encoding and decoding anywhere from
+# on par to half again slower. Use it for streams where Redis memory or bandwidth is the constraint.
+# Codec id 0x01 was the compact codec, dropped as it was only a pickle of the split state: never reuse it.
+class MsgpackCodec(Codec):
+    codec_id = 0x02
+    name = "msgpack"
+    PICKLED_EXT = 1
+
+    def __init__(self) -> None:
+        import msgpack
+
+        self._msgpack = msgpack
+
+    def _default(self, obj: Any) -> Any:
+        return self._msgpack.ExtType(self.PICKLED_EXT, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == self.PICKLED_EXT:
+            return pickle.loads(data)
+        return self._msgpack.ExtType(code, data)
+
+    def encode(self, event: Any) -> bytes:
+        # msgpack has no tuple type: tuples inside the event come back as lists.
+        payload = (type_key(type(event)), *split_state(event))
+        return self._msgpack.packb(payload, use_bin_type=True, default=self._default)
+
+    def decode(self, payload: bytes) -> Any:
+        key, values, extras, enums = self._msgpack.unpackb(
+            payload, raw=False, strict_map_key=False, ext_hook=self._ext_hook
+        )
+        return build_event(key, tuple(values), extras, enums)
+
+
+_codecs_by_id: Dict[int, Codec] = {}
+_codecs_by_name: Dict[str, Codec] = {}
+# Codecs whose dependency isn't installed: name -> (codec id, why), so configuring or reading them says what to install
+_missing_codecs: Dict[str, Tuple[int, str]] = {}
+
+
+def register_codec(codec: Codec) -> None:
+    if not 0 <= codec.codec_id <= 0xFF:
+        raise ValueError(f"Codec id must fit in one byte, got {codec.codec_id}")
+    if codec.codec_id == PICKLE_CODEC_ID and not isinstance(codec, PickleCodec):
+        raise ValueError(f"Codec id {PICKLE_CODEC_ID:#x} is reserved for pickle")
+    _codecs_by_id[codec.codec_id] = codec
+    _codecs_by_name[codec.name] = codec
+
+
+def get_codec(name: str) -> Codec:
+    if name in _missing_codecs:
+        raise ValueError(f"Event codec '{name}' is not available: {_missing_codecs[name][1]}")
+    if name not in _codecs_by_name:
+        raise ValueError(f"Unknown event codec '{name}'. Available: {', '.join(available_codecs())}")
+    return _codecs_by_name[name]
+
+
+def available_codecs():
+    return list(_codecs_by_name)
+
+
+def encode_event(event: Any, codec_name: str = "pickle") -> bytes:
+    codec = get_codec(codec_name)
+    payload = codec.encode(event)
+    if codec.codec_id == PICKLE_CODEC_ID:
+        return payload
+    return bytes((codec.codec_id,)) + payload
+
+
+def decode_event(bytes_: bytes) -> Any:
+    codec_id = bytes_[0]
+    if codec_id == PICKLE_CODEC_ID:
+        return pickle.loads(bytes_)
+    if codec_id not in _codecs_by_id:
+        for name, (missing_id, reason) in _missing_codecs.items():
+            if missing_id == codec_id:
+                raise ValueError(f"Event codec '{name}' ({codec_id:#x}) is not available: {reason}")
+        raise ValueError(f"Unknown event codec id {codec_id:#x}")
+    return _codecs_by_id[codec_id].decode(memoryview(bytes_)[1:])
+
+
+register_codec(PickleCodec())
+try:
+    register_codec(MsgpackCodec())
+except ModuleNotFoundError:
+    _missing_codecs[MsgpackCodec.name] = (MsgpackCodec.codec_id, "install msgpack (pip install aim-library[msgpack])")
+
+register_enum(events.EventType, 1)
+register_enum(events.CommandType, 2)
+
+for _code, _cls in enumerate(
+    [
+        events.BaseEvent,
+        events.BaseCommand,
+        events.MLCommand,
+        events.RedactorCommand,
+        events.GenericEvent,
+        events.MetricsEvent,
+        events.StreamEvent,
+        events.FrameEvent,
+        events.DetectionEvent,
+        events.EmbeddingEvent,
+        events.TrackingEvent,
+        events.TrackableEvent,
+        events.MatchEvent,
+        events.FileEvent,
+        events.ReceiptEvent,
+        events.TransactionEvent,
+        events.DocumentEvent,
+        events.StorageEvent,
+        events.OCREvent,
+        events.MLEvent,
+        events.RedactorEvent,
+    ],
+    start=1,
+):
+    register_event_class(_cls, _code)
@@ -0,0 +1,113 @@
+from math import ceil
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_KEY_PREFIX = "events:correlation:"
+DEFAULT_MAX_ENTRIES = 10000
+
+EntryRef = Tuple[str, str]
+
+# The id of an entry is only known once Redis assigned it, so the XADD and the index update run together in one
+# script, in the round trip (or pipeline) that writes the entry. KEYS: stream, index key. ARGV: ttl, max entries,
+# then the XADD arguments after the key. The TTL is only ever raised, so a correlation produced to streams with
+# different retention lives as long as the longest. Both keys are touched by one script, so the index needs the
+# streams and its keys on one Redis (not spread over a cluster).
+XADD_INDEXED = """
+local id = redis.call('XADD', KEYS[1], unpack(ARGV, 3))
+redis.call('ZADD', KEYS[2], string.match(id, '^%d+'), KEYS[1] .. ':' .. id)
+if tonumber(ARGV[2]) > 0 then redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1) end
+if tonumber(ARGV[1]) > 0 and redis.call('TTL', KEYS[2]) < tonumber(ARGV[1]) then
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+return id
+"""
+
+
+def xadd_arguments(fields: Dict[Any, Any], maxlen: Optional[int] = None, approximate: bool = True) -> list:
+    # The arguments of XADD after the stream name, as redis-py sends them.
+    args: list = []
+    if maxlen is not None:
+        args += ["MAXLEN", "~" if approximate else "=", maxlen]
+    args.append("*")
+    for item in fields.items():
+        args += item
+    return args
+
+
+class CorrelationIndex:
+    # One sorted set per correlation id, members are "<stream>:<entry id>" scored by the entry's millisecond
+    # timestamp so lookups come back in production order and can be limited to a time range. Keys expire as long
+    # after the last event of the correlation as its stream keeps entries: the `max_age` of the stream's retention
+    # policy, or `ttl` for streams without one. References to entries trimmed before that (by maxlen) are dropped
+    # the first time a lookup misses them.
+    def __init__(
+        self,
+        ttl: int = DEFAULT_TTL,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+        exclude_streams: Iterable[str] = ("logs",),
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        retention=None,
+    ):
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.exclude_streams = set(exclude_streams)
+        self.max_entries = max_entries
+        self.retention = retention
+
+    def key(self, correlation_id: str) -> str:
+        return f"{self.key_prefix}{correlation_id}"
+
+    def stream_ttl(self, stream: str) -> int:
+        max_age = self.retention.policy(stream).max_age if self.retention else None
+        return ceil(max_age) if max_age else self.ttl
+
+    def xadd(
+        self,
+        client,
+        stream: str,
+        fields: Dict[Any, Any],
+        correlation_id: str,
+        maxlen: Optional[int] = None,
+        approximate: bool = True,
+    ):
+        # XADD through `client`, a broker or a pipeline, indexing the entry if it has a correlation id. Returns what
+        # the XADD would: the entry id, the queued pipeline, or an awaitable on asyncio clients.
+        if not correlation_id or stream in self.exclude_streams:
+            return client.xadd(stream, fields, maxlen=maxlen, approximate=approximate)
+        args = [self.stream_ttl(stream) or 0, self.max_entries or 0, *xadd_arguments(fields, maxlen, approximate)]
+        return client.eval(XADD_INDEXED, 2, stream, self.key(correlation_id), *args)
+
+    def find(
+        self,
+        broker,
+        correlation_id: str,
+        streams: Optional[Iterable[str]] = None,
+        start: Any = "-inf",
+        end: Any = "+inf",
+    ) -> List[EntryRef]:
+        members = broker.zrangebyscore(self.key(correlation_id), start, end)
+        refs = []
+        for member in members:
+            stream, id_ = (member.decode("utf-8") if isinstance(member, bytes) else member).rsplit(":", 1)
+            refs.append((stream, id_))
+        if streams is not None:
+            streams = set(streams)
+            refs = [ref for ref in refs if ref[0] in streams]
+        return refs
+
+    def remove(self, broker, correlation_id: str, refs: Iterable[EntryRef]) -> None:
+        members = [f"{stream}:{id_}" for stream, id_ in refs]
+        if members:
+            broker.zrem(self.key(correlation_id), *members)
+
+
+def make_correlation_index(index_config: Optional[dict], retention=None) -> Optional[CorrelationIndex]:
+    if not index_config or not index_config.get("enabled", True):
+        return None
+    return CorrelationIndex(
+        ttl=index_config.get("ttl", DEFAULT_TTL),
+        key_prefix=index_config.get("key_prefix", DEFAULT_KEY_PREFIX),
+        exclude_streams=index_config.get("exclude_streams", ("logs",)),
+        max_entries=index_config.get("max_entries", DEFAULT_MAX_ENTRIES),
+        retention=retention,
+    )
@@ -0,0 +1,73 @@
+import math
+from time import time
+from typing import Callable, Iterable, List, Optional, Set
+
+DEFAULT_KEY_PREFIX = "events:dedupe:"
+
+
+def uuid_from_key(entry_key) -> Optional[str]:
+    entry_key = entry_key.decode("utf-8") if isinstance(entry_key, (bytes, bytearray)) else entry_key
+    parts = entry_key.split(":", 1)
+    return parts[1] if len(parts) == 2 and parts[1] else None
+
+
+class DedupeWindow:
+    # Uuids of processed events are kept in one Redis set per group and time bucket; each bucket expires once the
+    # window has passed it, so memory is bounded by the events processed in `window` seconds and no cleanup runs.
+    # A lookup checks every live bucket with SMISMEMBER (Redis >= 6.2) in a single pipeline.
+    def __init__(
+        self,
+        broker_factory: Callable,
+        window: int = 3600,
+        bucket: int = 600,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+    ):
+        self.broker_factory = broker_factory
+        self.window = window
+        self.bucket = max(1, min(bucket, window))
+        self.key_prefix = key_prefix
+
+    def bucket_key(self, group_name: str, index: int) -> str:
+        return f"{self.key_prefix}{group_name}:{index}"
+
+    def live_buckets(self) -> List[int]:
+        current = int(time() // self.bucket)
+        return list(range(current - math.ceil(self.window / self.bucket), current + 1))
+
+    def seen(self, group_name: str, uuids: Iterable[str]) -> Set[str]:
+        uuids = list(dict.fromkeys(uuids))
+        if not uuids:
+            return set()
+        pipe = self.broker_factory().pipeline(transaction=False)
+        for index in self.live_buckets():
+            pipe.smismember(self.bucket_key(group_name, index), uuids)
+        seen = set()
+        for members in pipe.execute():
+            seen.update(uuid for uuid, member in zip(uuids, members) if member)
+        return seen
+
+    def record(self, group_name: str, uuids: Iterable[str]) -> None:
+        uuids = [uuid for uuid in uuids if uuid]
+        if not uuids:
+            return
+        current = self.live_buckets()[-1]
+        key = self.bucket_key(group_name, current)
+        pipe = self.broker_factory().pipeline(transaction=False)
+        pipe.sadd(key, *uuids)
+        pipe.expireat(key, (current + 1) * self.bucket + self.window)
+        pipe.execute()
+
+
+def make_dedupe_window(broker_factory: Callable, dedupe_config) -> Optional[DedupeWindow]:
+    if not dedupe_config:
+        return None
+    if dedupe_config is True:
+        dedupe_config = {}
+    if not dedupe_config.get("enabled", True):
+        return None
+    return DedupeWindow(
+        broker_factory,
+        window=dedupe_config.get("window", 3600),
+        bucket=dedupe_config.get("bucket", 600),
+        key_prefix=dedupe_config.get("key_prefix", DEFAULT_KEY_PREFIX),
+    )
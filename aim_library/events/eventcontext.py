@@ -0,0 +1,132 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional
+
+from aim_library.events.causalchain import CausalChain, trace_id
+
+FIELDS = (
+    "correlation_id",
+    "user_access",
+    "produce_errors_to",
+    "start_time",
+    "stream_name",
+    "event_id",
+    "event_type",
+    "handler",
+    "end_time",
+    "trace_id",
+)
+
+
+class EventContext(MutableMapping):
+    # What the consumer knows about the event being digested, created once per event and carried in a single
+    # ContextVar. A mapping like the dict it replaces, over the fields that were set: other keys are kept in `_extras`
+    # so handlers can still store their own, and as_dict() (what the logs get) has both.
+    #
+    # Correlations and causations of the events the handler produces are derived from the digested event plus this
+    # hop without copying: they are only built, once, when the handler produces something, and bounded by `chain`.
+    __slots__ = FIELDS + (
+        "produced_events",
+        "_extras",
+        "_chain",
+        "_parent_correlations",
+        "_parent_causations",
+        "_hop",
+        "_correlations",
+        "_causations",
+    )
+
+    def __init__(
+        self,
+        parent_correlations: Optional[dict] = None,
+        parent_causations: Optional[list] = None,
+        hop: Optional[Dict[str, Any]] = None,
+        chain: Optional[CausalChain] = None,
+        **fields,
+    ):
+        for name in FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self._extras: Dict[str, Any] = fields
+        self.produced_events: List[Dict[str, Any]] = []
+        self._parent_correlations = parent_correlations
+        self._parent_causations = parent_causations
+        self._hop = hop
+        self._chain = chain
+        self._correlations: Optional[dict] = None
+        self._causations: Optional[list] = None
+
+    @property
+    def correlations(self) -> dict:
+        if self._correlations is None:
+            if self._chain is not None:
+                self._correlations = self._chain.correlations(self._parent_correlations, self._hop)
+                self.trace_id = self.trace_id or trace_id(self._correlations)  # Started here
+            else:
+                self._correlations = {**(self._parent_correlations or {}), **(self._hop or {})}
+        return self._correlations
+
+    @property
+    def causations(self) -> list:
+        if self._causations is None:
+            if self._chain is not None:
+                self._causations = self._chain.causations(self._parent_causations, self._hop)
+            else:
+                causations = list(self._parent_causations or [])
+                self._causations = causations + [self._hop] if self._hop else causations
+        return self._causations
+
+    @correlations.setter
+    def correlations(self, correlations: dict) -> None:
+        self._correlations = correlations
+
+    @causations.setter
+    def causations(self, causations: list) -> None:
+        self._causations = causations
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self._extras.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in FIELDS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._extras[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            self._extras[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        if key in FIELDS:
+            if getattr(self, key) is None:
+                raise KeyError(key)
+            setattr(self, key, None)
+        else:
+            del self._extras[key]
+
+    def __contains__(self, key: Any) -> bool:
+        if key in FIELDS:
+            return getattr(self, key) is not None
+        return key in self._extras
+
+    def __iter__(self) -> Iterator[str]:
+        for name in FIELDS:
+            if getattr(self, name) is not None:
+                yield name
+        yield from self._extras
+
+    def __len__(self) -> int:
+        return sum(getattr(self, name) is not None for name in FIELDS) + len(self._extras)
+
+    def as_dict(self) -> Dict[str, Any]:
+        fields = {name: getattr(self, name) for name in FIELDS if getattr(self, name) is not None}
+        return {**fields, **self._extras} if self._extras else fields
+
+    def __repr__(self) -> str:
+        return f"EventContext({self.as_dict()})"
@@ -1,11 +1,12 @@
 # pylint: disable=import-error
 # pylint: disable=no-name-in-module
 import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from enum import Enum, auto
-from typing import Optional
+from typing import Any, Dict, Optional
 
-from aim_library.utils.common import uuid_factory
+from aim_library.events.causalchain import DEFAULT_MAX_CAUSATIONS
+from aim_library.utils.common import enabled_by_env, uuid_factory
 
 # pylint: enable=import-error
 
@@ -94,6 +95,48 @@ class EventType(Enum):
     LINES_REDACTED = auto()
 
 
+# Event uuids as PREFIX-<uuid7>: time-ordered, so they sort (and index) by creation time.
+TIME_ORDERED_UUIDS = enabled_by_env("TIME_ORDERED_UUIDS")
+
+
+def slotted(*extra_slots: str):
+    # dataclass(slots=True), which we can't use: it needs Python 3.10 and breaks the zero-argument super() of the
+    # __init__ overrides below. `extra_slots` are attributes a class sets without declaring them as fields, they
+    # stay out of the fields because field order is part of the msgpack codec wire format.
+    def wrap(cls):
+        field_names = [f.name for f in fields(cls)]
+        inherited = {name for base in cls.__mro__[1:-1] for name in base.__dict__.get("__slots__", ())}
+        cls_dict = dict(cls.__dict__)
+        for name in field_names + list(extra_slots):
+            cls_dict.pop(name, None)  # Defaults live in the generated __init__, a class attribute would hide the slot
+        cls_dict["__slots__"] = tuple(
+            name for name in dict.fromkeys(field_names + list(extra_slots)) if name not in inherited
+        )
+        cls_dict.pop("__dict__", None)
+        cls_dict.pop("__weakref__", None)
+        slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+        slotted_cls.__qualname__ = cls.__qualname__
+        for value in cls_dict.values():
+            for cell in getattr(value, "__closure__", None) or ():
+                if cell.cell_contents is cls:  # The __class__ cell behind super()
+                    cell.cell_contents = slotted_cls
+        # Every slot, inherited ones first, for __getstate__
+        slot_names = tuple(
+            name
+            for klass in reversed(slotted_cls.__mro__[:-1])
+            for name in klass.__dict__.get("__slots__", ())
+            if name not in ("__dict__", "__weakref__")
+        )
+        # Generated like the dataclass __init__: a dict display reads the slots several times faster than a loop
+        namespace: Dict[str, Any] = {}
+        exec(f"def read_slots(self):\n    return {{{', '.join(f'{n!r}: self.{n}' for n in slot_names)}}}", namespace)
+        slotted_cls._read_slots = namespace["read_slots"]
+        slotted_cls._slot_getters = tuple((name, getattr(slotted_cls, name).__get__) for name in slot_names)
+        return slotted_cls
+
+    return wrap
+
+
 class CommandType(Enum):
 
     GENERIC_COMMAND = auto()
@@ -105,6 +148,9 @@ class CommandType(Enum):
     EXTRACT_TEXT = auto()
 
 
+# Events keep their fields in slots. The __dict__ slot is only filled by attributes that are not fields (set by
+# handlers or carried by pickles of older events), the classes below declare everything they set.
+@slotted("__dict__")
 @dataclass
 class BaseEvent:
     timestamp: float = field(default=0.0)
@@ -113,23 +159,50 @@ class BaseEvent:
     correlations: dict = field(default_factory=dict)
     causations: list = field(default_factory=list)
     prefix: str = field(default="")
+    _claim_checked = False  # Set by claimcheck when it puts a descriptor in front of a slot
 
     def __post_init__(self) -> None:
         self.timestamp = self.timestamp or time.time()
-        self.uuid = self.uuid or uuid_factory(self.prefix or "EVENT")()
+        self.uuid = self.uuid or uuid_factory(self.prefix or "EVENT", TIME_ORDERED_UUIDS)()
         self.event_type = self.event_type or EventType.GENERIC_EVENT
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # The same dict pickle stored when events had an instance __dict__, so pickles stay readable both ways.
+        # Slots are read through their own descriptors: claim-checked fields are not downloaded.
+        state = None
+        if not self._claim_checked:  # Nothing in front of the slots: read them all in one call
+            try:
+                state = self._read_slots()
+            except AttributeError:  # A slot that was never set
+                pass
+        if state is None:
+            state = {}
+            for name, get in self._slot_getters:
+                try:
+                    state[name] = get(self)
+                except AttributeError:
+                    pass
+        if self.__dict__:
+            state.update(self.__dict__)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)  # Fields go to their slot, anything else to __dict__
+
     def update_correlations(self, correlations: dict) -> dict:
         new_correlations = self.correlations.copy()
         new_correlations.update(correlations)
         return new_correlations
 
-    def update_causations(self, new_causation: dict) -> list:
+    def update_causations(self, new_causation: dict, limit: int = DEFAULT_MAX_CAUSATIONS) -> list:
+        # Only the last `limit` hops are kept (0 keeps them all), see causalchain.CausalChain
         updated_causations = getattr(self, "causations", []).copy()
         updated_causations.append(new_causation)
-        return updated_causations
+        return updated_causations[-limit:] if limit else updated_causations
 
 
+@slotted()
 @dataclass
 class BaseCommand(BaseEvent):
     event_type: CommandType = field(default=None)
@@ -138,10 +211,11 @@ class BaseCommand(BaseEvent):
     def __post_init__(self):
         self.timestamp = self.timestamp or time.time()
         # pylint: disable=no-member
-        self.uuid = self.uuid or uuid_factory(self.prefix or "COMMAND")()
+        self.uuid = self.uuid or uuid_factory(self.prefix or "COMMAND", TIME_ORDERED_UUIDS)()
         self.event_type = self.event_type or CommandType.GENERIC_COMMAND
 
 
+@slotted()
 @dataclass
 class MLCommand(BaseCommand):
     prefix: str = "ML-COMMAND"
@@ -152,6 +226,7 @@ class MLCommand(BaseCommand):
         self.payload = payload or {}
 
 
+@slotted()
 @dataclass
 class RedactorCommand(BaseCommand):
     prefix: str = "REDACTOR-COMMAND"
@@ -162,12 +237,14 @@ class RedactorCommand(BaseCommand):
         self.payload = payload or {}
 
 
+@slotted()
 @dataclass
 class GenericEvent(BaseEvent):
     prefix: str = "GENERIC-EVENT"
     generic_model_data: dict = field(default_factory=dict)
 
 
+@slotted()
 @dataclass
 class MetricsEvent(BaseEvent):
     metrics: dict = field(default_factory=dict)
@@ -179,6 +256,7 @@ class MetricsEvent(BaseEvent):
         self.event_type = event_type or EventType.METRICS_EVENT
 
 
+@slotted()
 @dataclass
 class StreamEvent(BaseEvent):
     stream_data: dict = field(default_factory=dict)
@@ -189,6 +267,7 @@ class StreamEvent(BaseEvent):
         self.stream_data = stream_data
 
 
+@slotted()
 @dataclass
 class FrameEvent(BaseEvent):
     try:
@@ -209,32 +288,37 @@ class FrameEvent(BaseEvent):
         self.event_type = event_type or EventType.FRAME_GRABBED
 
 
+@slotted()
 @dataclass
 class DetectionEvent(BaseEvent):
     prefix: str = "DETECTION-EVENT"
     detections: dict = field(default_factory=dict)
 
-    def __init__(self, detections: dict, correlations: dict = {}, event_type=None, *args, **kwargs):
+    def __init__(self, detections: dict, correlations: dict = None, event_type=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.detections = detections
         self.uuid = detections.get("id", None) or detections["uuid"]
         self.event_type = event_type or EventType.OBJECT_DETECTED
-        self.correlations = correlations
+        if correlations:
+            self.correlations = correlations
 
 
+@slotted()
 @dataclass
 class EmbeddingEvent(BaseEvent):
     prefix: str = "EMBEDDING-EVENT"
     embeddings: list = field(default_factory=dict)
 
-    def __init__(self, embeddings: dict, correlations: dict = {}, event_type=None, *args, **kwargs):
+    def __init__(self, embeddings: dict, correlations: dict = None, event_type=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.embeddings = embeddings
         self.uuid = embeddings["id"]
         self.event_type = event_type or EventType.OBJECT_ENCODED
-        self.correlations = correlations
+        if correlations:
+            self.correlations = correlations
 
 
+@slotted()
 @dataclass
 class TrackingEvent(BaseEvent):
     prefix: str = "TRACKING-EVENT"
@@ -242,29 +326,33 @@ class TrackingEvent(BaseEvent):
     replaced: dict = field(default_factory=dict)
 
     def __init__(
-        self, detection: dict, replaced: dict, correlations: dict = {}, event_type=None, *args, **kwargs
+        self, detection: dict, replaced: dict, correlations: dict = None, event_type=None, *args, **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.detection = detection
         self.replaced = replaced
         self.event_type = event_type or EventType.OBJECT_TRACKING_ACTIVE
-        self.correlations = correlations
+        if correlations:
+            self.correlations = correlations
 
 
+@slotted()
 @dataclass
 class TrackableEvent(BaseEvent):
     prefix: str = "TRACKABLE-EVENT"
     trackable: dict = field(default_factory=dict)
 
     def __init__(
-        self, trackable: dict, correlations: dict = {}, event_type: EventType = None, *args, **kwargs
+        self, trackable: dict, correlations: dict = None, event_type: EventType = None, *args, **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.trackable = trackable
-        self.correlations = correlations
+        if correlations:
+            self.correlations = correlations
         self.event_type = event_type or EventType.TRACKABLE_CREATED
 
 
+@slotted("matches")
 @dataclass
 class MatchEvent(BaseEvent):
     prefix: str = "MATCH-EVENT"
@@ -279,6 +367,7 @@ class MatchEvent(BaseEvent):
         self.event_type = event_type or EventType.MATCH_FOUND
 
 
+@slotted("route", "user_id", "data")
 @dataclass
 class FileEvent(BaseEvent):
     prefix: str = "FILES-EVENT"
@@ -293,6 +382,7 @@ class FileEvent(BaseEvent):
         self.event_type = event_type or EventType.FILES_UPLOADED
 
 
+@slotted("user_id", "receipt_data")
 @dataclass
 class ReceiptEvent(BaseEvent):
     prefix: str = "RECEIPT-EVENT"
@@ -304,6 +394,7 @@ class ReceiptEvent(BaseEvent):
         self.event_type = event_type or EventType.RECEIPT_CREATED
 
 
+@slotted("user_id", "transaction_data")
 @dataclass
 class TransactionEvent(BaseEvent):
     prefix: str = "TRANSACTION-EVENT"
@@ -315,6 +406,7 @@ class TransactionEvent(BaseEvent):
         self.event_type = event_type or EventType.TRANSACTION_LOADED
 
 
+@slotted()
 @dataclass
 class DocumentEvent(BaseEvent):
     prefix: str = "DOCUMENT-EVENT"
@@ -327,7 +419,7 @@ class DocumentEvent(BaseEvent):
         self,
         document_id: str,
         signature: str = "",
-        data: dict = {},
+        data: dict = None,
         user_id: str = "",
         event_type: EventType = None,
         *args,
@@ -336,11 +428,12 @@ class DocumentEvent(BaseEvent):
         super().__init__(*args, **kwargs)
         self.document_id = document_id
         self.signature = signature
-        self.data = data
+        self.data = data if data is not None else {}
         self.user_id = user_id
         self.event_type = event_type or EventType.DOCUMENT_CREATED
 
 
+@slotted()
 @dataclass
 class StorageEvent(BaseEvent):
     prefix: str = "STORAGE-EVENT"
@@ -358,6 +451,7 @@ class StorageEvent(BaseEvent):
         self.event_type = event_type or EventType.OBJECT_STORED
 
 
+@slotted()
 @dataclass
 class OCREvent(BaseEvent):
     prefix: str = "OCR-EVENT"
@@ -375,6 +469,7 @@ class OCREvent(BaseEvent):
         self.event_type = event_type or EventType.TEXT_EXTRACTED
 
 
+@slotted()
 @dataclass
 class MLEvent(BaseEvent):
     prefix: str = "ML-EVENT"
@@ -392,6 +487,7 @@ class MLEvent(BaseEvent):
         self.event_type = event_type or EventType.TEXT_LINES_CLASSIFIED
 
 
+@slotted()
 @dataclass
 class RedactorEvent(BaseEvent):
     prefix: str = "REDACTOR-EVENT"
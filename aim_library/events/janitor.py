@@ -0,0 +1,180 @@
+from collections import Counter
+from time import monotonic
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aim_library.events.metrics import collect_group_stats, collect_pool_stats
+from aim_library.events.redisstream import RedisStream, increment_id, maybe_decode
+
+START = "0-0"
+
+
+class PelJanitor:
+    def __init__(
+        self,
+        broker,
+        group_name: str,
+        consumer_name: str,
+        streams: List[str],
+        max_retries: int,
+        retry_after: int,
+        interval: float = 1.0,
+        claim_count: int = 1,
+        batch_size: int = 100,
+        scan_limit: int = 1000,
+        retries=None,
+    ):
+        self.broker = broker
+        self.group_name = group_name
+        self.consumer_name = consumer_name
+        self.streams = list(streams)
+        self.max_retries = max_retries
+        self.retry_after = retry_after
+        self.interval = interval
+        self.claim_count = claim_count
+        self.batch_size = batch_size
+        self.scan_limit = scan_limit
+        self.retries = retries
+        self.retry_backlog = False
+        self.claim_cursors: Dict[str, Any] = {s: START for s in self.streams}
+        self.scan_cursors: Dict[str, Any] = {s: "-" for s in self.streams}
+        self.claim_backlog: Set[str] = set()  # Streams whose last claim stopped at claim_count
+        self.discarded: Counter = Counter()
+        self.claimed: Counter = Counter()
+        self.group_stats: Dict[str, Dict[str, Any]] = {}
+        self.runs = 0
+        self._last_run = float("-inf")
+
+    def due(self) -> bool:
+        return monotonic() - self._last_run >= self.interval
+
+    def maybe_run(self) -> List[Tuple[str, list]]:
+        if self.due():
+            return self.run()
+        return self.continue_claims()
+
+    def run(self) -> List[Tuple[str, list]]:
+        self._last_run = monotonic()
+        self.runs += 1
+        discarded = {stream: self.discard_max_retries(stream) for stream in self.streams}
+        discarded = {stream: ids for stream, ids in discarded.items() if ids}
+        if discarded:
+            print(f"Discarded unprocessable events: {discarded} for {self.consumer_name}")
+        claimed_by_stream = self.take_due_retries()
+        for stream in self.streams:
+            claimed = self.claim(stream)
+            if claimed:
+                claimed_by_stream.append((stream, claimed))
+        self.collect_stats()
+        return claimed_by_stream
+
+    def continue_claims(self) -> List[Tuple[str, list]]:
+        # Between runs only the claims that stopped at claim_count carry on, right away: a cursor that stopped
+        # because XAUTOCLAIM hit its scan limit (COUNT*10 entries) with nothing idle waits for the next run, and the
+        # discard scan and stats stay on `interval`.
+        claimed_by_stream = self.take_due_retries() if self.retry_backlog else []
+        for stream in [stream for stream in self.streams if stream in self.claim_backlog]:
+            claimed = self.claim(stream)
+            if claimed:
+                claimed_by_stream.append((stream, claimed))
+        return claimed_by_stream
+
+    def lag(self) -> Optional[int]:
+        # Entries not yet delivered to the group across all streams; None until Redis reports it (>= 7.0).
+        lags = [stats["lag"] for stats in self.group_stats.values()]
+        if not lags or any(lag is None for lag in lags):
+            return None
+        return sum(lags)
+
+    def take_due_retries(self) -> List[Tuple[str, list]]:
+        if self.retries is None:
+            return []
+        try:
+            due = self.retries.take_due(self.group_name, self.streams, self.claim_count)
+        except Exception as e:
+            print(f"Unable to take due retries: {e}")
+            return []
+        self.retry_backlog = sum(len(messages) for _, messages in due) >= self.claim_count
+        return due
+
+    def collect_stats(self) -> None:
+        try:
+            self.group_stats = collect_group_stats(self.broker, self.group_name, self.streams)
+            collect_pool_stats()
+        except Exception as e:
+            print(f"Unable to collect consumer group stats: {e}")
+
+    def discard_max_retries(self, stream: str) -> list:
+        # Walks at most scan_limit entries of this consumer's pending list per run, resuming where the previous
+        # run stopped, and acknowledges everything over max_retries with a single XACK.
+        to_discard = []
+        scanned = 0
+        try:
+            while scanned < self.scan_limit:
+                messages = self.broker.xpending_range(
+                    stream,
+                    self.group_name,
+                    self.scan_cursors[stream],
+                    "+",
+                    min(self.batch_size, self.scan_limit - scanned),
+                    self.consumer_name,
+                )
+                if not messages:
+                    self.scan_cursors[stream] = "-"
+                    break
+                scanned += len(messages)
+                to_discard += [m["message_id"] for m in messages if m["times_delivered"] > self.max_retries]
+                self.scan_cursors[stream] = increment_id(messages[-1]["message_id"])
+            if to_discard:
+                self.broker.xack(stream, self.group_name, *to_discard)
+                self.discarded[stream] += len(to_discard)
+        except Exception as e:
+            header = " AN EXCEPTION OCURRED WHEN RUNNING PelJanitor.discard_max_retries "
+            print(f"{header:#^80}")
+            print(e)
+            print("#" * 80)
+        return to_discard
+
+    def claim(self, stream: str) -> list:
+        next_id, claimed, _ = self.broker.xautoclaim(
+            stream,
+            self.group_name,
+            self.consumer_name,
+            min_idle_time=self.retry_after,
+            start_id=self.claim_cursors[stream],
+            count=self.claim_count,
+        )
+        # XAUTOCLAIM returns 0-0 once the whole pending list has been scanned, which restarts the next run.
+        self.claim_cursors[stream] = maybe_decode(next_id) or START
+        if len(claimed) >= self.claim_count and self.claim_cursors[stream] != START:
+            self.claim_backlog.add(stream)
+        else:
+            self.claim_backlog.discard(stream)
+        self.claimed[stream] += len(claimed)
+        return claimed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "streams": {
+                stream: {
+                    "discarded": self.discarded[stream],
+                    "claimed": self.claimed[stream],
+                    "claim_cursor": self.claim_cursors[stream],
+                }
+                for stream in self.streams
+            },
+        }
+
+
+def make_janitor(broker, consumer_group_config, consumer_name, max_retries) -> PelJanitor:
+    return PelJanitor(
+        broker,
+        consumer_group_config["name"],
+        consumer_name,
+        consumer_group_config["streams"],
+        max_retries,
+        consumer_group_config.get("retry_after", 300000),
+        interval=consumer_group_config.get("janitor_interval", 1.0),
+        claim_count=consumer_group_config.get("batch_size", 1),
+        retries=RedisStream.get_retry_scheduler(),
+    )
@@ -0,0 +1,143 @@
+import atexit
+import os
+import queue
+import random
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# (stream, fields, XADD trimming arguments, correlation id)
+Entry = Tuple[str, Dict[str, bytes], Dict[str, Any], str]
+
+
+# Entries go to the partition their producer resolved. With the correlation index given by `index_factory` on, entries
+# with a correlation id are indexed in the pipeline that writes them, like the events produce_one writes.
+class LogSink:
+    def __init__(
+        self,
+        broker_factory,
+        index_factory=None,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 0.2,
+        overflow: str = "drop_newest",
+        sample_above: float = 0.8,
+        sample_rate: float = 0.1,
+    ):
+        if overflow not in ("drop_newest", "drop_oldest"):
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected 'drop_newest' or 'drop_oldest'")
+        self.broker_factory = broker_factory
+        self.index_factory = index_factory
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_above = sample_above
+        self.sample_rate = sample_rate
+        self.sent = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _ensure_started(self) -> None:
+        # Threads don't survive a fork, so a child process (e.g. a process handler pool) gets its own queue.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue: "queue.Queue[Entry]" = queue.Queue(maxsize=self.max_queue)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def put(
+        self,
+        stream_name: str,
+        entry: Dict[str, bytes],
+        trim: Optional[Dict[str, Any]] = None,
+        priority: bool = False,
+        correlation_id: str = "",
+    ):
+        item = (stream_name, entry, trim or {}, correlation_id)
+        self._ensure_started()
+        if not priority and self._queue.qsize() >= self.sample_above * self.max_queue:
+            if random.random() >= self.sample_rate:
+                self.sampled_out += 1
+                return
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            if self.overflow == "drop_newest":
+                self.dropped += 1
+                return
+        try:
+            self._queue.get_nowait()
+            self.dropped += 1
+            self._queue.put_nowait(item)
+        except (queue.Empty, queue.Full):
+            self.dropped += 1
+
+    def _next_batch(self, timeout: float):
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _send(self, batch) -> None:
+        try:
+            index = self.index_factory() if self.index_factory else None
+            pipe = self.broker_factory().pipeline(transaction=False)
+            for stream_name, entry, trim, correlation_id in batch:
+                if index:
+                    index.xadd(pipe, stream_name, entry, correlation_id, **trim)
+                else:
+                    pipe.xadd(stream_name, entry, **trim)
+            pipe.execute()
+            self.sent += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            header = " AN EXCEPTION OCURRED WHEN FLUSHING LOG EVENTS "
+            print(f"{header:#^80}")
+            print(e)
+            print("#" * 80)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self._send(batch)
+        while batch := self._next_batch(0):
+            self._send(batch)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self) -> Dict[str, Any]:
+        queued = self._queue.qsize() if self._pid == os.getpid() else 0
+        return {
+            "queued": queued,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "failed": self.failed,
+        }
+
+
+def make_log_sink(broker_factory, sink_config: Optional[dict], index_factory=None) -> Optional[LogSink]:
+    if not sink_config or not sink_config.get("enabled", True):
+        return None
+    options = {k: v for k, v in sink_config.items() if k != "enabled"}
+    return LogSink(broker_factory, index_factory, **options)
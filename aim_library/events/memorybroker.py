@@ -0,0 +1,738 @@
+import asyncio
+import threading
+from bisect import bisect_left, bisect_right
+from functools import wraps
+from time import sleep, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+
+from aim_library.events.correlationindex import XADD_INDEXED
+
+MAX_ID = (2**64 - 1, 2**64 - 1)
+
+StreamId = Tuple[int, int]
+
+
+def to_bytes(value: Any) -> bytes:
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return repr(value).encode("utf-8")
+
+
+def to_str(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else str(value)
+
+
+def parse_id(value: Any, default_seq: int = 0) -> StreamId:
+    value = to_str(value)
+    if value == "-":
+        return 0, 0
+    if value == "+":
+        return MAX_ID
+    ms, _, seq = value.partition("-")
+    return int(ms), int(seq) if seq else default_seq
+
+
+def format_id(id_: StreamId) -> bytes:
+    return f"{id_[0]}-{id_[1]}".encode("utf-8")
+
+
+def now_ms() -> int:
+    return int(time() * 1000)
+
+
+def parse_score(value: Any, default: float) -> Tuple[float, bool]:
+    value = to_str(value)
+    exclusive = value.startswith("(")
+    value = value[1:] if exclusive else value
+    if value in ("-inf", "+inf", "inf"):
+        return float(value), exclusive
+    return (float(value) if value else default), exclusive
+
+
+class Stream:
+    def __init__(self):
+        self.ids: List[StreamId] = []
+        self.entries: Dict[StreamId, Dict[bytes, bytes]] = {}
+        self.last_id: StreamId = (0, 0)
+        self.entries_added = 0
+        self.groups: Dict[str, "Group"] = {}
+
+    def next_id(self) -> StreamId:
+        ms = now_ms()
+        last_ms, last_seq = self.last_id
+        return (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+
+    def range(self, low: StreamId, high: StreamId) -> List[StreamId]:
+        return self.ids[bisect_left(self.ids, low) : bisect_right(self.ids, high)]
+
+    def trim(self, maxlen: Optional[int] = None, minid: Optional[StreamId] = None) -> int:
+        # Always exact: approximate trimming in Redis only ever keeps more entries than asked for.
+        drop = 0
+        if maxlen is not None:
+            drop = max(drop, len(self.ids) - maxlen)
+        if minid is not None:
+            drop = max(drop, bisect_left(self.ids, minid))
+        for id_ in self.ids[:drop]:
+            del self.entries[id_]
+        del self.ids[:drop]
+        return drop
+
+    def lag(self, group: "Group") -> int:
+        return len(self.ids) - bisect_right(self.ids, group.last_delivered)
+
+
+class Group:
+    def __init__(self, last_delivered: StreamId):
+        self.last_delivered = last_delivered
+        self.entries_read = 0
+        # entry id -> [consumer name, delivery time (ms), delivery count]
+        self.pending: Dict[StreamId, list] = {}
+        self.consumers: Dict[str, int] = {}
+
+    def seen(self, consumer_name: str) -> None:
+        self.consumers[consumer_name] = now_ms()
+
+    def pending_ids(self, low: StreamId = (0, 0), high: StreamId = MAX_ID, consumer_name: str = None):
+        return [
+            id_
+            for id_ in sorted(self.pending)
+            if low <= id_ <= high and (consumer_name is None or self.pending[id_][0] == consumer_name)
+        ]
+
+
+class ZSet(dict):
+    def ordered(self) -> List[Tuple[bytes, float]]:
+        return sorted(self.items(), key=lambda item: (item[1], item[0]))
+
+
+def command(method: Callable) -> Callable:
+    # Every command pays the simulated round trip once and runs under the broker lock. Commands called from inside
+    # another command (a pipeline, or a subclass override calling super()) don't pay it again.
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if getattr(self._local, "depth", 0):
+            return method(self, *args, **kwargs)
+        if self.latency:
+            sleep(self.latency)
+        with self._lock:
+            self._local.depth = 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._local.depth = 0
+
+    return wrapper
+
+
+class InMemoryBroker:
+    # In-process stand-in for the StrictRedis client of the events stream: the stream and consumer group commands
+    # the consumers, producers, janitor, retries and dedupe use, plus the few key, hash, set and sorted set commands
+    # around them. EVAL runs the scripts of the library, through their Python equivalents. Replies have the shapes
+    # redis-py gives them (bytes names and ids). `latency` seconds are slept once per command or pipeline to simulate
+    # the network round trip.
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._local = threading.local()
+
+    def _get(self, name: Any, kind: type, create: bool = False) -> Any:
+        name = to_str(name)
+        if name in self._expires and self._expires[name] <= time():
+            self._delete(name)
+        value = self._data.get(name)
+        if value is None:
+            if not create:
+                return None
+            value = self._data[name] = kind()
+        if not isinstance(value, kind):
+            raise ResponseError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def _delete(self, name: str) -> bool:
+        self._expires.pop(name, None)
+        return self._data.pop(name, None) is not None
+
+    def _stream(self, name: Any) -> Stream:
+        stream = self._get(name, Stream)
+        if stream is None:
+            raise ResponseError("ERR no such key")
+        return stream
+
+    def _group(self, name: Any, group_name: Any) -> Tuple[Stream, Group]:
+        stream = self._get(name, Stream)
+        group = stream.groups.get(to_str(group_name)) if stream is not None else None
+        if group is None:
+            raise ResponseError(f"NOGROUP No such key '{to_str(name)}' or consumer group '{to_str(group_name)}'")
+        return stream, group
+
+    # Keys
+
+    @command
+    def ping(self) -> bool:
+        return True
+
+    @command
+    def flushdb(self) -> bool:
+        self._data.clear()
+        self._expires.clear()
+        return True
+
+    @command
+    def exists(self, *names) -> int:
+        return sum(self._get(name, object) is not None for name in names)
+
+    @command
+    def delete(self, *names) -> int:
+        return sum(self._delete(to_str(name)) for name in names)
+
+    @command
+    def expire(self, name, time_: int) -> bool:
+        return self.expireat(name, time() + int(time_))
+
+    @command
+    def ttl(self, name) -> int:
+        if self._get(name, object) is None:
+            return -2
+        expires = self._expires.get(to_str(name))
+        return -1 if expires is None else round(expires - time())
+
+    @command
+    def expireat(self, name, when) -> bool:
+        if self._get(name, object) is None:
+            return False
+        self._expires[to_str(name)] = when.timestamp() if hasattr(when, "timestamp") else float(when)
+        return True
+
+    @command
+    def get(self, name) -> Optional[bytes]:
+        return self._get(name, bytes)
+
+    @command
+    def set(self, name, value, ex=None, nx: bool = False) -> Optional[bool]:
+        if nx and self._get(name, object) is not None:
+            return None
+        self._delete(to_str(name))
+        self._data[to_str(name)] = to_bytes(value)
+        if ex is not None:
+            self._expires[to_str(name)] = time() + int(ex)
+        return True
+
+    @command
+    def incr(self, name, amount: int = 1) -> int:
+        value = int(self._get(name, bytes) or 0) + amount
+        self._data[to_str(name)] = to_bytes(value)
+        return value
+
+    # Hashes
+
+    @command
+    def hset(self, name, key=None, value=None, mapping: dict = None) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        hash_ = self._get(name, dict, create=True)
+        added = 0
+        for k, v in items.items():
+            added += to_bytes(k) not in hash_
+            hash_[to_bytes(k)] = to_bytes(v)
+        return added
+
+    @command
+    def hget(self, name, key) -> Optional[bytes]:
+        return (self._get(name, dict) or {}).get(to_bytes(key))
+
+    @command
+    def hmget(self, name, keys, *args) -> List[Optional[bytes]]:
+        keys = [keys] if isinstance(keys, (str, bytes)) else list(keys)
+        hash_ = self._get(name, dict) or {}
+        return [hash_.get(to_bytes(key)) for key in keys + list(args)]
+
+    @command
+    def hgetall(self, name) -> Dict[bytes, bytes]:
+        return dict(self._get(name, dict) or {})
+
+    @command
+    def hdel(self, name, *keys) -> int:
+        hash_ = self._get(name, dict) or {}
+        return sum(hash_.pop(to_bytes(key), None) is not None for key in keys)
+
+    @command
+    def hincrby(self, name, key, amount: int = 1) -> int:
+        hash_ = self._get(name, dict, create=True)
+        value = int(hash_.get(to_bytes(key), 0)) + amount
+        hash_[to_bytes(key)] = to_bytes(value)
+        return value
+
+    # Sets
+
+    @command
+    def sadd(self, name, *values) -> int:
+        set_ = self._get(name, set, create=True)
+        before = len(set_)
+        set_.update(to_bytes(value) for value in values)
+        return len(set_) - before
+
+    @command
+    def sismember(self, name, value) -> bool:
+        return to_bytes(value) in (self._get(name, set) or ())
+
+    @command
+    def smismember(self, name, values, *args) -> List[bool]:
+        values = [values] if isinstance(values, (str, bytes)) else list(values)
+        set_ = self._get(name, set) or ()
+        return [to_bytes(value) in set_ for value in values + list(args)]
+
+    @command
+    def smembers(self, name) -> set:
+        return set(self._get(name, set) or ())
+
+    # Sorted sets, as {member: score} dicts
+
+    @command
+    def zadd(self, name, mapping: dict, nx: bool = False, xx: bool = False) -> int:
+        zset = self._get(name, ZSet, create=True)
+        added = 0
+        for member, score in mapping.items():
+            member = to_bytes(member)
+            if (nx and member in zset) or (xx and member not in zset):
+                continue
+            added += member not in zset
+            zset[member] = float(score)
+        return added
+
+    @command
+    def zrem(self, name, *values) -> int:
+        zset = self._get(name, ZSet) or {}
+        return sum(zset.pop(to_bytes(value), None) is not None for value in values)
+
+    @command
+    def zcard(self, name) -> int:
+        return len(self._get(name, ZSet) or ())
+
+    @command
+    def zscore(self, name, value) -> Optional[float]:
+        return (self._get(name, ZSet) or {}).get(to_bytes(value))
+
+    @command
+    def zrangebyscore(self, name, min, max, start: int = None, num: int = None, withscores: bool = False) -> list:
+        low, low_exclusive = parse_score(min, float("-inf"))
+        high, high_exclusive = parse_score(max, float("inf"))
+        members = [
+            (member, score)
+            for member, score in (self._get(name, ZSet) or ZSet()).ordered()
+            if (low < score if low_exclusive else low <= score) and (score < high if high_exclusive else score <= high)
+        ]
+        if start is not None:
+            members = members[start : None if num is None or num < 0 else start + num]
+        return members if withscores else [member for member, _ in members]
+
+    @command
+    def zremrangebyrank(self, name, min: int, max: int) -> int:
+        zset = self._get(name, ZSet) or ZSet()
+        ordered = zset.ordered()
+        start, stop = (rank if rank >= 0 else len(ordered) + rank for rank in (min, max))
+        removed = ordered[start if start >= 0 else 0 : stop + 1]
+        for member, _ in removed:
+            del zset[member]
+        return len(removed)
+
+    # Streams
+
+    @command
+    def xadd(
+        self,
+        name,
+        fields: dict,
+        id="*",
+        maxlen: int = None,
+        approximate: bool = True,
+        nomkstream: bool = False,
+        minid=None,
+        limit: int = None,
+    ) -> Optional[bytes]:
+        stream = self._get(name, Stream, create=not nomkstream)
+        if stream is None:
+            return None
+        id_ = stream.next_id() if to_str(id) == "*" else parse_id(id)
+        if id_ <= stream.last_id:
+            raise ResponseError("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.ids.append(id_)
+        stream.entries[id_] = {to_bytes(k): to_bytes(v) for k, v in fields.items()}
+        stream.last_id = id_
+        stream.entries_added += 1
+        stream.trim(maxlen, parse_id(minid) if minid is not None else None)
+        self._changed.notify_all()
+        return format_id(id_)
+
+    @command
+    def xtrim(self, name, maxlen: int = None, approximate: bool = True, minid=None, limit: int = None) -> int:
+        stream = self._get(name, Stream)
+        return stream.trim(maxlen, parse_id(minid) if minid is not None else None) if stream else 0
+
+    @command
+    def xdel(self, name, *ids) -> int:
+        stream = self._get(name, Stream)
+        if stream is None:
+            return 0
+        deleted = 0
+        for id_ in map(parse_id, ids):
+            if stream.entries.pop(id_, None) is not None:
+                stream.ids.remove(id_)
+                deleted += 1
+        return deleted
+
+    @command
+    def xlen(self, name) -> int:
+        stream = self._get(name, Stream)
+        return len(stream.ids) if stream else 0
+
+    def _range(self, name, min, max, count, reverse=False) -> List[Tuple[bytes, Dict[bytes, bytes]]]:
+        stream = self._get(name, Stream)
+        if stream is None:
+            return []
+        ids = stream.range(parse_id(min), parse_id(max, default_seq=MAX_ID[1]))
+        ids = ids[::-1] if reverse else ids
+        return [(format_id(id_), dict(stream.entries[id_])) for id_ in ids[:count]]
+
+    @command
+    def xrange(self, name, min="-", max="+", count: int = None) -> list:
+        return self._range(name, min, max, count)
+
+    @command
+    def xrevrange(self, name, max="+", min="-", count: int = None) -> list:
+        return self._range(name, min, max, count, reverse=True)
+
+    @command
+    def xgroup_create(self, name, groupname, id="$", mkstream: bool = False, entries_read: int = None) -> bool:
+        stream = self._get(name, Stream, create=mkstream)
+        if stream is None:
+            raise ResponseError("ERR The XGROUP subcommand requires the key to exist")
+        if to_str(groupname) in stream.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        stream.groups[to_str(groupname)] = Group(stream.last_id if to_str(id) == "$" else parse_id(id))
+        return True
+
+    @command
+    def xgroup_destroy(self, name, groupname) -> int:
+        stream = self._get(name, Stream)
+        return int(stream is not None and stream.groups.pop(to_str(groupname), None) is not None)
+
+    @command
+    def xgroup_setid(self, name, groupname, id) -> bool:
+        stream, group = self._group(name, groupname)
+        group.last_delivered = stream.last_id if to_str(id) == "$" else parse_id(id)
+        return True
+
+    @command
+    def xgroup_createconsumer(self, name, groupname, consumername) -> int:
+        _, group = self._group(name, groupname)
+        if to_str(consumername) in group.consumers:
+            return 0
+        group.seen(to_str(consumername))
+        return 1
+
+    @command
+    def xgroup_delconsumer(self, name, groupname, consumername) -> int:
+        _, group = self._group(name, groupname)
+        consumer_name = to_str(consumername)
+        owned = group.pending_ids(consumer_name=consumer_name)
+        for id_ in owned:
+            del group.pending[id_]
+        group.consumers.pop(consumer_name, None)
+        return len(owned)
+
+    def _read_group(self, group_name, consumer_name, streams: dict, count, noack) -> list:
+        result = []
+        for name, start in streams.items():
+            stream, group = self._group(name, group_name)
+            group.seen(consumer_name)
+            if to_str(start) == ">":
+                start_at = bisect_right(stream.ids, group.last_delivered)
+                ids = stream.ids[start_at : start_at + count if count else None]
+                if not ids:
+                    continue
+                group.last_delivered = ids[-1]
+                group.entries_read += len(ids)
+                for id_ in ids if not noack else ():
+                    group.pending[id_] = [consumer_name, now_ms(), 1]
+            else:
+                # History: the consumer's own pending entries, each read counts as a delivery
+                ids = group.pending_ids(parse_id(start), consumer_name=consumer_name)
+                ids = [id_ for id_ in ids if id_ > parse_id(start)][:count]
+                for id_ in ids:
+                    group.pending[id_][1:] = [now_ms(), group.pending[id_][2] + 1]
+            messages = [(format_id(id_), dict(stream.entries[id_]) if id_ in stream.entries else None) for id_ in ids]
+            result.append([to_bytes(name), messages])
+        return result
+
+    @command
+    def xreadgroup(
+        self, groupname, consumername, streams: dict, count: int = None, block: int = None, noack: bool = False
+    ) -> list:
+        group_name, consumer_name = to_str(groupname), to_str(consumername)
+        deadline = None if not block else time() + block / 1000
+        while True:
+            result = self._read_group(group_name, consumer_name, streams, count, noack)
+            if result or block is None:
+                return result
+            timeout = None if deadline is None else deadline - time()
+            if timeout is not None and timeout <= 0:
+                return []
+            self._changed.wait(timeout)
+
+    @command
+    def xack(self, name, groupname, *ids) -> int:
+        _, group = self._group(name, groupname)
+        return sum(group.pending.pop(parse_id(id_), None) is not None for id_ in ids)
+
+    def _claim(self, group: Group, consumer_name: str, id_: StreamId, idle: int, count: bool) -> None:
+        group.seen(consumer_name)
+        entry = group.pending[id_]
+        entry[:] = [consumer_name, now_ms() - idle, entry[2] + count]
+
+    @command
+    def xautoclaim(
+        self,
+        name,
+        groupname,
+        consumername,
+        min_idle_time: int,
+        start_id="0-0",
+        count: int = 100,
+        justid: bool = False,
+    ) -> list:
+        stream, group = self._group(name, groupname)
+        consumer_name = to_str(consumername)
+        count = count or 100
+        pending = group.pending_ids(parse_id(start_id))
+        claimed, deleted, scanned = [], [], 0
+        for id_ in pending[: count * 10]:  # Redis also gives up after count * 10 entries
+            scanned += 1
+            if now_ms() - group.pending[id_][1] < min_idle_time:
+                continue
+            if id_ not in stream.entries:
+                del group.pending[id_]
+                deleted.append(format_id(id_))
+                continue
+            self._claim(group, consumer_name, id_, 0, not justid)
+            claimed.append(id_)
+            if len(claimed) == count:
+                break
+        next_id = format_id(pending[scanned]) if scanned < len(pending) else b"0-0"
+        if justid:
+            return [format_id(id_) for id_ in claimed]
+        return [next_id, [(format_id(id_), dict(stream.entries[id_])) for id_ in claimed], deleted]
+
+    @command
+    def xclaim(
+        self,
+        name,
+        groupname,
+        consumername,
+        min_idle_time: int,
+        message_ids,
+        idle: int = None,
+        justid: bool = False,
+    ) -> list:
+        stream, group = self._group(name, groupname)
+        claimed = []
+        for id_ in map(parse_id, message_ids):
+            if id_ not in group.pending or now_ms() - group.pending[id_][1] < min_idle_time:
+                continue
+            self._claim(group, to_str(consumername), id_, idle or 0, not justid)
+            claimed.append(id_)
+        if justid:
+            return [format_id(id_) for id_ in claimed]
+        return [(format_id(id_), dict(stream.entries[id_])) for id_ in claimed if id_ in stream.entries]
+
+    @command
+    def xpending(self, name, groupname) -> dict:
+        _, group = self._group(name, groupname)
+        ids = group.pending_ids()
+        owners: Dict[str, int] = {}
+        for id_ in ids:
+            owners[group.pending[id_][0]] = owners.get(group.pending[id_][0], 0) + 1
+        return {
+            "pending": len(ids),
+            "min": format_id(ids[0]) if ids else None,
+            "max": format_id(ids[-1]) if ids else None,
+            "consumers": [{"name": to_bytes(owner), "pending": n} for owner, n in owners.items()],
+        }
+
+    @command
+    def xpending_range(self, name, groupname, min, max, count: int, consumername=None, idle: int = None) -> list:
+        _, group = self._group(name, groupname)
+        consumer_name = to_str(consumername) if consumername is not None else None
+        pending = []
+        for id_ in group.pending_ids(parse_id(min), parse_id(max, default_seq=MAX_ID[1]), consumer_name):
+            owner, delivered_at, times_delivered = group.pending[id_]
+            if idle is not None and now_ms() - delivered_at < idle:
+                continue
+            pending.append(
+                {
+                    "message_id": format_id(id_),
+                    "consumer": to_bytes(owner),
+                    "time_since_delivered": now_ms() - delivered_at,
+                    "times_delivered": times_delivered,
+                }
+            )
+            if len(pending) == count:
+                break
+        return pending
+
+    @command
+    def xinfo_groups(self, name) -> List[dict]:
+        stream = self._stream(name)
+        return [
+            {
+                "name": to_bytes(group_name),
+                "consumers": len(group.consumers),
+                "pending": len(group.pending),
+                "last-delivered-id": format_id(group.last_delivered),
+                "entries-read": group.entries_read,
+                "lag": stream.lag(group),
+            }
+            for group_name, group in stream.groups.items()
+        ]
+
+    @command
+    def xinfo_consumers(self, name, groupname) -> List[dict]:
+        _, group = self._group(name, groupname)
+        return [
+            {
+                "name": to_bytes(consumer_name),
+                "pending": sum(entry[0] == consumer_name for entry in group.pending.values()),
+                "idle": now_ms() - seen,
+                "inactive": now_ms() - seen,
+            }
+            for consumer_name, seen in group.consumers.items()
+        ]
+
+    @command
+    def xinfo_stream(self, name) -> dict:
+        stream = self._stream(name)
+        first, last = (stream.ids[0], stream.ids[-1]) if stream.ids else (None, None)
+        return {
+            "length": len(stream.ids),
+            "last-generated-id": format_id(stream.last_id),
+            "entries-added": stream.entries_added,
+            "groups": len(stream.groups),
+            "first-entry": (format_id(first), dict(stream.entries[first])) if first else None,
+            "last-entry": (format_id(last), dict(stream.entries[last])) if last else None,
+        }
+
+    # Scripts
+
+    @command
+    def eval(self, script, numkeys: int, *keys_and_args) -> Any:
+        scripts = {XADD_INDEXED: self._xadd_indexed}
+        if script not in scripts:
+            raise ResponseError("ERR the in-memory broker only runs the scripts of aim_library")
+        return scripts[script](keys_and_args[:numkeys], keys_and_args[numkeys:])
+
+    def _xadd_indexed(self, keys: tuple, args: tuple) -> bytes:
+        stream, index_key = keys
+        ttl, max_entries, xadd = int(args[0]), int(args[1]), args[2:]
+        trim = {}
+        if to_str(xadd[0]) == "MAXLEN":
+            trim, xadd = {"maxlen": int(xadd[2]), "approximate": to_str(xadd[1]) == "~"}, xadd[3:]
+        id_ = self.xadd(stream, dict(zip(xadd[1::2], xadd[2::2])), id=xadd[0], **trim)
+        self.zadd(index_key, {to_bytes(stream) + b":" + id_: int(id_.split(b"-")[0])})
+        if max_entries > 0:
+            self.zremrangebyrank(index_key, 0, -max_entries - 1)
+        if ttl > 0 and self.ttl(index_key) < ttl:
+            self.expire(index_key, ttl)
+        return id_
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+    @command
+    def _execute(self, commands: List[Tuple[str, tuple, dict]]) -> list:
+        results = []
+        for name, args, kwargs in commands:
+            try:
+                results.append(getattr(self, name)(*args, **kwargs))
+            except ResponseError as e:
+                results.append(e)  # Like redis-py: errors are raised once the whole pipeline ran
+        error = next((result for result in results if isinstance(result, ResponseError)), None)
+        if error is not None:
+            raise error
+        return results
+
+
+class InMemoryPipeline:
+    # Queues commands and runs them in one round trip under the broker lock, so they are atomic like MULTI/EXEC.
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+        self.commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str) -> Callable[..., "InMemoryPipeline"]:
+        if not callable(getattr(self.broker, name, None)):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs) -> "InMemoryPipeline":
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self.commands)
+
+    def __enter__(self) -> "InMemoryPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.commands = []
+
+    def execute(self) -> list:
+        commands, self.commands = self.commands, []
+        return self.broker._execute(commands) if commands else []
+
+
+class AsyncInMemoryBroker:
+    # The redis.asyncio face of an InMemoryBroker, for AsyncRedisStream: every command runs in a thread so blocking
+    # reads don't stall the event loop.
+    def __init__(self, broker: InMemoryBroker):
+        self.broker = broker
+
+    def __getattr__(self, name: str) -> Callable:
+        method = getattr(self.broker, name)
+
+        async def run(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return run
+
+    def pipeline(self, transaction: bool = True) -> "AsyncInMemoryPipeline":
+        return AsyncInMemoryPipeline(self.broker)
+
+
+class AsyncInMemoryPipeline(InMemoryPipeline):
+    async def execute(self) -> list:
+        return await asyncio.to_thread(super().execute)
+
+    async def __aenter__(self) -> "AsyncInMemoryPipeline":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.commands = []
+
+
+def install_memory_broker(broker: InMemoryBroker = None) -> InMemoryBroker:
+    # Makes RedisStream (and AsyncRedisStream) use `broker`, a new one by default, instead of Redis.
+    from aim_library.events.asyncredisstream import AsyncRedisStream
+    from aim_library.events.redisstream import RedisStream
+
+    broker = broker or InMemoryBroker()
+    RedisStream.set_broker(broker)
+    AsyncRedisStream.set_broker(AsyncInMemoryBroker(broker))
+    return broker
@@ -0,0 +1,267 @@
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, perf_counter
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from aim_library.utils.redisclients import pool_stats
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+METER_WINDOW = 60
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th observation, the same resolution Prometheus would give.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for upper, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return upper
+        return float("inf")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+            }
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Meter:
+    # Events per second over the last METER_WINDOW seconds, kept in one bucket per second.
+    kind = "gauge"
+
+    def __init__(self, window: int = METER_WINDOW):
+        self.window = window
+        self.seconds = [-1] * window
+        self.counts = [0] * window
+        self._lock = threading.Lock()
+
+    def mark(self, amount: int = 1) -> None:
+        now = int(monotonic())
+        slot = now % self.window
+        with self._lock:
+            if self.seconds[slot] != now:
+                self.seconds[slot] = now
+                self.counts[slot] = 0
+            self.counts[slot] += amount
+
+    def rate(self) -> float:
+        now = int(monotonic())
+        with self._lock:
+            total = sum(c for s, c in zip(self.seconds, self.counts) if now - self.window < s <= now)
+        return total / self.window
+
+    def snapshot(self) -> float:
+        return self.rate()
+
+
+class MetricsRegistry:
+    def __init__(self, namespace: str = "aim"):
+        self.namespace = namespace
+        self._metrics: Dict[str, Dict[Labels, Any]] = {}
+        self._kinds: Dict[str, type] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind: type, name: str, labels: Dict[str, Any]):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        metric = self._metrics.get(name, {}).get(key)
+        if type(metric) is kind:  # Without the lock; a name asked for as another kind fails below
+            return metric
+        with self._lock:
+            if self._kinds.setdefault(name, kind) is not kind:
+                raise ValueError(f"Metric '{name}' is already registered as a {self._kinds[name].__name__}")
+            return self._metrics.setdefault(name, {}).setdefault(key, kind())
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._get(Histogram, name, labels)
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get(Gauge, name, labels)
+
+    def meter(self, name: str, **labels) -> Meter:
+        return self._get(Meter, name, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {}
+        for name, series in list(self._metrics.items()):
+            snapshot[name] = [{"labels": dict(labels), "value": m.snapshot()} for labels, m in list(series.items())]
+        return snapshot
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for name, series in sorted(self._metrics.items()):
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {full_name} {self._kinds[name].kind}")
+            for labels, metric in sorted(series.items()):
+                if isinstance(metric, Histogram):
+                    with metric._lock:
+                        cumulative = 0
+                        for upper, count in zip(metric.buckets + (float("inf"),), metric.counts):
+                            cumulative += count
+                            le = "+Inf" if upper == float("inf") else repr(upper)
+                            lines.append(f"{full_name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                        lines.append(f"{full_name}_sum{format_labels(labels)} {metric.sum}")
+                        lines.append(f"{full_name}_count{format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{full_name}{format_labels(labels)} {metric.snapshot()}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+            self._kinds.clear()
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def observe_handler(event_type: str, seconds: float, ok: bool, events: int = 1) -> None:
+    metrics.histogram("handler_latency_seconds", event_type=event_type).observe(seconds)
+    metrics.counter("events_processed_total", event_type=event_type, outcome="ok" if ok else "error").inc(events)
+    metrics.meter("events_per_second", event_type=event_type).mark(events)
+
+
+def time_handler(handler, event_type: str, events: int, *args):
+    start = perf_counter()
+    try:
+        result = handler(*args)
+    except Exception:
+        observe_handler(event_type, perf_counter() - start, ok=False, events=events)
+        raise
+    observe_handler(event_type, perf_counter() - start, ok=not is_error(result), events=events)
+    return result
+
+
+def is_error(result: Any) -> bool:
+    is_err = getattr(result, "is_err", None)
+    return result is not None if is_err is None else is_err()
+
+
+def observe_decode(stream: str, seconds: float, events: int) -> None:
+    metrics.histogram("decode_seconds", stream=stream).observe(seconds / max(events, 1))
+
+
+def observe_ack(stream: str, seconds: float) -> None:
+    metrics.histogram("ack_latency_seconds", stream=stream).observe(seconds)
+
+
+def collect_group_stats(broker, group_name: str, streams: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    # XINFO GROUPS reports the pending list size of every group and, on Redis >= 7, its lag.
+    stats = {}
+    for stream in streams:
+        for group in broker.xinfo_groups(stream):
+            name = group["name"]
+            if (name.decode("utf-8") if isinstance(name, bytes) else name) != group_name:
+                continue
+            metrics.gauge("pending_entries", stream=stream, group=group_name).set(group.get("pending") or 0)
+            if group.get("lag") is not None:
+                metrics.gauge("consumer_lag", stream=stream, group=group_name).set(group["lag"])
+            stats[stream] = {"pending": group.get("pending") or 0, "lag": group.get("lag")}
+    return stats
+
+
+# Last running totals seen per (pool, stat), the counters are advanced by what was added since
+_pool_totals: Dict[Tuple[str, str], float] = {}
+
+
+def collect_pool_stats() -> None:
+    for pool, stats in pool_stats().items():
+        for name in ("in_use", "max_in_use", "max_connections"):
+            if stats[name] is not None:  # max_connections of an unbounded pool
+                metrics.gauge(f"redis_pool_{name}", pool=pool).set(stats[name])
+        for name in ("created", "waits", "wait_seconds", "timeouts"):
+            total, last = stats[name], _pool_totals.get((pool, name), 0)
+            # A total that went down was reset with the pool (after a fork): everything in it is new
+            metrics.counter(f"redis_pool_{name}_total", pool=pool).inc(total - last if total >= last else total)
+            _pool_totals[(pool, name)] = total
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        if self.registry is metrics:
+            collect_pool_stats()
+        body = self.registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = metrics):
+    handler = type("RegistryRequestHandler", (MetricsRequestHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
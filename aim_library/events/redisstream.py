@@ -1,14 +1,31 @@
 import os
-import pickle
+import re
+import warnings
+import zlib
 from pathlib import Path
 from datetime import datetime
 from contextvars import ContextVar, copy_context
 from functools import partial
+from threading import Event, Lock, Timer
+from time import perf_counter
 
 from redis import StrictRedis
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from aim_library.events.batching import entries_size, make_batch_size_controller
+from aim_library.events.causalchain import CausalChain, make_causal_chain, trace_id
+from aim_library.events.claimcheck import ClaimCheck, attach_claim_checks, make_claim_check
+from aim_library.events.dedupe import DedupeWindow, make_dedupe_window, uuid_from_key
+from aim_library.events.eventcontext import EventContext
+from aim_library.events.correlationindex import CorrelationIndex, make_correlation_index
+from aim_library.events.codecs import decode_event, encode_event, get_codec
+from aim_library.events.logsink import LogSink, make_log_sink
+from aim_library.events.retention import Retention, StreamTrimmer, make_retention, make_stream_trimmer
+from aim_library.events.scheduling import TenantLimiter, make_stream_scheduler, make_tenant_limiter
+from aim_library.events.retries import DEAD_LETTER, RetryScheduler, make_retry_scheduler
+from aim_library.events.metrics import metrics, observe_ack, observe_decode, start_metrics_server, time_handler
 from aim_library.utils.common import enabled_by_env, extract_attr, uuid_factory
 from aim_library.utils.configmanager import ConfigManager
+from aim_library.utils.redisclients import get_redis_client
 from aim_library.utils.result import Result, Ok, Error
 
 from aim_library.utils.status import set_document_status
@@ -16,39 +33,312 @@ from aim_library.utils.status import set_document_status
 
 class RedisStream:
     __broker = None
+    __stream_codecs = None
+    __partitions = None
+    __log_sink = None
+    __log_sink_loaded = False
+    __claim_check = None
+    __claim_check_loaded = False
+    __correlation_index = None
+    __correlation_index_loaded = False
+    __retry_scheduler = None
+    __retry_scheduler_loaded = False
+    __dedupe_window = None
+    __causal_chain = None
+    __retention = None
 
     @classmethod
     def get_broker(cls) -> StrictRedis:
         if not cls.__broker:
-            redis_config = ConfigManager.get_config_value("events-stream", "broker")
-            cls.__broker = StrictRedis(
-                host=redis_config["host"],
-                port=redis_config["port"],
-                db=redis_config["db"],
-                password=redis_config["password"],
-            )
+            cls.__broker = get_redis_client("events-stream", "broker")
         return cls.__broker
 
+    @classmethod
+    def set_broker(cls, broker) -> None:
+        # Any object with the StrictRedis stream commands, e.g. memorybroker.InMemoryBroker for benchmarks.
+        cls.__broker = broker
 
-def produce_one(name: str, event: Any, maxlen: int = None) -> str:
-    broker = RedisStream.get_broker()
+    @classmethod
+    def get_stream_codecs(cls) -> Dict[str, str]:
+        if cls.__stream_codecs is None:
+            codecs_config = ConfigManager.get_config_value("events-stream").get("codecs") or {}
+            for codec_name in codecs_config.values():
+                get_codec(codec_name)
+            cls.__stream_codecs = dict(codecs_config)
+        return cls.__stream_codecs
+
+    @classmethod
+    def get_stream_codec(cls, stream_name: str) -> str:
+        stream_codecs = cls.get_stream_codecs()
+        return stream_codecs.get(stream_name) or stream_codecs.get("default") or "pickle"
+
+    @classmethod
+    def set_stream_codec(cls, stream_name: str, codec_name: str) -> None:
+        get_codec(codec_name)
+        cls.get_stream_codecs()[stream_name] = codec_name
+
+    @classmethod
+    def get_partitions(cls) -> Dict[str, int]:
+        if cls.__partitions is None:
+            cls.__partitions = dict(ConfigManager.get_config_value("events-stream").get("partitions") or {})
+        return cls.__partitions
+
+    @classmethod
+    def get_log_sink(cls) -> Optional[LogSink]:
+        if not cls.__log_sink_loaded:
+            sink_config = ConfigManager.get_config_value("events-stream").get("log_sink")
+            if sink_config is None and enabled_by_env("ENABLE_LOG_SINK"):
+                sink_config = {"enabled": True}
+            cls.__log_sink = make_log_sink(cls.get_broker, sink_config, cls.get_correlation_index)
+            cls.__log_sink_loaded = True
+        return cls.__log_sink
+
+    @classmethod
+    def get_claim_check(cls) -> Optional[ClaimCheck]:
+        if not cls.__claim_check_loaded:
+            claim_check_config = ConfigManager.get_config_value("events-stream").get("claim_check")
+            cls.__claim_check = make_claim_check(claim_check_config)
+            cls.__claim_check_loaded = True
+        return cls.__claim_check
+
+    @classmethod
+    def get_correlation_index(cls) -> Optional[CorrelationIndex]:
+        if not cls.__correlation_index_loaded:
+            index_config = ConfigManager.get_config_value("events-stream").get("correlation_index")
+            cls.__correlation_index = make_correlation_index(index_config, cls.get_retention())
+            cls.__correlation_index_loaded = True
+        return cls.__correlation_index
+
+    @classmethod
+    def get_causal_chain(cls) -> CausalChain:
+        if cls.__causal_chain is None:
+            chain_config = ConfigManager.get_config_value("events-stream").get("causal_chain")
+            cls.__causal_chain = make_causal_chain(chain_config)
+        return cls.__causal_chain
+
+    @classmethod
+    def get_retention(cls) -> Retention:
+        if cls.__retention is None:
+            retention_config = ConfigManager.get_config_value("events-stream").get("retention")
+            cls.__retention = make_retention(retention_config)
+        return cls.__retention
+
+    @classmethod
+    def get_dedupe_window(cls) -> Optional[DedupeWindow]:
+        return cls.__dedupe_window
+
+    @classmethod
+    def set_dedupe_window(cls, dedupe_window: Optional[DedupeWindow]) -> None:
+        # Set by the consumer from its group config; handler threads and forked workers see the same window.
+        cls.__dedupe_window = dedupe_window
+
+    @classmethod
+    def get_retry_scheduler(cls) -> Optional[RetryScheduler]:
+        if not cls.__retry_scheduler_loaded:
+            retry_config = ConfigManager.get_config_value("events-stream").get("retry")
+            cls.__retry_scheduler = make_retry_scheduler(cls.get_broker, retry_config, cls.get_retention())
+            cls.__retry_scheduler_loaded = True
+        return cls.__retry_scheduler
+
+
+def make_stream_entry(name: str, event: Any, codec: str = None) -> Dict[str, bytes]:
+    ctx = event_context.get()
+    if ctx is not None:
+        event.correlations = ctx.correlations
+        event.causations = ctx.causations
+    else:  # First event of a chain
+        event.correlations = RedisStream.get_causal_chain().root_correlations()
+        event.causations = []
+    return encode_stream_entry(name, event, codec)
+
+
+def encode_stream_entry(name: str, event: Any, codec: str = None) -> Dict[str, bytes]:
     key = f"{event.event_type.name}:{event.uuid}"
-    event.correlations = correlations_context.get()
-    event.causations = causations_context.get()
-    value = event_to_bytes(event)
-    id_ = broker.xadd(name, {key: value}, maxlen=maxlen)  # type: ignore
-    history = produced_events.get()
-    history.append({"stream": name, "event_type": event.event_type.name, "redis_id": maybe_decode(id_)})
-    produced_events.set(history)
+    claim_check = RedisStream.get_claim_check()
+    if claim_check:
+        event = claim_check.offload(event)
+    return {key: event_to_bytes(event, codec or RedisStream.get_stream_codec(name))}
+
+
+def xadd_entry(client, name: str, event: Any, entry: Dict[str, bytes], **trim):
+    # XADD through `client` (a broker or a pipeline); with the correlation index on, the entry is indexed in the
+    # same command.
+    index = RedisStream.get_correlation_index()
+    if index is None:
+        return client.xadd(name, entry, **trim)
+    return index.xadd(client, name, entry, maybe_retrieve_correlation_id(event), **trim)
+
+
+def record_produced_event(name: str, event: Any, id_: Any) -> None:
+    ctx = event_context.get()
+    if ctx is not None:  # Only events produced while digesting one are reported in its log
+        ctx.produced_events.append({"stream": name, "event_type": event.event_type.name, "redis_id": maybe_decode(id_)})
+
+
+PARTITION_PATTERN = re.compile(r"^(?P<base>.+):\{(?P<index>\d+)\}$")
+
+
+def partition_name(name: str, index: int) -> str:
+    # The braces are a Redis Cluster hash tag: partition n of every stream lands in the same slot, and partitions
+    # with different numbers spread over the cluster.
+    return f"{name}:{{{index}}}"
+
+
+def partition_base(stream_name: str) -> Optional[str]:
+    match = PARTITION_PATTERN.match(stream_name)
+    return match.group("base") if match else None
+
+
+def partition_streams(name: str) -> List[str]:
+    count = RedisStream.get_partitions().get(name, 1)
+    if count <= 1:
+        return [name]
+    return [partition_name(name, index) for index in range(count)]
+
+
+def partition_stream(name: str, event: Any) -> str:
+    # Stable across processes (unlike hash()): every event of a document goes to the same partition.
+    count = RedisStream.get_partitions().get(name, 1)
+    if count <= 1:
+        return name
+    key = maybe_retrieve_correlation_id(event) or str(event.uuid)
+    return partition_name(name, zlib.crc32(key.encode("utf-8")) % count)
+
+
+def assign_partitions(consumer_group_config) -> dict:
+    # Each partition of a stream is read by exactly one of `worker_count` workers, so the events of a document are
+    # handled one after the other. Unpartitioned streams are read by every worker, as before.
+    worker_index = consumer_group_config.get("worker_index", 0)
+    worker_count = consumer_group_config.get("worker_count", 1)
+    streams = []
+    for stream in consumer_group_config["streams"]:
+        partitions = partition_streams(stream)
+        if len(partitions) == 1:
+            streams.append(stream)
+        else:
+            streams += [p for index, p in enumerate(partitions) if index % worker_count == worker_index]
+    return {**consumer_group_config, "streams": streams}
+
+
+def deprioritize_partition(streams: List[str], stream: str) -> List[str]:
+    # Consumers that restart from the first stream after handling one would starve the later partitions of a
+    # stream: rotate the partitions so the one just handled goes after its siblings.
+    base = partition_base(stream)
+    if base is None:
+        return streams
+    siblings = [s for s in streams if partition_base(s) == base]
+    index = siblings.index(stream)
+    rotated = iter(siblings[index + 1:] + siblings[: index + 1])
+    return [next(rotated) if partition_base(s) == base else s for s in streams]
+
+
+def produce_one(name: str, event: Any, maxlen: int = None, codec: str = None, approximate: bool = False) -> str:
+    name = partition_stream(name, event)
+    broker = RedisStream.get_broker()
+    trim = RedisStream.get_retention().xadd_args(name, maxlen, approximate)
+    id_ = xadd_entry(broker, name, event, make_stream_entry(name, event, codec), **trim)
+    record_produced_event(name, event, id_)
     return id_
 
 
-def event_to_bytes(event: Any) -> bytes:
-    return pickle.dumps(event)
+def produce_many(
+    name: str, events: Iterable[Any], maxlen: int = None, codec: str = None, approximate: bool = False
+) -> List[str]:
+    events = list(events)
+    if not events:
+        return []
+    names = [partition_stream(name, event) for event in events]
+    broker = RedisStream.get_broker()
+    retention = RedisStream.get_retention()
+    pipe = broker.pipeline(transaction=False)
+    for name, event in zip(names, events):
+        entry = make_stream_entry(name, event, codec)
+        xadd_entry(pipe, name, event, entry, **retention.xadd_args(name, maxlen, approximate))
+    ids = pipe.execute()
+    for name, event, id_ in zip(names, events, ids):
+        record_produced_event(name, event, id_)
+    return ids
+
+
+# Collects XADDs and sends them in a single pipeline once `max_batch_size` events are pending or the oldest pending
+# event has waited `max_delay` seconds. The delay is kept by a timer, so a batch that stops growing still goes out on
+# time rather than on the next produce; it flushes in the context of the first event of the batch, so the events are
+# still reported in the log of the handler that produced them. Leaving the context flushes the rest.
+class BatchProducer:
+    def __init__(
+        self,
+        max_batch_size: int = 500,
+        max_delay: float = 0.05,
+        maxlen: int = None,
+        codec: str = None,
+        approximate: bool = False,
+    ):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.maxlen = maxlen
+        self.codec = codec
+        self.approximate = approximate
+        self.produced_ids: List[str] = []
+        self._pending: List[Tuple[str, Any, Dict[str, bytes], Optional[int]]] = []
+        self._lock = Lock()
+        self._timer: Optional[Timer] = None
+
+    def __enter__(self) -> "BatchProducer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def produce(self, name: str, event: Any, maxlen: int = None) -> None:
+        name = partition_stream(name, event)
+        entry = make_stream_entry(name, event, self.codec)
+        with self._lock:
+            self._pending.append((name, event, entry, maxlen if maxlen is not None else self.maxlen))
+            full = len(self._pending) >= self.max_batch_size
+            if not full and self._timer is None and self.max_delay:
+                self._timer = Timer(self.max_delay, copy_context().run, args=(self._flush_due,))
+                self._timer.daemon = True
+                self._timer.start()
+        if full or not self.max_delay:
+            self.flush()
+
+    def _flush_due(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Unable to flush batch of produced events: {e}")
+
+    def flush(self) -> List[str]:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return []
+            pending, self._pending = self._pending, []
+            retention = RedisStream.get_retention()
+            pipe = RedisStream.get_broker().pipeline(transaction=False)
+            for name, event, entry, maxlen in pending:
+                xadd_entry(pipe, name, event, entry, **retention.xadd_args(name, maxlen, self.approximate))
+            ids = pipe.execute()
+            self.produced_ids.extend(ids)
+        for (name, event, _, _), id_ in zip(pending, ids):
+            record_produced_event(name, event, id_)
+        return ids
+
+
+def event_to_bytes(event: Any, codec: str = "pickle") -> bytes:
+    return encode_event(event, codec)
 
 
 def bytes_to_event(bytes_: bytes) -> Any:
-    return pickle.loads(bytes_)
+    event = decode_event(bytes_)
+    if attach_claim_checks(event):
+        RedisStream.get_claim_check()  # Registers the configured blob stores before any reference is resolved
+    return event
 
 
 def consume_one(name):
@@ -106,12 +396,44 @@ def split_by_handler(messages, registered_handlers):
     return accepted, rejected
 
 
+def ack_entries(broker, stream, group_name, ids) -> None:
+    # Every acknowledgement of delivered entries goes through here, so retries taken from the scheduler are released
+    # once they are done (RetryScheduler.acked) instead of when they were taken.
+    broker.xack(stream, group_name, *ids)
+    retries = RedisStream.get_retry_scheduler()
+    if retries is not None:
+        retries.acked(group_name, stream, ids)
+
+
+def drop_duplicates(broker, stream, group_name, messages):
+    # Entries whose uuid (read from the EVENT_TYPE:uuid key, before decoding) was already processed by this group
+    # within the dedupe window are acknowledged and left out.
+    dedupe_window = RedisStream.get_dedupe_window()
+    if dedupe_window is None or not messages:
+        return messages
+    uuids = [uuid_from_key(next(iter(fields))) for _, fields in messages]
+    seen = dedupe_window.seen(group_name, filter(None, uuids))
+    if not seen:
+        return messages
+    duplicates = [message_id for (message_id, _), uuid in zip(messages, uuids) if uuid in seen]
+    ack_entries(broker, stream, group_name, duplicates)
+    metrics.counter("duplicates_skipped_total", stream=stream).inc(len(duplicates))
+    return [message for message, uuid in zip(messages, uuids) if uuid not in seen]
+
+
+def record_processed(events) -> None:
+    dedupe_window = RedisStream.get_dedupe_window()
+    group_name = consumer_context.get().get("group_name")
+    if dedupe_window is not None and group_name:
+        dedupe_window.record(group_name, [str(event.uuid) for event in events])
+
+
 def handle_rejected(*, stream, group_name, rejected):
     if not rejected:
         return
     broker = RedisStream.get_broker()
     ids, _ = zip(*rejected)
-    broker.xack(stream, group_name, *ids)
+    ack_entries(broker, stream, group_name, ids)
 
 
 def decode_item(item):
@@ -121,45 +443,80 @@ def decode_item(item):
     return event_ids, events
 
 
-correlations_context: ContextVar[dict] = ContextVar("correlations_context", default={})
-causations_context: ContextVar[list] = ContextVar("correlations_context", default=[])
-
+# Set once per consumer; set_consumer_context replaces the dict, the default is never mutated.
 consumer_context: ContextVar[dict] = ContextVar("consumer_context", default={})
-event_context: ContextVar[dict] = ContextVar("event_context", default={})
+# A new EventContext per digested event, None outside of a handler.
+event_context: ContextVar[Optional[EventContext]] = ContextVar("event_context", default=None)
 
-produced_events: ContextVar[list] = ContextVar("produced_events", default=[])
+# Set to leave the consume loops once the current iteration is done, e.g. from a SIGTERM handler.
+consumer_stop = Event()
 
 
-def set_event_context(correlation_id: str, user_access: Dict[str, Any], produce_errors_to: str = "") -> None:
+def current_event_context() -> EventContext:
     ctx = event_context.get()
-    ctx["correlation_id"] = correlation_id
-    ctx["user_access"] = user_access
-    ctx["produce_errors_to"] = produce_errors_to or os.getenv("PRODUCE_ERRORS_TO") or ctx.get("stream_name", "")
-    event_context.set(ctx)
+    if ctx is None:
+        ctx = EventContext(chain=RedisStream.get_causal_chain())
+        event_context.set(ctx)
+    return ctx
+
+
+class DeprecatedContextVar:
+    # Stands in for a ContextVar that EventContext replaced, for code that still uses it: get() and set() read and
+    # write that attribute of the current event context.
+    def __init__(self, name: str, attribute: str, default: Callable[[], Any]):
+        self.name = name
+        self.attribute = attribute
+        self.default = default
+
+    def warn(self) -> None:
+        message = f"{self.name} is deprecated, use get_event_context().{self.attribute}"
+        warnings.warn(message, DeprecationWarning, stacklevel=3)
+
+    def get(self, *default: Any) -> Any:
+        self.warn()
+        ctx = event_context.get()
+        if ctx is None:
+            return default[0] if default else self.default()
+        return getattr(ctx, self.attribute)
+
+    def set(self, value: Any) -> None:
+        self.warn()
+        setattr(current_event_context(), self.attribute, value)
+
+
+correlations_context = DeprecatedContextVar("correlations_context", "correlations", dict)
+causations_context = DeprecatedContextVar("causations_context", "causations", list)
+produced_events = DeprecatedContextVar("produced_events", "produced_events", list)
+
+
+def set_event_context(correlation_id: str, user_access: Dict[str, Any], produce_errors_to: str = "") -> None:
+    ctx = current_event_context()
+    ctx.correlation_id = correlation_id
+    ctx.user_access = user_access
+    ctx.produce_errors_to = produce_errors_to or os.getenv("PRODUCE_ERRORS_TO") or ctx.stream_name or ""
 
 
 def set_event_context_start(event_id, event_type, stream_name, handler, dt=None):
-    ctx = event_context.get()
-    ctx["start_time"] = dt or datetime.utcnow()
-    ctx["stream_name"] = maybe_decode(stream_name)
-    ctx["event_id"] = maybe_decode(event_id)
-    ctx["event_type"] = event_type.name
-    ctx["handler"] = handler
-    event_context.set(ctx)
+    ctx = current_event_context()
+    ctx.start_time = dt or datetime.utcnow()
+    ctx.stream_name = maybe_decode(stream_name)
+    ctx.event_id = maybe_decode(event_id)
+    ctx.event_type = event_type.name
+    ctx.handler = handler
 
 
 def set_consumer_context(consumer_name, group_name) -> None:
-    ctx = consumer_context.get()
-    ctx["hostname"] = os.getenv("HOSTNAME") or "UNKNOWN_HOST"
-    ctx["consumer_name"] = consumer_name
-    ctx["group_name"] = group_name
-    consumer_context.set(ctx)
+    consumer_context.set(
+        {
+            "hostname": os.getenv("HOSTNAME") or "UNKNOWN_HOST",
+            "consumer_name": consumer_name,
+            "group_name": group_name,
+        }
+    )
 
 
 def set_event_context_end(dt: Optional[datetime] = None) -> None:
-    ctx = event_context.get()
-    ctx["end_time"] = dt or datetime.utcnow()
-    event_context.set(ctx)
+    current_event_context().end_time = dt or datetime.utcnow()
 
 
 def maybe_retrieve_correlation_id(event: Any) -> str:
@@ -174,19 +531,41 @@ def maybe_retrieve_correlation_id(event: Any) -> str:
 
 def ensure_event_context(event):
     ctx = event_context.get()
-    if not ctx:
+    if ctx is None or ctx.correlation_id is None:
         correlation_id = maybe_retrieve_correlation_id(event)
         user_access = extract_attr(event, "user_access") or {}
         set_event_context(correlation_id=correlation_id, user_access=user_access)
 
 
 def reset_event_context():
-    event_context.set({})
-    produced_events.set([])
+    event_context.set(EventContext(chain=RedisStream.get_causal_chain()))
 
 
-def get_event_context(event=None):
+def get_event_context(event=None) -> EventContext:
     ctx = event_context.get()
+    return ctx if ctx is not None else EventContext()
+
+
+def start_event_context(stream_name: str, event: Any, event_id: Any, handler_name: str) -> EventContext:
+    # One object per event, filled in a single step: the same fields ensure_event_context and
+    # set_event_context_start would set on a fresh context.
+    parent_correlations = getattr(event, "correlations", None)
+    ctx = EventContext(
+        parent_correlations=parent_correlations,
+        parent_causations=getattr(event, "causations", None),
+        hop={stream_name: event_id},
+        chain=RedisStream.get_causal_chain(),
+        trace_id=trace_id(parent_correlations),
+        correlation_id=maybe_retrieve_correlation_id(event),
+        user_access=extract_attr(event, "user_access") or {},
+        produce_errors_to=os.getenv("PRODUCE_ERRORS_TO") or "",
+        start_time=datetime.utcnow(),
+        stream_name=maybe_decode(stream_name),
+        event_id=maybe_decode(event_id),
+        event_type=event.event_type.name,
+        handler=handler_name,
+    )
+    event_context.set(ctx)
     return ctx
 
 
@@ -198,46 +577,77 @@ def ensure_result(result):
     return Ok()
 
 
-def digest_event(stream_name: str, event: Any, event_id: str, registered_handlers: dict) -> None:
+def prepare_digest(stream_name: str, event: Any, event_id: str, registered_handlers: dict):
     if event.event_type not in registered_handlers:
         if enabled_by_env("PRINT_IGNORED_EVENTS"):
             print("Ignoring event: {}".format(event.event_type))
-        return
+        return None
     handler = registered_handlers[event.event_type]
-    correlations_context.set(event.update_correlations({stream_name: event_id}))
-    causations_context.set(event.update_causations({stream_name: event_id}))
-    reset_event_context()
-    ensure_event_context(event)
-    set_event_context_start(event_id, event.event_type, stream_name, handler.__name__)
+    start_event_context(stream_name, event, event_id, handler.__name__)
+    return handler
+
+
+def complete_digest(stream_name: str, result: Result) -> None:
+    set_event_context_end()
+    if "logs" not in stream_name:
+        produce_from_result(result, stream_name=stream_name, dead_letter_id="")
+
+
+def fail_digest(stream_name: str, exc: Exception, handler=None, events=(), event_ids=(), entries=None) -> None:
+    set_event_context_end()
+    dead_letter_ids = schedule_retries(stream_name, handler, events, event_ids, entries)
+    dead_letter_id = ",".join(maybe_decode(id_) for id_ in dead_letter_ids or ())
+    produce_from_result(Error(value=exc), stream_name=stream_name, dead_letter_id=dead_letter_id)
+    if dead_letter_ids is None and not enabled_by_env("PREVENT_CONSUMER_CRASH"):
+        raise exc from None
+
+
+def schedule_retries(stream_name: str, handler, events, event_ids, entries=None) -> Optional[List[Any]]:
+    # Returns None when the failure is not handled by the retry scheduler, otherwise the ids of the entries that ran
+    # out of attempts and were sent to the dead-letter stream. Scheduled or dead-lettered entries are acknowledged by
+    # the caller like successful ones, the scheduler owns them from now on. `entries` are the fields as they were
+    # read, retried unchanged; events are only encoded again (after the handler may have changed them) without.
+    retries = RedisStream.get_retry_scheduler()
+    group_name = consumer_context.get().get("group_name")
+    if retries is None or handler is None or not group_name or not events:
+        return None
+    entries = entries or [encode_stream_entry(stream_name, event) for event in events]
+    failed = list(zip([stream_name] * len(events), event_ids or [None] * len(events), entries))
+    outcomes = retries.schedule(group_name, handler.__name__, failed)
+    return [id_ for outcome, id_ in outcomes if outcome == DEAD_LETTER]
+
+
+def digest_event(stream_name: str, event: Any, event_id: str, registered_handlers: dict, fields=None) -> None:
+    handler = prepare_digest(stream_name, event, event_id, registered_handlers)
+    if handler is None:
+        return
+    run_handler(handler, stream_name, event, event_id, fields)
+
+
+def run_handler(handler, stream_name: str, event: Any, event_id: str, fields=None) -> None:
     try:
         produce_handler_started(handler, event)
-        result = ensure_result(handler(stream_name, event, event_id))
-        set_event_context_end()
-        if "logs" not in stream_name:
-            produce_from_result(result, stream_name=stream_name, dead_letter_id="")
-
+        result = ensure_result(time_handler(handler, event.event_type.name, 1, stream_name, event, event_id))
+        complete_digest(stream_name, result)
     except Exception as exc:
-        set_event_context_end()
-        # dead_letter_id = produce_one("dead-letter", event, maxlen=1000)
-        produce_from_result(Error(value=exc), stream_name=stream_name, dead_letter_id="")
-        if not enabled_by_env("PREVENT_CONSUMER_CRASH"):
-            raise exc from None
+        fail_digest(stream_name, exc, handler, [event], [event_id], [fields] if fields else None)
+        return
+    record_processed([event])
 
 
-def digest_batch(stream_name, batch, registered_handlers):
+def digest_batch(stream_name, batch, registered_handlers, event_ids=None, entries=None):
     event = next(iter(batch))
-    handler = registered_handlers[event.event_type]  # Assume a single handler for the whole batch
+    handler = registered_handlers[event.event_type]  # Batches come split by event type, see group_by_event_type
     reset_event_context()
     try:
-        result = ensure_result(handler(stream_name, batch, None))
+        result = ensure_result(time_handler(handler, event.event_type.name, len(batch), stream_name, batch, None))
         set_event_context_end()
         if "logs" not in stream_name:
             produce_from_result(result)
     except Exception as exc:
-        set_event_context_end()
-        produce_from_result(Error(value=exc), stream_name=stream_name, dead_letter_id="")
-        if not enabled_by_env("PREVENT_CONSUMER_CRASH"):
-            raise exc from None
+        fail_digest(stream_name, exc, handler, batch, event_ids, entries)
+        return
+    record_processed(batch)
 
 
 def produce_from_result(result, stream_name=None, dead_letter_id=None):
@@ -261,16 +671,31 @@ def produce_log_event(
     from aim_common.events.base_event import BaseEvent
     from aim_common.events.event_type import EventType
 
+    ctx = get_event_context()
     log_event = BaseEvent(event_type=EventType.LOGGING_EVENT)
     log_event.data = {
         "uuid": make_uuid(),
         "result": result.as_dict(),
-        "event_context": get_event_context(),
+        "event_context": ctx.as_dict(),
         "consumer_context": consumer_context.get(),
         "is_user_log": bool(is_user_log),
-        "produced_events": produced_events.get(),
+        "produced_events": ctx.produced_events,
     }
-    produce_one(stream_name, log_event, maxlen=1000)
+    produce_log(stream_name, log_event)
+
+
+def produce_log(stream_name: str, event: Any, maxlen: int = None, priority: bool = False) -> None:
+    # With a log sink configured the entry is encoded and its partition resolved here, in the producing context, and
+    # written to Redis in pipelined batches by the sink thread, which also indexes it. Without maxlen the stream's
+    # retention applies, either way.
+    sink = RedisStream.get_log_sink()
+    if sink is None:
+        produce_one(stream_name, event, maxlen=maxlen)
+        return
+    name = partition_stream(stream_name, event)
+    trim = RedisStream.get_retention().xadd_args(name, maxlen)
+    entry = make_stream_entry(name, event)
+    sink.put(name, entry, trim, priority=priority, correlation_id=maybe_retrieve_correlation_id(event))
 
 
 def produce_error_event(
@@ -286,7 +711,7 @@ def produce_error_event(
     error_event.data = {
         "uuid": make_uuid(),
         "result": result.err(),
-        "event_context": ctx,
+        "event_context": ctx.as_dict(),
         "consumer_context": consumer_context.get(),
         "dead_letter_id": maybe_decode(dead_letter_id),
         "exception": repr(result.exc()),
@@ -294,7 +719,7 @@ def produce_error_event(
         "is_user_log": bool(is_user_log),
     }
     produce_one(produce_errors_to, error_event)
-    produce_one("logs", error_event)
+    produce_log("logs", error_event, priority=True)
     set_document_status(
         document_id=ctx.get("correlation_id", "NOT_FOUND"),
         status="EXCEPTION",
@@ -367,12 +792,30 @@ def pending_messages_by_stream(broker, group_name, consumer_name, streams, batch
     return list(messages_by_stream)
 
 
-def new_messages_by_stream(broker, group_name, consumer_name, streams, start_from, batch_size):
+def new_messages_by_stream(broker, group_name, consumer_name, streams, start_from, batch_size, block=100):
     streams_dict = {s: start_from for s in streams}
-    messages_by_stream = broker.xreadgroup(group_name, consumer_name, streams_dict, count=batch_size, block=100)
+    messages_by_stream = broker.xreadgroup(group_name, consumer_name, streams_dict, count=batch_size, block=block)
     return messages_by_stream
 
 
+def order_streams(streams, strategy="priority", weights=None):
+    if strategy in ("priority", "weighted_round_robin"):  # The round-robin is applied per read by the loop
+        return list(streams)
+    if strategy == "weighted":
+        weights = weights or {}
+        # Stable: ties keep the configured order. Partitions take the weight of their stream.
+        return sorted(streams, key=lambda s: -weights.get(s, weights.get(partition_base(s), 1)))
+    raise ValueError(f"Unknown stream ordering strategy '{strategy}'")
+
+
+def poll_streams(broker, group_name, consumer_name, streams, start_from, batch_size, block):
+    messages_by_stream = dict(
+        new_messages_by_stream(broker, group_name, consumer_name, streams, start_from, batch_size, block)
+    )
+    polled = [(stream, messages_by_stream.get(bytes(stream, "utf-8"), [])) for stream in streams]
+    return [(stream, messages) for stream, messages in polled if messages]
+
+
 def decode_batch(batch):
     decoded = []
     for event_dict in batch:
@@ -388,12 +831,32 @@ def consume_batches_forever(*, consumer_group_config, consumer_id, registered_ha
     consumer_name = make_consumer_name(consumer_id, group_name)
     batch_size = consumer_group_config["batch_size"]
     streams = consumer_group_config["streams"]
-    retry_after = consumer_group_config.get("retry_after", 300000)
     set_consumer_context(consumer_name, group_name)
     handler_names = [k.name for k in registered_handlers.keys()]
-    while True:
-        for stream in streams:
-            discard_max_retries_from_pel(stream, group_name, consumer_name, max_retries, batch_size * 2)
+    pool = make_handler_pool(broker, consumer_group_config)
+    janitor = make_janitor(broker, consumer_group_config, consumer_name, max_retries)
+    batch_sizes = make_batch_size_controller(consumer_group_config)
+    scheduler = make_stream_scheduler(consumer_group_config, streams)
+    tenants = make_tenant_limiter(consumer_group_config.get("tenant_limits"))
+    if pool and batch_sizes:
+        pool.on_done = lambda _, events, seconds, nbytes: batch_sizes.observe(events, seconds, nbytes)
+    while not consumer_stop.is_set():
+        if pool:
+            pool.collect()
+        if tenants:
+            release_deferred(broker, group_name, registered_handlers, tenants, pool)
+        for stream, claimed_messages in janitor.maybe_run():
+            handle_messages(
+                broker, stream, group_name, claimed_messages, handler_names, registered_handlers, pool, tenants
+            )
+        if batch_sizes:
+            in_flight_bytes = pool.in_flight_bytes if pool else 0
+            if not batch_sizes.can_pull(in_flight_bytes):
+                pool.collect(block=True)  # Over the memory budget: wait for in-flight batches before reading more
+                continue
+            batch_sizes.set_lag(janitor.lag())
+            batch_size = batch_sizes.next_size(in_flight_bytes)
+        for stream in scheduler.order() if scheduler else streams:
             stream_messages_dict = dict(
                 new_messages_by_stream(
                     broker=broker,
@@ -405,37 +868,177 @@ def consume_batches_forever(*, consumer_group_config, consumer_id, registered_ha
                 )
             )
             stream_messages = stream_messages_dict.get(bytes(stream, "utf-8"), [])
-            start_id, claimed_messages, _ = broker.xautoclaim(
-                stream, group_name, consumer_name, retry_after, start_id=0, count=batch_size
-            )
-            all_messages = claimed_messages + stream_messages
-            if not all_messages:
+            if not stream_messages:
                 continue
-            accepted, rejected = split_by_handler(all_messages, handler_names)
-            if rejected:
-                handle_rejected(stream=stream, group_name=group_name, rejected=rejected)
-            if accepted:
-                handle_accepted(
-                    stream=stream, group_name=group_name, registered_handlers=registered_handlers, accepted=accepted
-                )
+            start = perf_counter()
+            handled = handle_messages(
+                broker, stream, group_name, stream_messages, handler_names, registered_handlers, pool, tenants
+            )
+            if batch_sizes and not pool:
+                nbytes = entries_size(fields for _, fields in stream_messages)
+                batch_sizes.observe(len(stream_messages), perf_counter() - start, nbytes)
+            if handled:
+                if scheduler:
+                    scheduler.served(stream)
+                else:
+                    streams = deprioritize_partition(streams, stream)
                 break
+    if tenants:
+        release_deferred(broker, group_name, registered_handlers, tenants, pool, drain=True)
+    if pool:
+        pool.shutdown()  # Finishes and acknowledges in-flight events before returning
+
+
+# True if any of the messages went to a handler; not when they were all duplicates, rejected or deferred by the
+# tenant limiter, so the stream scheduler isn't charged a turn for them.
+def handle_messages(
+    broker, stream, group_name, messages, handler_names, registered_handlers, pool=None, tenants=None
+) -> bool:
+    messages = drop_duplicates(broker, stream, group_name, messages)
+    accepted, rejected = split_by_handler(messages, handler_names)
+    if rejected:
+        handle_rejected(stream=stream, group_name=group_name, rejected=rejected)
+    if not accepted:
+        return False
+    return handle_accepted(
+        stream=stream,
+        group_name=group_name,
+        registered_handlers=registered_handlers,
+        accepted=accepted,
+        pool=pool,
+        tenants=tenants,
+    )
 
 
-def handle_accepted(stream, group_name, registered_handlers, accepted):
+def handle_accepted(stream, group_name, registered_handlers, accepted, pool=None, tenants=None) -> bool:
     broker = RedisStream.get_broker()
     accepted_ids, accepted_bytes = zip(*accepted)
+    start = perf_counter()
     accepted_messages = decode_batch(batch=accepted_bytes)
-    ctx = copy_context()
-    ctx.run(digest_batch, stream, accepted_messages, registered_handlers)
-    broker.xack(stream, group_name, *accepted_ids)
-    create_consumer_file(stream)
+    observe_decode(stream, perf_counter() - start, len(accepted_messages))
+    if tenants:
+        # Events over their tenant's rate stay pending here until release_deferred hands them out
+        sizes = [entries_size([fields]) for fields in accepted_bytes]
+        admitted = tenants.admit(stream, accepted_ids, accepted_messages, sizes, accepted_bytes)
+        if not admitted:
+            return False
+        accepted_ids, accepted_messages, sizes, accepted_bytes = zip(*admitted)
+        accepted_messages, nbytes = list(accepted_messages), sum(sizes)
+    else:
+        nbytes = entries_size(accepted_bytes) if pool else 0
+    digest_accepted(
+        broker, stream, group_name, registered_handlers, accepted_ids, accepted_messages, accepted_bytes, nbytes, pool
+    )
+    return True
+
+
+def group_by_event_type(ids, messages, entries) -> List[Tuple[list, list, list]]:
+    # (ids, events, entries) per event type, in order of first appearance; events keep their order within a type.
+    groups: Dict[Any, Tuple[list, list, list]] = {}
+    for id_, message, entry in zip(ids, messages, entries):
+        group_ids, group_messages, group_entries = groups.setdefault(message.event_type, ([], [], []))
+        group_ids.append(id_)
+        group_messages.append(message)
+        group_entries.append(entry)
+    return list(groups.values())
+
+
+def digest_accepted(broker, stream, group_name, registered_handlers, ids, messages, entries, nbytes=0, pool=None):
+    # Each event type goes to its own handler as a sub-batch. With a pool the sub-batches run concurrently and each
+    # one is acknowledged when it finishes; without one they run in turn. Either way a failing sub-batch only
+    # leaves its own entries pending, the others are acknowledged before the failure is raised. `entries` are the
+    # fields as read, for the retry scheduler.
+    handled, ignored = [], []
+    for group_ids, group_messages, group_entries in group_by_event_type(ids, messages, entries):
+        if group_messages[0].event_type in registered_handlers:
+            handled.append((group_ids, group_messages, group_entries))
+        else:
+            if enabled_by_env("PRINT_IGNORED_EVENTS"):
+                print("Ignoring event: {}".format(group_messages[0].event_type))
+            ignored.extend(group_ids)
+    done, failed = list(ignored), None
+    for group_ids, group_messages, group_entries in handled:
+        args = (stream, group_messages, registered_handlers, group_ids, group_entries)
+        if pool:
+            pool.submit(stream, group_ids, digest_batch, *args, nbytes=nbytes * len(group_ids) // len(ids))
+            continue
+        try:
+            copy_context().run(digest_batch, *args)
+        except Exception as exc:
+            failed = failed or exc
+            continue
+        done.extend(group_ids)
+    if done:
+        start = perf_counter()
+        ack_entries(broker, stream, group_name, done)
+        observe_ack(stream, perf_counter() - start)
+    if failed is not None:
+        raise failed
+    if not pool:
+        create_consumer_file(stream)
+
+
+def release_deferred(broker, group_name, registered_handlers, tenants: TenantLimiter, pool=None, drain=False):
+    for stream, entries in tenants.release(drain):
+        ids, messages, sizes, fields = zip(*entries)
+        digest_accepted(broker, stream, group_name, registered_handlers, ids, list(messages), fields, sum(sizes), pool)
+
+
+def maybe_start_metrics_server(consumer_group_config):
+    port = consumer_group_config.get("metrics_port") or os.getenv("METRICS_PORT")
+    if port:
+        start_metrics_server(int(port))
+        print(f"Serving consumer metrics on :{port}/metrics")
+
+
+def make_handler_pool(broker, consumer_group_config):
+    from aim_library.events.workers import make_handler_pool as _make_handler_pool
+
+    return _make_handler_pool(broker, consumer_group_config)
+
+
+def make_janitor(broker, consumer_group_config, consumer_name, max_retries):
+    from aim_library.events.janitor import make_janitor as _make_janitor
+
+    return _make_janitor(broker, consumer_group_config, consumer_name, max_retries)
+
+
+def maybe_start_stream_trimmer(consumer_group_config) -> Optional[StreamTrimmer]:
+    # A daemon thread in every consumer process. They all try every interval, a lock per stream lets one of them
+    # run the XTRIMs. The default retention policy applies to the streams of this consumer.
+    retention_config = ConfigManager.get_config_value("events-stream").get("retention") or {}
+    trimmer = make_stream_trimmer(
+        RedisStream.get_broker,
+        RedisStream.get_retention(),
+        retention_config.get("trimmer"),
+        consumer_group_config["streams"],
+    )
+    return trimmer.start() if trimmer else None
 
 
 def start_redis_consumer(
     consumer_group_config, registered_handlers, start_from=">", consumer_id=None, max_retries=None
 ):
     max_retries = max_retries or consumer_group_config.get("max_retries", 1)
-    if consumer_group_config["batch_size"] > 1:
+    maybe_start_metrics_server(consumer_group_config)
+    RedisStream.get_stream_codecs()  # A configured codec that isn't installed fails here, not mid-stream
+    consumer_group_config = assign_partitions(consumer_group_config)
+    maybe_start_stream_trimmer(consumer_group_config)
+    RedisStream.set_dedupe_window(make_dedupe_window(RedisStream.get_broker, consumer_group_config.get("dedupe")))
+    if not consumer_group_config["streams"]:
+        print(f"No stream partitions assigned to worker {consumer_group_config.get('worker_index', 0)}, idling")
+        while not consumer_stop.wait(1):
+            pass
+        return
+    if consumer_group_config.get("polling") == "multi_stream":
+        consume_multi_stream_forever(
+            consumer_group_config=consumer_group_config,
+            consumer_id=consumer_id,
+            registered_handlers=registered_handlers,
+            start_from=start_from,
+            max_retries=max_retries,
+        )
+    elif consumer_group_config["batch_size"] > 1:
         consume_batches_forever(
             consumer_group_config=consumer_group_config,
             consumer_id=consumer_id,
@@ -462,35 +1065,102 @@ def consume_single_messages_forever(
     consumer_name = make_consumer_name(consumer_id, group_name)
     batch_size = consumer_group_config["batch_size"]
     streams = consumer_group_config["streams"]
-    retry_after = consumer_group_config.get("retry_after", 300000)
     set_consumer_context(consumer_name, group_name)
-    while True:
-        for stream in streams:
-            discarded = discard_max_retries_from_pel(stream, group_name, consumer_name, max_retries, batch_size * 2)
-            if discarded:
-                print(f"discarded {discarded}")
-            start_id, claimed_message, _ = broker.xautoclaim(
-                stream, group_name, consumer_name, min_idle_time=retry_after, start_id=0, count=batch_size
-            )
-            if claimed_message:
-                decode_and_digest(broker, stream, claimed_message, group_name, registered_handlers)
-                break
+    pool = make_handler_pool(broker, consumer_group_config)
+    janitor = make_janitor(broker, consumer_group_config, consumer_name, max_retries)
+    scheduler = make_stream_scheduler(consumer_group_config, streams)
+    while not consumer_stop.is_set():
+        if pool:
+            pool.collect()
+        for stream, claimed_message in janitor.maybe_run():
+            decode_and_digest(broker, stream, claimed_message, group_name, registered_handlers, pool)
+        for stream in scheduler.order() if scheduler else streams:
             priority_message_dict = dict(
                 new_messages_by_stream(broker, group_name, consumer_name, [stream], start_from, batch_size)
             )
             priority_message = priority_message_dict.get(bytes(stream, "utf-8"))
             if priority_message:
-                decode_and_digest(broker, stream, priority_message, group_name, registered_handlers)
+                decode_and_digest(broker, stream, priority_message, group_name, registered_handlers, pool)
+                if scheduler:
+                    scheduler.served(stream)
+                else:
+                    streams = deprioritize_partition(streams, stream)
                 break
+    if pool:
+        pool.shutdown()
 
 
-def decode_and_digest(broker, stream_name, message, group_name, handlers):
+def consume_multi_stream_forever(
+    *, consumer_group_config, consumer_id, registered_handlers, start_from, max_retries
+):
+    broker = RedisStream.get_broker()
+    maybe_create_consumer_groups(broker, consumer_group_config)
+    group_name = consumer_group_config["name"]
+    consumer_name = make_consumer_name(consumer_id, group_name)
+    batch_size = consumer_group_config["batch_size"]
+    block = consumer_group_config.get("block", 1000)
+    streams = order_streams(
+        consumer_group_config["streams"],
+        consumer_group_config.get("stream_ordering", "priority"),
+        consumer_group_config.get("stream_weights"),
+    )
+    set_consumer_context(consumer_name, group_name)
+    handler_names = [k.name for k in registered_handlers.keys()]
+    pool = make_handler_pool(broker, consumer_group_config)
+    janitor = make_janitor(broker, consumer_group_config, consumer_name, max_retries)
+    scheduler = make_stream_scheduler(consumer_group_config, streams)
+    tenants = make_tenant_limiter(consumer_group_config.get("tenant_limits")) if batch_size > 1 else None
+    while not consumer_stop.is_set():
+        if pool:
+            pool.collect()
+        if tenants:
+            release_deferred(broker, group_name, registered_handlers, tenants, pool)
+        messages_by_stream = janitor.maybe_run()
+        # One blocking XREADGROUP for every stream; messages are then handled in stream order, so with the
+        # "priority" strategy the first configured stream is still served first.
+        block_for = None if messages_by_stream else block  # Don't wait for new work while claimed work is pending
+        if block_for and tenants and tenants.deferred_count:
+            block_for = min(block_for, 100)  # Wake up to release deferred events as their tenants get tokens
+        messages_by_stream += poll_streams(
+            broker, group_name, consumer_name, streams, start_from, batch_size, block=block_for
+        )
+        order = scheduler.order() if scheduler else streams
+        rank = {stream: index for index, stream in enumerate(order)}
+        for stream, messages in sorted(messages_by_stream, key=lambda item: rank.get(item[0], len(rank))):
+            if batch_size > 1:
+                handled = handle_messages(
+                    broker, stream, group_name, messages, handler_names, registered_handlers, pool, tenants
+                )
+            else:
+                handled = decode_and_digest(broker, stream, messages, group_name, registered_handlers, pool)
+            if scheduler and handled:
+                scheduler.served(stream)
+    if tenants:
+        release_deferred(broker, group_name, registered_handlers, tenants, pool, drain=True)
+    if pool:
+        pool.shutdown()
+
+
+def decode_and_digest(broker, stream_name, message, group_name, handlers, pool=None) -> bool:
+    message = drop_duplicates(broker, stream_name, group_name, message)
+    if not message:
+        return False
+    start = perf_counter()
     event_ids, events = decode_item(message)
-    for event_id, event in zip(event_ids, events):
+    observe_decode(stream_name, perf_counter() - start, len(events))
+    entries = [fields for _, fields in message]
+    if pool:
+        for event_id, event, fields in zip(event_ids, events, entries):
+            pool.submit(stream_name, [event_id], digest_event, stream_name, event, event_id, handlers, fields)
+        return True
+    for event_id, event, fields in zip(event_ids, events, entries):
         ctx = copy_context()
-        ctx.run(digest_event, stream_name, event, event_id, handlers)
-        broker.xack(stream_name, group_name, event_id)
+        ctx.run(digest_event, stream_name, event, event_id, handlers, fields)
+        start = perf_counter()
+        ack_entries(broker, stream_name, group_name, [event_id])
+        observe_ack(stream_name, perf_counter() - start)
     create_consumer_file(stream_name)
+    return True
 
 
 def retrieve_event(stream_name, event_id):  # TODO: Handle case for retrieving batch of events
@@ -503,6 +1173,30 @@ def retrieve_event(stream_name, event_id):  # TODO: Handle case for retrieving b
     return bytes_to_event(event_bytes)
 
 
+# Events produced for a correlation id as (stream, id, event) tuples in production order. Needs `correlation_index`
+# in the events-stream config; `start`/`end` are millisecond timestamps.
+def find_events(correlation_id, streams=None, start="-inf", end="+inf"):
+    index = RedisStream.get_correlation_index()
+    if index is None:
+        raise RuntimeError("The correlation index is not enabled, set correlation_index in the events-stream config")
+    broker = RedisStream.get_broker()
+    refs = index.find(broker, correlation_id, streams, start, end)
+    if not refs:
+        return []
+    pipe = broker.pipeline(transaction=False)
+    for stream, id_ in refs:
+        pipe.xrange(stream, id_, id_, count=1)
+    found, trimmed = [], []
+    for (stream, id_), entries in zip(refs, pipe.execute()):
+        if not entries:
+            trimmed.append((stream, id_))
+            continue
+        _, event_dict = entries[0]
+        found.append((stream, id_, bytes_to_event(event_from_dict(event_dict))))
+    index.remove(broker, correlation_id, trimmed)
+    return found
+
+
 def increment_id(id_str):
     ts, idx = id_str.decode("utf-8").split("-")
     ts, idx = int(ts), int(idx)
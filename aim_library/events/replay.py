@@ -0,0 +1,157 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from aim_library.events.redisstream import (
+    RedisStream,
+    bytes_to_event,
+    event_from_dict,
+    increment_id,
+    match_event,
+    maybe_decode,
+    partition_stream,
+    partition_streams,
+    xadd_entry,
+)
+
+CHECKPOINTS_KEY = "events:replay:checkpoints"
+
+Page = Tuple[bytes, int, List[Tuple[bytes, Dict[bytes, bytes], Any]]]
+
+
+def event_type_names(event_types: Optional[Iterable[Any]]) -> Optional[set]:
+    if event_types is None:
+        return None
+    return {getattr(event_type, "name", event_type) for event_type in event_types}
+
+
+def last_id(broker, stream: str) -> Optional[bytes]:
+    entries = broker.xrevrange(stream, count=1)
+    return entries[0][0] if entries else None
+
+
+def scan_pages(
+    stream: str,
+    start: Any = "-",
+    end: Any = "+",
+    event_types: Optional[Iterable[Any]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    page_size: int = 1000,
+    decode: bool = False,
+) -> Iterator[Page]:
+    # Pages through XRANGE and yields (last scanned id, scanned count, matches) per page. The event type is read from
+    # the entry key (EVENT_TYPE:uuid) so only candidates are decoded, and `match_event` filters run on those.
+    broker = RedisStream.get_broker()
+    type_names = event_type_names(event_types)
+    cursor = start
+    while True:
+        entries = broker.xrange(stream, min=cursor, max=end, count=page_size)
+        if not entries:
+            return
+        matches = []
+        for id_, fields in entries:
+            key = next(iter(fields))
+            if type_names is not None and maybe_decode(key).split(":", 1)[0] not in type_names:
+                continue
+            event = None
+            if filters or decode:
+                event = bytes_to_event(event_from_dict(fields))
+                if filters and not match_event(event, filters):
+                    continue
+            matches.append((id_, fields, event))
+        yield entries[-1][0], len(entries), matches
+        if len(entries) < page_size:
+            return
+        cursor = increment_id(entries[-1][0])
+
+
+def scan_stream(
+    stream: str,
+    start: Any = "-",
+    end: Any = "+",
+    event_types: Optional[Iterable[Any]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    page_size: int = 1000,
+) -> Iterator[Tuple[bytes, Any]]:
+    for _, _, matches in scan_pages(stream, start, end, event_types, filters, page_size, decode=True):
+        for id_, _, event in matches:
+            yield id_, event
+
+
+def get_checkpoint(name: str) -> Tuple[Optional[bytes], Optional[bytes]]:
+    # (last replayed id, end the replay was pinned to)
+    return tuple(RedisStream.get_broker().hmget(CHECKPOINTS_KEY, [name, f"{name}:end"]))
+
+
+def clear_checkpoint(name: str) -> None:
+    RedisStream.get_broker().hdel(CHECKPOINTS_KEY, name, f"{name}:end")
+
+
+def replay(
+    stream: str,
+    start: Any = "-",
+    end: Any = "+",
+    filters: Optional[Dict[str, Any]] = None,
+    target_stream: str = None,
+    event_types: Optional[Iterable[Any]] = None,
+    page_size: int = 1000,
+    maxlen: int = None,
+    checkpoint: str = None,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    # Re-produces the matching entries of `stream` between `start` and `end` to `target_stream` (the same stream by
+    # default) exactly as they were stored, so codecs, claim checks, correlations and causations are kept. Each page
+    # goes out as one pipeline that also stores the last scanned id under `checkpoint`; calling replay again with the
+    # same checkpoint name resumes after it.
+    #
+    # With partitions configured, a logical source stream is replayed partition by partition (each with its own
+    # checkpoint) and entries replayed into a logical target go to the partition of their event, as produce_one
+    # would route them.
+    sources = partition_streams(stream)
+    if len(sources) > 1:
+        target_stream = target_stream or stream
+        partitions = {
+            source: replay(
+                source,
+                start,
+                end,
+                filters,
+                target_stream,
+                event_types,
+                page_size,
+                maxlen,
+                f"{checkpoint}:{source}" if checkpoint else None,
+                dry_run,
+            )
+            for source in sources
+        }
+        summary = {key: sum(p[key] for p in partitions.values()) for key in ("scanned", "matched", "produced")}
+        return {**summary, "partitions": partitions}
+    broker = RedisStream.get_broker()
+    target_stream = target_stream or stream
+    route = len(partition_streams(target_stream)) > 1
+    checkpoint = checkpoint or f"{stream}:{start}:{end}->{target_stream}"
+    resume_from, pinned_end = get_checkpoint(checkpoint)
+    if resume_from:
+        start = increment_id(resume_from)
+    if end == "+":
+        # Pin the end so entries replayed into the stream being scanned are not picked up again, a resumed replay
+        # keeps the end of the first run.
+        end = pinned_end or last_id(broker, stream)
+        if end is None:
+            return {"scanned": 0, "matched": 0, "produced": 0, "last_id": None, "checkpoint": checkpoint}
+    index = RedisStream.get_correlation_index()
+    summary = {"scanned": 0, "matched": 0, "produced": 0, "last_id": maybe_decode(resume_from)}
+    pages = scan_pages(stream, start, end, event_types, filters, page_size, decode=index is not None or route)
+    for page_last_id, scanned, matches in pages:
+        summary["scanned"] += scanned
+        summary["matched"] += len(matches)
+        if not dry_run:
+            retention = RedisStream.get_retention()
+            targets = [partition_stream(target_stream, event) if route else target_stream for _, _, event in matches]
+            pipe = broker.pipeline(transaction=False)
+            for target, (_, fields, event) in zip(targets, matches):
+                xadd_entry(pipe, target, event, fields, **retention.xadd_args(target, maxlen))
+            pipe.hset(CHECKPOINTS_KEY, mapping={checkpoint: page_last_id, f"{checkpoint}:end": end})
+            summary["produced"] += len(pipe.execute()) - 1
+        summary["last_id"] = maybe_decode(page_last_id)
+    summary["checkpoint"] = checkpoint
+    return summary
@@ -0,0 +1,220 @@
+import os
+import threading
+from time import monotonic, time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+DEFAULT_INTERVAL = 60.0
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_BATCHES = 100
+DEFAULT_KEY_PREFIX = "events:trim:"
+DEFAULT_POLICIES = {"logs": {"maxlen": 1000}}
+
+
+def parse_stream_id(id_: Any) -> tuple:
+    id_ = id_.decode("utf-8") if isinstance(id_, bytes) else str(id_)
+    ms, _, seq = id_.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class RetentionPolicy:
+    # How long a stream keeps its entries. `maxlen` is applied on every XADD; it is approximate by default, so Redis
+    # only drops whole macro nodes and the XADD stays O(1). `max_age` (seconds) becomes a MINID that only the
+    # StreamTrimmer applies, in batches, off the produce path. `keep_undelivered` never lets MINID trimming drop
+    # entries some consumer group hasn't read yet.
+    def __init__(
+        self,
+        maxlen: Optional[int] = None,
+        max_age: Optional[float] = None,
+        approximate: bool = True,
+        keep_undelivered: bool = True,
+    ):
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self.approximate = approximate
+        self.keep_undelivered = keep_undelivered
+
+    def trims(self) -> bool:
+        return self.maxlen is not None or bool(self.max_age)
+
+    def minid(self, now: float = None) -> Optional[str]:
+        if not self.max_age:
+            return None
+        return f"{int(((now or time()) - self.max_age) * 1000)}-0"
+
+    def __repr__(self) -> str:
+        return f"RetentionPolicy(maxlen={self.maxlen}, max_age={self.max_age}, approximate={self.approximate})"
+
+
+NO_RETENTION = RetentionPolicy()
+
+
+class Retention:
+    # Policies by stream name, "default" for every other stream. Partitions share the policy of their stream.
+    def __init__(self, policies: Dict[str, RetentionPolicy]):
+        self.policies = dict(policies)
+        self.default = self.policies.pop("default", NO_RETENTION)
+
+    def policy(self, stream_name: str) -> RetentionPolicy:
+        from aim_library.events.redisstream import partition_base
+
+        policy = self.policies.get(stream_name)
+        if policy is None:
+            policy = self.policies.get(partition_base(stream_name) or stream_name, self.default)
+        return policy
+
+    def xadd_args(self, stream_name: str, maxlen: Optional[int] = None, approximate: bool = False) -> Dict[str, Any]:
+        # An explicit maxlen from the producer wins over the policy and is exact unless it asks for `approximate`.
+        if maxlen is not None:
+            return {"maxlen": maxlen, "approximate": approximate}
+        policy = self.policy(stream_name)
+        return {"maxlen": policy.maxlen, "approximate": policy.approximate}
+
+    def trimmed_streams(self, streams: Iterable[str] = ()) -> List[str]:
+        # The configured streams and, if the default policy trims anything, the given ones.
+        from aim_library.events.redisstream import partition_streams
+
+        names = [p for name, policy in self.policies.items() if policy.trims() for p in partition_streams(name)]
+        if self.default.trims():
+            names += list(streams)
+        return list(dict.fromkeys(names))
+
+
+class StreamTrimmer:
+    # Runs XTRIM for every trimmed stream at most once per `interval` across all processes: a short-lived lock key
+    # per stream lets one consumer do it while the others skip. Each XTRIM evicts at most `batch_size` entries
+    # (approximate, with LIMIT), so a large backlog is trimmed in small steps instead of one long blocking call.
+    def __init__(
+        self,
+        broker_factory: Callable,
+        retention: Retention,
+        streams: Iterable[str] = (),
+        interval: float = DEFAULT_INTERVAL,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_batches: int = DEFAULT_MAX_BATCHES,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+    ):
+        self.broker_factory = broker_factory
+        self.retention = retention
+        self.streams = retention.trimmed_streams(streams)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.key_prefix = key_prefix
+        self.trimmed: Dict[str, int] = {}
+        self._last_run = float("-inf")
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def acquire(self, broker, stream: str) -> bool:
+        return bool(broker.set(f"{self.key_prefix}{stream}", os.getpid(), ex=max(1, int(self.interval)), nx=True))
+
+    def undelivered_minid(self, broker, stream: str) -> Optional[str]:
+        # The oldest last-delivered-id over the groups of the stream: entries after it are still to be read.
+        try:
+            groups = broker.xinfo_groups(stream)
+        except Exception:  # The stream doesn't exist (yet)
+            return None
+        ids = [group["last-delivered-id"] for group in groups]
+        if not ids:
+            return None
+        ms, seq = min(map(parse_stream_id, ids))
+        return f"{ms}-{seq + 1}"
+
+    def xtrim(self, broker, stream: str, **trim) -> int:
+        policy = self.retention.policy(stream)
+        limit = {"limit": self.batch_size} if policy.approximate else {}
+        trimmed = 0
+        for _ in range(self.max_batches if policy.approximate else 1):
+            count = broker.xtrim(stream, approximate=policy.approximate, **trim, **limit)
+            trimmed += count
+            if not count or not limit:
+                break
+        return trimmed
+
+    def trim(self, broker, stream: str) -> int:
+        policy = self.retention.policy(stream)
+        trimmed = 0
+        if policy.maxlen is not None:
+            trimmed += self.xtrim(broker, stream, maxlen=policy.maxlen)
+        minid = policy.minid()
+        if minid is not None:
+            if policy.keep_undelivered:
+                undelivered = self.undelivered_minid(broker, stream)
+                if undelivered is not None:
+                    minid = min(minid, undelivered, key=parse_stream_id)
+            trimmed += self.xtrim(broker, stream, minid=minid)
+        return trimmed
+
+    def run(self) -> Dict[str, int]:
+        self._last_run = monotonic()
+        broker = self.broker_factory()
+        trimmed = {}
+        for stream in self.streams:
+            try:
+                if self.acquire(broker, stream):
+                    trimmed[stream] = self.trim(broker, stream)
+            except Exception as e:
+                print(f"Unable to trim stream {stream}: {e}")
+        for stream, count in trimmed.items():
+            self.trimmed[stream] = self.trimmed.get(stream, 0) + count
+        return trimmed
+
+    def maybe_run(self) -> Dict[str, int]:
+        if monotonic() - self._last_run < self.interval:
+            return {}
+        return self.run()
+
+    def _run_forever(self) -> None:
+        while not self._stop.is_set():
+            self.maybe_run()
+            self._stop.wait(min(self.interval, 1.0))
+
+    def start(self) -> "StreamTrimmer":
+        # Trims in a daemon thread until stop(). Consumers start one; services that only produce can do the same.
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run_forever, name="stream-trimmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def make_policy(policy_config: Any) -> RetentionPolicy:
+    if isinstance(policy_config, int):  # Shorthand for an approximate maxlen
+        return RetentionPolicy(maxlen=policy_config)
+    return RetentionPolicy(
+        maxlen=policy_config.get("maxlen"),
+        max_age=policy_config.get("max_age"),
+        approximate=policy_config.get("approximate", True),
+        keep_undelivered=policy_config.get("keep_undelivered", True),
+    )
+
+
+def make_retention(retention_config: Optional[dict]) -> Retention:
+    # Without config only the logs stream is trimmed, to the 1000 entries it always kept.
+    streams_config = (retention_config or {}).get("streams")
+    if streams_config is None:
+        streams_config = DEFAULT_POLICIES
+    return Retention({name: make_policy(policy) for name, policy in streams_config.items()})
+
+
+def make_stream_trimmer(
+    broker_factory: Callable, retention: Retention, trimmer_config: Any, streams: Iterable[str] = ()
+) -> Optional[StreamTrimmer]:
+    if trimmer_config is False or (isinstance(trimmer_config, dict) and not trimmer_config.get("enabled", True)):
+        return None
+    trimmer_config = trimmer_config if isinstance(trimmer_config, dict) else {}
+    trimmer = StreamTrimmer(
+        broker_factory,
+        retention,
+        streams,
+        interval=trimmer_config.get("interval", DEFAULT_INTERVAL),
+        batch_size=trimmer_config.get("batch_size", DEFAULT_BATCH_SIZE),
+        max_batches=trimmer_config.get("max_batches", DEFAULT_MAX_BATCHES),
+        key_prefix=trimmer_config.get("key_prefix", DEFAULT_KEY_PREFIX),
+    )
+    return trimmer if trimmer.streams else None
@@ -0,0 +1,248 @@
+import random
+from collections import OrderedDict
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aim_library.events.retention import Retention
+
+DEFAULT_KEY_PREFIX = "events:retry:"
+DEFAULT_DEAD_LETTER_PREFIX = "dead-letter"
+DEFAULT_DEAD_LETTER_MAXLEN = 10000
+ATTEMPTS_TTL = 24 * 3600
+DEFAULT_LEASE = 300.0
+
+SCHEDULED = "scheduled"
+DEAD_LETTER = "dead-letter"
+
+
+def decode(s: Any) -> Any:
+    return s.decode("utf-8") if isinstance(s, (bytes, bytearray)) else s
+
+
+class BackoffPolicy:
+    def __init__(
+        self,
+        base: float = 1.0,
+        factor: float = 2.0,
+        max_delay: float = 300.0,
+        max_attempts: int = 5,
+        jitter: float = 0.1,
+    ):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base * self.factor ** (attempt - 1))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    @classmethod
+    def from_config(cls, policy_config: Optional[dict], default: "BackoffPolicy" = None) -> "BackoffPolicy":
+        default = default or cls()
+        policy_config = policy_config or {}
+        return cls(
+            base=policy_config.get("base", default.base),
+            factor=policy_config.get("factor", default.factor),
+            max_delay=policy_config.get("max_delay", default.max_delay),
+            max_attempts=policy_config.get("max_attempts", default.max_attempts),
+            jitter=policy_config.get("jitter", default.jitter),
+        )
+
+
+class RetryScheduler:
+    # Failed entries wait in a sorted set per consumer group and stream, scored by the time they are due, with their
+    # payload in a companion hash per group. Due entries are handed back to the same group only (through the PEL
+    # janitor, like claimed entries) so other groups reading the stream don't see them twice, and only to consumers
+    # reading their stream, so with partitions a retry goes back to the worker that owns its partition. Attempts are
+    # counted per event uuid and group; once a handler's policy runs out of attempts the entry goes to a capped
+    # `dead-letter:<stream>` stream, which `replay` can push back into `<stream>`. The dead-letter stream follows its
+    # retention policy when there is one and is capped at `dead_letter_maxlen` otherwise.
+    #
+    # A taken entry isn't deleted: it moves to a processing set, leased for `lease` seconds, and keeps its payload
+    # until the retry is acknowledged (acked) or fails again (schedule). If the consumer dies in between, the lease
+    # runs out and take_due hands the entry out again, as the PEL would.
+    def __init__(
+        self,
+        broker_factory: Callable,
+        default_policy: BackoffPolicy = None,
+        policies: Dict[str, BackoffPolicy] = None,
+        key_prefix: str = DEFAULT_KEY_PREFIX,
+        dead_letter_prefix: str = DEFAULT_DEAD_LETTER_PREFIX,
+        dead_letter_maxlen: int = DEFAULT_DEAD_LETTER_MAXLEN,
+        batch_size: int = 100,
+        retention: Optional[Retention] = None,
+        lease: float = DEFAULT_LEASE,
+    ):
+        self.broker_factory = broker_factory
+        self.default_policy = default_policy or BackoffPolicy()
+        self.policies = policies or {}
+        self.key_prefix = key_prefix
+        self.dead_letter_prefix = dead_letter_prefix
+        self.dead_letter_maxlen = dead_letter_maxlen
+        self.batch_size = batch_size
+        self.retention = retention
+        self.lease = lease
+        # (stream, entry id) -> member of the retries taken by this process and not acknowledged yet
+        self.taken: Dict[Tuple[str, str], str] = {}
+
+    def policy_for(self, handler_name: str) -> BackoffPolicy:
+        return self.policies.get(handler_name, self.default_policy)
+
+    def schedule_key(self, group_name: str, stream: str) -> str:
+        return f"{self.key_prefix}{group_name}:schedule:{stream}"
+
+    def processing_key(self, group_name: str, stream: str) -> str:
+        return f"{self.key_prefix}{group_name}:processing:{stream}"
+
+    def payloads_key(self, group_name: str) -> str:
+        return f"{self.key_prefix}{group_name}:payloads"
+
+    def attempts_key(self, group_name: str, uuid: str) -> str:
+        return f"{self.key_prefix}{group_name}:attempts:{uuid}"
+
+    def dead_letter_stream(self, stream_name: str) -> str:
+        return f"{self.dead_letter_prefix}:{stream_name}"
+
+    def dead_letter_xadd_args(self, stream_name: str) -> Dict[str, Any]:
+        if self.retention is None:
+            return {"maxlen": self.dead_letter_maxlen, "approximate": True}
+        args = self.retention.xadd_args(stream_name)
+        if args["maxlen"] is None:
+            args["maxlen"] = self.dead_letter_maxlen
+        return args
+
+    def schedule(
+        self,
+        group_name: str,
+        handler_name: str,
+        entries: Sequence[Tuple[str, Any, Dict[str, bytes]]],
+    ) -> List[Tuple[str, Any]]:
+        # entries: (stream, entry id, fields) of the failed events. Returns one (SCHEDULED, due timestamp) or
+        # (DEAD_LETTER, dead-letter entry id) per entry. A failed retry leaves the processing set here, before the
+        # caller acknowledges it, so acked() doesn't drop the payload it was just rescheduled with.
+        if not entries:
+            return []
+        broker = self.broker_factory()
+        policy = self.policy_for(handler_name)
+        entry_keys = [decode(next(iter(fields))) for _, _, fields in entries]
+        attempts_keys = [self.attempts_key(group_name, key.split(":", 1)[-1]) for key in entry_keys]
+        pipe = broker.pipeline(transaction=False)
+        for attempts_key in attempts_keys:
+            pipe.incr(attempts_key)
+            pipe.expire(attempts_key, ATTEMPTS_TTL)
+        attempts = pipe.execute()[::2]
+        outcomes = []
+        for (stream, event_id, fields), entry_key, attempts_key, attempt in zip(
+            entries, entry_keys, attempts_keys, attempts
+        ):
+            member = f"{stream}|{decode(event_id) or '0-0'}|{entry_key}"
+            self.taken.pop((stream, decode(event_id)), None)
+            pipe.zrem(self.processing_key(group_name, stream), member)
+            if attempt > policy.max_attempts:
+                stream_name = self.dead_letter_stream(stream)
+                outcomes.append((DEAD_LETTER, len(pipe)))
+                pipe.xadd(stream_name, fields, **self.dead_letter_xadd_args(stream_name))  # type: ignore
+                pipe.hdel(self.payloads_key(group_name), member)
+                pipe.delete(attempts_key)
+                continue
+            due = time() + policy.delay(attempt)
+            pipe.hset(self.payloads_key(group_name), member, next(iter(fields.values())))  # Before it can be taken
+            pipe.zadd(self.schedule_key(group_name, stream), {member: due})
+            outcomes.append((SCHEDULED, due))
+        results = pipe.execute()
+        return [(outcome, results[value] if outcome == DEAD_LETTER else value) for outcome, value in outcomes]
+
+    def take_due(self, group_name: str, streams: Sequence[str], count: int = None) -> List[Tuple[str, list]]:
+        # Due entries and retries whose lease ran out. Several consumers of the group may race for the same
+        # members: whoever removes a member from its set owns it. Returns [(stream, [(entry id, fields), ...]), ...]
+        # ready for the claimed-message path, for the given streams only, earliest due first.
+        count = count or self.batch_size
+        broker = self.broker_factory()
+        now = time()
+        keys = [
+            (stream, key)
+            for stream in streams
+            for key in (self.schedule_key(group_name, stream), self.processing_key(group_name, stream))
+        ]
+        pipe = broker.pipeline(transaction=False)
+        for _, key in keys:
+            pipe.zrangebyscore(key, "-inf", now, start=0, num=count, withscores=True)
+        found = zip(keys, pipe.execute())
+        candidates = [(due, stream, key, member) for (stream, key), members in found for member, due in members]
+        candidates = sorted(candidates, key=lambda candidate: candidate[0])[:count]
+        if not candidates:
+            return []
+        pipe = broker.pipeline(transaction=True)  # A member is never out of both sets
+        for _, stream, key, member in candidates:
+            pipe.zrem(key, member)
+            pipe.zadd(self.processing_key(group_name, stream), {member: now + self.lease})
+        removed = pipe.execute()[::2]
+        owned = [(stream, member) for (_, stream, _, member), ok in zip(candidates, removed) if ok]
+        if not owned:
+            return []
+        payloads = broker.hmget(self.payloads_key(group_name), [member for _, member in owned])
+        due_by_stream: Dict[str, list] = OrderedDict()
+        stale = []
+        for (stream, member), payload in zip(owned, payloads):
+            if payload is None:  # Acknowledged by a consumer whose lease had run out
+                stale.append((stream, member))
+                continue
+            _, event_id, entry_key = decode(member).rsplit("|", 2)
+            self.taken[(stream, event_id)] = member
+            entry = (event_id.encode("utf-8"), {entry_key.encode("utf-8"): payload})
+            due_by_stream.setdefault(stream, []).append(entry)
+        if stale:
+            pipe = broker.pipeline(transaction=False)
+            for stream, member in stale:
+                pipe.zrem(self.processing_key(group_name, stream), member)
+            pipe.execute()
+        return list(due_by_stream.items())
+
+    def acked(self, group_name: str, stream: str, event_ids: Sequence[Any]) -> None:
+        # Called with every acknowledged batch; only retries taken by this process cost a round trip. The payload
+        # goes only if the member was still processing: a retry that failed again was rescheduled with it.
+        if not self.taken:
+            return
+        members = [self.taken.pop((stream, decode(event_id)), None) for event_id in event_ids]
+        members = [member for member in members if member is not None]
+        if not members:
+            return
+        broker = self.broker_factory()
+        pipe = broker.pipeline(transaction=False)
+        for member in members:
+            pipe.zrem(self.processing_key(group_name, stream), member)
+        done = [member for member, removed in zip(members, pipe.execute()) if removed]
+        if done:
+            broker.hdel(self.payloads_key(group_name), *done)
+
+    def stats(self, group_name: str, streams: Sequence[str]) -> Dict[str, Any]:
+        broker = self.broker_factory()
+        return {
+            "scheduled": sum(broker.zcard(self.schedule_key(group_name, stream)) for stream in streams),
+            "processing": sum(broker.zcard(self.processing_key(group_name, stream)) for stream in streams),
+        }
+
+
+def make_retry_scheduler(
+    broker_factory: Callable, retry_config: Optional[dict], retention: Optional[Retention] = None
+) -> Optional[RetryScheduler]:
+    if not retry_config or not retry_config.get("enabled", True):
+        return None
+    default_policy = BackoffPolicy.from_config(retry_config.get("default"))
+    policies = {
+        handler_name: BackoffPolicy.from_config(policy_config, default_policy)
+        for handler_name, policy_config in (retry_config.get("handlers") or {}).items()
+    }
+    return RetryScheduler(
+        broker_factory,
+        default_policy=default_policy,
+        policies=policies,
+        key_prefix=retry_config.get("key_prefix", DEFAULT_KEY_PREFIX),
+        dead_letter_prefix=retry_config.get("dead_letter_prefix", DEFAULT_DEAD_LETTER_PREFIX),
+        dead_letter_maxlen=retry_config.get("dead_letter_maxlen", DEFAULT_DEAD_LETTER_MAXLEN),
+        batch_size=retry_config.get("batch_size", 100),
+        retention=retention,
+        lease=retry_config.get("lease", DEFAULT_LEASE),
+    )
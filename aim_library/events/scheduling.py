@@ -0,0 +1,161 @@
+from collections import OrderedDict, deque
+from time import monotonic
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from aim_library.events.metrics import metrics
+from aim_library.utils.common import extract_attr
+
+DEFAULT_TENANT_KEY = "user_access.organization_id"
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_MAX_DEFERRED = 5000
+
+# (entry id, decoded event, encoded size, fields as read)
+Deferred = Tuple[Any, Any, int, Any]
+
+
+class WeightedRoundRobin:
+    # Smooth weighted round-robin (as in nginx) over the streams of a consumer: a stream with weight 3 is served
+    # three times as often as one with weight 1, interleaved rather than in bursts, and every stream with messages
+    # is served within a round. Streams are tried in order(); only the one actually served is charged, so empty
+    # streams don't use up turns; the credit they build while empty is capped at one round, and so is the debt of a
+    # stream served alone meanwhile, or it would be starved for as long once the others have messages again.
+    def __init__(self, streams: Iterable[str], weights: Optional[Dict[str, int]] = None):
+        from aim_library.events.redisstream import partition_base
+
+        weights = weights or {}
+        self.streams = list(streams)
+        # Partitions take the weight of their stream
+        self.weights = {s: max(1, int(weights.get(s, weights.get(partition_base(s), 1)))) for s in self.streams}
+        self.total = sum(self.weights.values())
+        self.current = {s: 0 for s in self.streams}
+
+    def order(self) -> List[str]:
+        # Stable: ties keep the configured order.
+        return sorted(self.streams, key=lambda s: -(self.current[s] + self.weights[s]))
+
+    def served(self, stream: str) -> None:
+        for s in self.streams:
+            self.current[s] = min(self.current[s] + self.weights[s], self.total)
+        self.current[stream] = max(self.current[stream] - self.total, -self.total)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = monotonic()
+
+    def take(self, tokens: float = 1.0) -> bool:
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class TenantLimiter:
+    # One token bucket per tenant (`tenant_key` of the event, the organization by default), so a flood from one
+    # organization can't hold back the others. Events over their tenant's rate are not handled right away but
+    # deferred: they stay pending for this consumer and are released, oldest first and in turn across tenants, as
+    # their tenant's bucket refills. An event never waits more than `max_delay` seconds, and no more than
+    # `max_deferred` events are held, so every tenant's latency stays bounded and nothing waits for the janitor.
+    # Events without a tenant are never limited.
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        tenants: Optional[Dict[str, Dict[str, float]]] = None,
+        tenant_key: str = DEFAULT_TENANT_KEY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        max_deferred: int = DEFAULT_MAX_DEFERRED,
+    ):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tenants = tenants or {}
+        self.tenant_key = tenant_key
+        self.max_delay = max_delay
+        self.max_deferred = max_deferred
+        self.buckets: Dict[str, TokenBucket] = {}
+        # Per tenant, in arrival order: (stream, deferred at, entry)
+        self.deferred: "OrderedDict[str, Deque[Tuple[str, float, Deferred]]]" = OrderedDict()
+        self.deferred_count = 0
+
+    def tenant(self, event: Any) -> Optional[str]:
+        tenant = extract_attr(event, self.tenant_key)
+        return str(tenant) if tenant is not None else None
+
+    def bucket(self, tenant: str) -> TokenBucket:
+        bucket = self.buckets.get(tenant)
+        if bucket is None:
+            limits = self.tenants.get(tenant)
+            if limits:  # Without a burst of its own, a tenant with its own rate can burst one second of it
+                bucket = TokenBucket(limits.get("rate", self.rate), limits.get("burst", limits.get("rate", self.burst)))
+            else:
+                bucket = TokenBucket(self.rate, self.burst)
+            self.buckets[tenant] = bucket
+        return bucket
+
+    def admit(
+        self, stream: str, ids: Iterable[Any], events: Iterable[Any], sizes: Iterable[int], fields: Iterable[Any]
+    ) -> List[Deferred]:
+        # The entries that can be handled now; the others are deferred. A tenant with deferred events queues
+        # behind them, so its events keep their order.
+        admitted = []
+        now = monotonic()
+        for entry in zip(ids, events, sizes, fields):
+            tenant = self.tenant(entry[1])
+            if tenant is None or (tenant not in self.deferred and self.bucket(tenant).take()):
+                admitted.append(entry)
+                continue
+            self.deferred.setdefault(tenant, deque()).append((stream, now, entry))
+            self.deferred_count += 1
+            metrics.counter("tenant_deferred_total", stream=stream).inc()
+        return admitted
+
+    def release(self, drain: bool = False) -> List[Tuple[str, List[Deferred]]]:
+        # Deferred entries that can go now, grouped by stream in release order. Tenants take turns one entry at a
+        # time; entries past max_delay, over max_deferred or (with drain, when the consumer stops) go regardless.
+        released: List[Tuple[str, Deferred]] = []
+        now = monotonic()
+        while self.deferred:
+            progress = False
+            for tenant in list(self.deferred):
+                queue = self.deferred[tenant]
+                stream, deferred_at, entry = queue[0]
+                overdue = drain or now - deferred_at >= self.max_delay or self.deferred_count > self.max_deferred
+                if not overdue and not self.bucket(tenant).take():
+                    continue
+                queue.popleft()
+                self.deferred_count -= 1
+                if not queue:
+                    del self.deferred[tenant]
+                released.append((stream, entry))
+                progress = True
+            if not progress:
+                break
+        by_stream: "OrderedDict[str, List[Deferred]]" = OrderedDict()
+        for stream, entry in released:
+            by_stream.setdefault(stream, []).append(entry)
+        return list(by_stream.items())
+
+
+def make_stream_scheduler(consumer_group_config: dict, streams: List[str]) -> Optional[WeightedRoundRobin]:
+    if consumer_group_config.get("stream_ordering") != "weighted_round_robin":
+        return None
+    return WeightedRoundRobin(streams, consumer_group_config.get("stream_weights"))
+
+
+def make_tenant_limiter(limits_config: Optional[dict]) -> Optional[TenantLimiter]:
+    if not limits_config or not limits_config.get("enabled", True) or not limits_config.get("rate"):
+        return None
+    return TenantLimiter(
+        rate=limits_config["rate"],
+        burst=limits_config.get("burst"),
+        tenants=limits_config.get("tenants"),
+        tenant_key=limits_config.get("tenant_key", DEFAULT_TENANT_KEY),
+        max_delay=limits_config.get("max_delay", DEFAULT_MAX_DELAY),
+        max_deferred=limits_config.get("max_deferred", DEFAULT_MAX_DEFERRED),
+    )
@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+import signal
+from time import monotonic, sleep
+from typing import Any, Dict, List, Optional
+
+from aim_library.events.redisstream import (
+    RedisStream,
+    consumer_stop,
+    maybe_decode,
+    partition_streams,
+    start_redis_consumer,
+)
+
+
+def stable_consumer_name(group_name: str, index: int, prefix: str = None) -> str:
+    # The pod name keeps the names stable for the lifetime of the pod: a restarted worker reuses its own PEL.
+    prefix = prefix or os.getenv("HOSTNAME") or group_name
+    return f"{prefix}-{index}"
+
+
+def run_worker(consumer_group_config, registered_handlers, consumer_name, start_from, max_retries, use_async):
+    def stop(signum, frame):
+        consumer_stop.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        if use_async:
+            from aim_library.events.asyncredisstream import start_async_redis_consumer
+
+            start = start_async_redis_consumer
+        else:
+            start = start_redis_consumer
+        start(consumer_group_config, registered_handlers, start_from, consumer_name, max_retries)
+    finally:
+        # multiprocessing ends the child with os._exit, which skips atexit: flush the background senders here.
+        log_sink = RedisStream.get_log_sink()
+        if log_sink:
+            log_sink.close()
+        from aim_library.utils.status import get_status_dispatcher
+
+        get_status_dispatcher().close()
+
+
+def reap_dead_consumers(
+    broker, group_name: str, streams: List[str], claim_to: str, live: List[str], dead_after: int, retry_after: int
+) -> Dict[str, List[str]]:
+    # Consumers that haven't touched the group for `dead_after` ms hand their pending entries to `claim_to` and are
+    # deleted. The claimed entries keep an idle time of `retry_after` so the janitor of `claim_to` picks them up on
+    # its next run instead of waiting another retry_after.
+    reaped: Dict[str, List[str]] = {}
+    for stream in streams:
+        for consumer in broker.xinfo_consumers(stream, group_name):
+            name = maybe_decode(consumer["name"])
+            if name in live or consumer["idle"] < dead_after:
+                continue
+            while True:
+                pending = broker.xpending_range(stream, group_name, "-", "+", 100, name)
+                ids = [entry["message_id"] for entry in pending]
+                if not ids or not broker.xclaim(stream, group_name, claim_to, 0, ids, idle=retry_after, justid=True):
+                    break
+            broker.xgroup_delconsumer(stream, group_name, name)
+            reaped.setdefault(stream, []).append(name)
+    return reaped
+
+
+class ConsumerSupervisor:
+    def __init__(
+        self,
+        consumer_group_config,
+        registered_handlers,
+        workers: int = 1,
+        start_from: str = ">",
+        max_retries: int = None,
+        use_async: bool = False,
+        drain_timeout: float = 30.0,
+        restart_delay: float = 1.0,
+        max_restart_delay: float = 60.0,
+        reap_interval: float = 60.0,
+        dead_after: int = 3600000,
+    ):
+        self.consumer_group_config = consumer_group_config
+        self.registered_handlers = registered_handlers
+        self.workers = workers
+        self.start_from = start_from
+        self.max_retries = max_retries
+        self.use_async = use_async
+        self.drain_timeout = drain_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.reap_interval = reap_interval
+        self.dead_after = dead_after
+        self.group_name = consumer_group_config["name"]
+        self.consumer_names = [stable_consumer_name(self.group_name, i) for i in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = [0] * workers
+        self.started_at = [0.0] * workers
+        self.next_start = [0.0] * workers
+        self.stopping = False
+        self._context = multiprocessing.get_context("fork")
+        self._last_reap = float("-inf")
+
+    def worker_config(self, index: int) -> dict:
+        # Stream partitions are split among the workers of every pod: pod_index/pods (POD_INDEX/POD_COUNT) tell
+        # this supervisor which share is its own.
+        pod_index = int(self.consumer_group_config.get("pod_index", os.getenv("POD_INDEX", 0)))
+        pods = int(self.consumer_group_config.get("pods", os.getenv("POD_COUNT", 1)))
+        worker_config = {
+            **self.consumer_group_config,
+            "worker_index": pod_index * self.workers + index,
+            "worker_count": pods * self.workers,
+        }
+        metrics_port = self.consumer_group_config.get("metrics_port") or os.getenv("METRICS_PORT")
+        if metrics_port:
+            worker_config["metrics_port"] = int(metrics_port) + index  # One port per worker
+        return worker_config
+
+    def start_worker(self, index: int) -> None:
+        process = self._context.Process(
+            target=run_worker,
+            args=(
+                self.worker_config(index),
+                self.registered_handlers,
+                self.consumer_names[index],
+                self.start_from,
+                self.max_retries,
+                self.use_async,
+            ),
+            name=self.consumer_names[index],
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = monotonic()
+
+    def check_workers(self) -> None:
+        now = monotonic()
+        for index, process in enumerate(self.processes):
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"Consumer {self.consumer_names[index]} exited with code {process.exitcode}, restarting")
+                self.processes[index] = None
+                crash_loop = now - self.started_at[index] < self.max_restart_delay
+                self.restarts[index] = self.restarts[index] + 1 if crash_loop else 1
+                backoff = self.restart_delay * 2 ** min(self.restarts[index] - 1, 10)
+                self.next_start[index] = now + min(backoff, self.max_restart_delay)
+            if now >= self.next_start[index]:
+                self.start_worker(index)
+
+    def maybe_reap(self) -> None:
+        if monotonic() - self._last_reap < self.reap_interval:
+            return
+        self._last_reap = monotonic()
+        try:
+            reaped = reap_dead_consumers(
+                RedisStream.get_broker(),
+                self.group_name,
+                [p for stream in self.consumer_group_config["streams"] for p in partition_streams(stream)],
+                claim_to=self.consumer_names[0],
+                live=self.consumer_names,
+                dead_after=self.dead_after,
+                retry_after=self.consumer_group_config.get("retry_after", 300000),
+            )
+            if reaped:
+                print(f"Removed dead consumers from {self.group_name}: {reaped}")
+        except Exception as e:
+            print(f"Unable to remove dead consumers: {e}")
+
+    def stop(self, signum=None, frame=None) -> None:
+        self.stopping = True
+
+    def drain(self) -> None:
+        # Workers finish their current iteration, wait for in-flight events and acknowledge them before exiting.
+        alive = [p for p in self.processes if p is not None and p.is_alive()]
+        for process in alive:
+            os.kill(process.pid, signal.SIGTERM)
+        deadline = monotonic() + self.drain_timeout
+        for process in alive:
+            process.join(max(0.0, deadline - monotonic()))
+        for process in alive:
+            if process.is_alive():
+                print(f"Consumer {process.name} did not drain in {self.drain_timeout}s, killing it")
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            while not self.stopping:
+                self.check_workers()
+                self.maybe_reap()
+                sleep(0.5)
+        finally:
+            self.drain()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {"pid": process.pid if process else None, "restarts": restarts}
+            for name, process, restarts in zip(self.consumer_names, self.processes, self.restarts)
+        }
+
+
+def start_supervised_consumers(
+    consumer_group_config, registered_handlers, workers=None, start_from=">", max_retries=None, use_async=False
+):
+    supervisor = ConsumerSupervisor(
+        consumer_group_config,
+        registered_handlers,
+        workers=workers or consumer_group_config.get("workers") or int(os.getenv("CONSUMER_WORKERS", 1)),
+        start_from=start_from,
+        max_retries=max_retries,
+        use_async=use_async,
+        drain_timeout=consumer_group_config.get("drain_timeout", 30.0),
+        reap_interval=consumer_group_config.get("reap_interval", 60.0),
+        dead_after=consumer_group_config.get("dead_consumer_after", 3600000),
+    )
+    supervisor.run()
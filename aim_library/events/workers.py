@@ -0,0 +1,132 @@
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from time import monotonic, perf_counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aim_library.events.metrics import observe_ack
+from aim_library.events.redisstream import RedisStream, consumer_context, create_consumer_file
+
+
+def run_with_consumer_context(consumer_ctx: dict, func: Callable, *args) -> Any:
+    # ContextVars don't cross process boundaries: restore the consumer context the parent had before running.
+    consumer_context.set(consumer_ctx)
+    return copy_context().run(func, *args)
+
+
+class AckTracker:
+    def __init__(self, broker, group_name: str, batch_size: int = 50, interval: float = 0.5):
+        self.broker = broker
+        self.group_name = group_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._finished: Dict[str, List[Any]] = defaultdict(list)
+        self._count = 0
+        self._last_flush = monotonic()
+
+    def finished(self, stream_name: str, event_ids: Sequence[Any]) -> None:
+        self._finished[stream_name].extend(event_ids)
+        self._count += len(event_ids)
+
+    def maybe_flush(self) -> None:
+        if self._count >= self.batch_size or (self._count and monotonic() - self._last_flush >= self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        if self._count:
+            start = perf_counter()
+            pipe = self.broker.pipeline(transaction=False)
+            for stream_name, event_ids in self._finished.items():
+                pipe.xack(stream_name, self.group_name, *event_ids)
+            pipe.execute()
+            elapsed = perf_counter() - start
+            retries = RedisStream.get_retry_scheduler()
+            for stream_name, event_ids in self._finished.items():
+                observe_ack(stream_name, elapsed)
+                create_consumer_file(stream_name)
+                if retries is not None:
+                    retries.acked(self.group_name, stream_name, event_ids)
+            self._finished.clear()
+            self._count = 0
+        self._last_flush = monotonic()
+
+
+class HandlerPool:
+    def __init__(
+        self,
+        broker,
+        group_name: str,
+        kind: str = "thread",
+        workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        ack_batch_size: int = 50,
+        ack_interval: float = 0.5,
+    ):
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        elif kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"Unknown executor type '{kind}', expected 'thread' or 'process'")
+        self.kind = kind
+        self.max_in_flight = max_in_flight or 2 * self.executor._max_workers
+        self.acks = AckTracker(broker, group_name, ack_batch_size, ack_interval)
+        self.in_flight_bytes = 0
+        self.on_done: Optional[Callable[[str, int, float, int], None]] = None
+        self._in_flight: Dict[Future, Tuple[str, Sequence[Any], float, int]] = {}
+
+    def submit(self, stream_name: str, event_ids: Sequence[Any], func: Callable, *args, nbytes: int = 0) -> None:
+        while len(self._in_flight) >= self.max_in_flight:
+            self.collect(block=True)
+        if self.kind == "thread":
+            future = self.executor.submit(copy_context().run, func, *args)
+        else:
+            future = self.executor.submit(run_with_consumer_context, consumer_context.get(), func, *args)
+        self._in_flight[future] = (stream_name, event_ids, perf_counter(), nbytes)
+        self.in_flight_bytes += nbytes
+
+    def collect(self, block: bool = False) -> None:
+        if self._in_flight:
+            done, _ = wait(list(self._in_flight), timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            failed = None
+            for future in done:
+                stream_name, event_ids, submitted_at, nbytes = self._in_flight.pop(future)
+                self.in_flight_bytes -= nbytes
+                if future.exception() is None:
+                    self.acks.finished(stream_name, event_ids)
+                    if self.on_done:
+                        self.on_done(stream_name, len(event_ids), perf_counter() - submitted_at, nbytes)
+                else:
+                    failed = failed or future.exception()
+            if failed is not None:
+                # Same outcome as a handler raising in the sync consumer: the failed event stays pending for
+                # redelivery, everything that finished is acknowledged before the consumer stops.
+                self.acks.flush()
+                raise failed
+        self.acks.maybe_flush()
+
+    def drain(self) -> None:
+        while self._in_flight:
+            self.collect(block=True)
+        self.acks.flush()
+
+    def shutdown(self) -> None:
+        try:
+            self.drain()
+        finally:
+            self.executor.shutdown()
+
+
+def make_handler_pool(broker, consumer_group_config) -> Optional[HandlerPool]:
+    executor_config = consumer_group_config.get("executor")
+    if not executor_config:
+        return None
+    return HandlerPool(
+        broker,
+        consumer_group_config["name"],
+        kind=executor_config.get("type", "thread"),
+        workers=executor_config.get("workers"),
+        max_in_flight=executor_config.get("max_in_flight"),
+        ack_batch_size=executor_config.get("ack_batch_size", 50),
+        ack_interval=executor_config.get("ack_interval", 0.5),
+    )
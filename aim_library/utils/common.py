@@ -1,8 +1,8 @@
 # pylint: disable=import-error
 import os
 from http.client import responses
-import uuid
-from functools import wraps
+import time
+from functools import lru_cache, wraps
 from typing import Callable
 
 
@@ -51,9 +51,29 @@ def _make_response(data):
     return resp
 
 
-def uuid_factory(name: str) -> Callable[[], str]:
+def format_uuid(raw: bytearray, version: int) -> str:
+    # Same as str(uuid.UUID(bytes=raw, version=version)), without building the UUID object: several times faster.
+    raw[6] = raw[6] & 0x0F | version << 4
+    raw[8] = raw[8] & 0x3F | 0x80
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def random_uuid() -> str:
+    return format_uuid(bytearray(os.urandom(16)), 4)
+
+
+def time_ordered_uuid() -> str:
+    # RFC 9562 version 7: 48-bit Unix time in ms followed by random bits, ids sort by creation time.
+    return format_uuid(bytearray((time.time_ns() // 1_000_000).to_bytes(6, "big") + os.urandom(10)), 7)
+
+
+@lru_cache(maxsize=1024)
+def uuid_factory(name: str, time_ordered: bool = False) -> Callable[[], str]:
+    # Cached: events ask for the generator of their prefix on every construction.
     prefix = name + "-"
-    return lambda: prefix + str(uuid.uuid4())
+    make_uuid = time_ordered_uuid if time_ordered else random_uuid
+    return lambda: prefix + make_uuid()
 
 
 def extract_attr(item, attr_name):
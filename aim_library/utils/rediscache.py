@@ -1,10 +1,9 @@
 import pickle
-import redis
 import copy
 import builtins
 import json
 
-from aim_library.utils.configmanager import ConfigManager
+from aim_library.utils.redisclients import get_redis_client, make_redis_client
 
 
 class RedisCache:
@@ -13,10 +12,7 @@ class RedisCache:
 
     @classmethod
     def init_client(cls, config=None):
-        config = config or ConfigManager.get_config_value("cache", "redis")
-        cls.__client = cls.__client = redis.StrictRedis(
-            host=config["host"], port=config["port"], db=config["db"], password=config["password"]
-        )
+        cls.__client = make_redis_client(config) if config else get_redis_client("cache", "redis")
         cls.__types_mapping = cls.__name__ + "__types_mapping"
 
     @classmethod
@@ -218,7 +214,6 @@ def replace_key(r=None, name=None, timeout=120):
 
 
 def make_redis(config=None):
-    config = config or ConfigManager.get_config_value("cache", "redis")
-    return redis.StrictRedis(
-        host=config["host"], port=config["port"], db=config["db"], password=config["password"],
-    )
+    if config:
+        return make_redis_client(config)
+    return get_redis_client("cache", "redis")
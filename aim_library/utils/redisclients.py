@@ -0,0 +1,203 @@
+import threading
+from time import perf_counter
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+import redis.asyncio
+import redis.asyncio.connection
+from redis.connection import HIREDIS_AVAILABLE
+
+from aim_library.utils.configmanager import ConfigManager
+
+DEFAULT_POOL_CONFIG = {
+    "max_connections": None,  # Unbounded; set it to cap the pool, callers then wait up to `timeout` for a connection
+    "timeout": 20,
+    "socket_connect_timeout": 5,
+    "socket_timeout": None,  # XREADGROUP blocks on the socket, a read timeout would have to exceed every `block`
+    "socket_keepalive": True,
+    "health_check_interval": 30,
+    "hiredis": True,
+}
+NO_CONNECTION = "No connection available."
+
+
+class PoolStats:
+    def __init__(self):
+        self.created = 0
+        self.checked_out = set()
+        self.max_in_use = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_use(self) -> int:
+        return len(self.checked_out)
+
+    def acquired(self, connection, waited: bool, seconds: float) -> None:
+        with self._lock:
+            self.checked_out.add(id(connection))
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            if waited:
+                self.waits += 1
+                self.wait_seconds += seconds
+
+    def released(self, connection) -> None:
+        # get_connection also releases connections it failed to hand out, those were never counted as in use
+        with self._lock:
+            self.checked_out.discard(id(connection))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "created": self.created,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "waits": self.waits,
+            "wait_seconds": self.wait_seconds,
+            "timeouts": self.timeouts,
+        }
+
+
+class InstrumentedPool:
+    # Counts connections created, checked out and requests that had to wait for one (a bounded pool that was
+    # empty). Stats start over with the pool, which redis-py also resets in a forked child.
+    def reset(self):
+        self.stats = PoolStats()
+        super().reset()
+
+    def make_connection(self):
+        self.stats.created += 1
+        return super().make_connection()
+
+    def must_wait(self) -> bool:
+        queue = getattr(self, "pool", None)  # Only blocking pools keep their free connections in a queue
+        return queue is not None and queue.empty()
+
+
+class InstrumentedConnectionPool(InstrumentedPool, redis.ConnectionPool):
+    def get_connection(self, command_name, *keys, **options):
+        waited = self.must_wait()
+        start = perf_counter()
+        try:
+            connection = super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            self.stats.timeouts += str(e) == NO_CONNECTION
+            raise
+        self.stats.acquired(connection, waited, perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        self.stats.released(connection)
+        super().release(connection)
+
+
+class InstrumentedBlockingConnectionPool(InstrumentedConnectionPool, redis.BlockingConnectionPool):
+    pass
+
+
+class InstrumentedAsyncConnectionPool(InstrumentedPool, redis.asyncio.ConnectionPool):
+    async def get_connection(self, command_name, *keys, **options):
+        waited = self.must_wait()
+        start = perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            self.stats.timeouts += str(e) == NO_CONNECTION
+            raise
+        self.stats.acquired(connection, waited, perf_counter() - start)
+        return connection
+
+    async def release(self, connection):
+        self.stats.released(connection)
+        await super().release(connection)
+
+
+class InstrumentedAsyncBlockingConnectionPool(InstrumentedAsyncConnectionPool, redis.asyncio.BlockingConnectionPool):
+    pass
+
+
+def pool_kwargs(config: dict, asyncio: bool = False) -> Dict[str, Any]:
+    pool_config = {**DEFAULT_POOL_CONFIG, **(config.get("pool") or {})}
+    kwargs = dict(
+        host=config["host"],
+        port=config["port"],
+        db=config["db"],
+        password=config["password"],
+        max_connections=pool_config["max_connections"],
+        socket_connect_timeout=pool_config["socket_connect_timeout"],
+        socket_timeout=pool_config["socket_timeout"],
+        socket_keepalive=pool_config["socket_keepalive"],
+        health_check_interval=pool_config["health_check_interval"],
+    )
+    if pool_config["max_connections"] is not None:
+        kwargs["timeout"] = pool_config["timeout"]
+    if not pool_config["hiredis"]:
+        kwargs["parser_class"] = redis.asyncio.connection.PythonParser if asyncio else redis.connection.PythonParser
+    elif not HIREDIS_AVAILABLE:
+        print("WARNING: hiredis is not installed, Redis replies are parsed in pure Python")
+    return kwargs
+
+
+def make_pool(config: dict, asyncio: bool = False):
+    # Unbounded by default, like redis-py: blocking XREADGROUPs, handler pools, the log sink, janitor, trimmer and
+    # status threads all hold connections, and a cap they outgrow makes callers wait `timeout` and then fail. With
+    # `max_connections` set the pool is bounded and blocking instead.
+    kwargs = pool_kwargs(config, asyncio)
+    if kwargs["max_connections"] is None:
+        return InstrumentedAsyncConnectionPool(**kwargs) if asyncio else InstrumentedConnectionPool(**kwargs)
+    if asyncio:
+        return InstrumentedAsyncBlockingConnectionPool(**kwargs)
+    return InstrumentedBlockingConnectionPool(**kwargs)
+
+
+def make_redis_client(config: dict) -> redis.StrictRedis:
+    return redis.StrictRedis(connection_pool=make_pool(config))
+
+
+def make_async_redis_client(config: dict) -> redis.asyncio.StrictRedis:
+    return redis.asyncio.StrictRedis(connection_pool=make_pool(config, asyncio=True))
+
+
+_clients: Dict[Tuple[str, str, bool], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(section: str, key: str, asyncio: bool = False, config: Optional[dict] = None):
+    name = (section, key, asyncio)
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                config = config or ConfigManager.get_config_value(section, key)
+                _clients[name] = make_async_redis_client(config) if asyncio else make_redis_client(config)
+    return _clients[name]
+
+
+def get_redis_client(section: str, key: str = "redis", config: Optional[dict] = None) -> redis.StrictRedis:
+    # One client, and so one connection pool, per config section for the whole process.
+    return get_client(section, key, config=config)
+
+
+def get_async_redis_client(
+    section: str, key: str = "redis", config: Optional[dict] = None
+) -> redis.asyncio.StrictRedis:
+    # redis.asyncio connections belong to the event loop that opened them: use from a single running loop.
+    return get_client(section, key, asyncio=True, config=config)
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    stats = {}
+    for (section, key, asyncio), client in list(_clients.items()):
+        pool = client.connection_pool
+        name = f"{section}.{key}" + (".async" if asyncio else "")
+        bounded = isinstance(pool, (redis.BlockingConnectionPool, redis.asyncio.BlockingConnectionPool))
+        stats[name] = {**pool.stats.as_dict(), "max_connections": pool.max_connections if bounded else None}
+    return stats
+
+
+def reset_clients() -> None:
+    with _clients_lock:
+        for client in _clients.values():
+            if not isinstance(client, redis.asyncio.StrictRedis):
+                client.connection_pool.disconnect()
+        _clients.clear()
@@ -1,49 +1,208 @@
-from time import sleep
-from os import environ
-from multiprocessing import Process
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from time import monotonic, sleep
+from os import environ, getpid
 from importlib.util import find_spec
+from typing import Callable, Dict, List, Optional
 
 GRPC_STATUS_SERVER_HOST = environ.get('GRPC_STATUS_SERVER_HOST', 'documents-status.ticketai')
 GRPC_STATUS_SERVER_PORT = environ.get('GRPC_STATUS_SERVER_PORT', '50052')
 
-def _send_document_status(
-    document_id: str,
-    status: str,
-    description: str,
-    organization: str,
-    meta: str
-):
-    if not find_spec('aim-status-grpc'):
+
+def make_grpc_status_client():
+    if not find_spec('aim_status_grpc'):
         print(f'WARNING: Unable to send documents status updates, Missing aim-status-grpc dependency')
-        return
-    
+        return None
+
     from aim_status_grpc.status_client import GRPCStatusClient
 
-    grpc_status_client = GRPCStatusClient(
+    return GRPCStatusClient(
         server_name = GRPC_STATUS_SERVER_HOST,
         port = GRPC_STATUS_SERVER_PORT
     )
-        
-    for _ in range(3):
+
+
+class InMemoryStatusClient:
+    def __init__(self):
+        self.updates: List[Dict[str, str]] = []
+
+    def update_document_status(self, document_id, status, description, organization, meta):
+        self.updates.append(
+            dict(document_id=document_id, status=status, description=description, organization=organization, meta=meta)
+        )
+
+
+# Sends document status updates from a background thread: updates of the same document are coalesced while queued,
+# and each batch goes out over `concurrency` parallel calls (the status service has no batch call). Failed updates
+# of a batch are retried together after a single `retry_delay`, so an outage costs retries * retry_delay per batch,
+# not per update.
+class StatusDispatcher:
+    def __init__(
+        self,
+        client_factory: Callable = make_grpc_status_client,
+        max_pending: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        retries: int = 3,
+        retry_delay: float = 1.0,
+        concurrency: int = 8,
+    ):
+        self.client_factory = client_factory
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.concurrency = concurrency
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self._client = None
+        self._client_missing = False
+        self._pending: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._in_progress = 0
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Called with the lock held. Threads don't survive a fork, so a child process gets its own worker.
+        if self._pid == getpid():
+            return
+        self._pending = OrderedDict()
+        self._in_progress = 0
+        self._client = None
+        self._stop = False
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='status-sender')
+        self._thread = threading.Thread(target=self._run, name='status-dispatcher', daemon=True)
+        self._thread.start()
+        self._pid = getpid()
+
+    def submit(self, document_id: str, status: str, description: str, organization: str, meta: str):
+        update = dict(
+            document_id=document_id, status=status, description=description, organization=organization, meta=meta
+        )
+        with self._lock:
+            self._ensure_started()
+            if document_id in self._pending:
+                # Only the latest status of a document matters, older queued updates are replaced.
+                del self._pending[document_id]
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_pending:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[document_id] = update
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def _take_batch(self):
+        with self._lock:
+            deadline = monotonic() + self.flush_interval
+            while not self._stop and len(self._pending) < self.batch_size and monotonic() < deadline:
+                self._wakeup.wait(deadline - monotonic())
+            count = min(self.batch_size, len(self._pending))
+            batch = [self._pending.popitem(last=False)[1] for _ in range(count)]
+            self._in_progress = len(batch)
+            return batch
+
+    def _get_client(self):
+        if self._client is None and not self._client_missing:
+            self._client = self.client_factory()
+            self._client_missing = self._client is None
+        return self._client
+
+    def _send_one(self, client, update) -> bool:
         try:
-            grpc_status_client.update_document_status(
-                document_id=document_id,
-                status=status,
-                description=description,
-                organization=organization,
-                meta=meta
-            )
-            break
+            client.update_document_status(**update)
+            return True
         except Exception as e:
             if environ.get('ENABLE_STATUS_LOGS', False):
                 print(e)
-            sleep(1)
-    else:
-        if environ.get('ENABLE_STATUS_LOGS', False):
-            print(f'ERROR: Document status update failed for {document_id}')
+            return False
+
+    def _send(self, batch) -> List[Dict[str, str]]:
+        # Returns the updates that could not be sent.
+        for attempt in range(self.retries):
+            client = self._get_client()
+            if client is None:
+                break
+            results = list(self._executor.map(partial(self._send_one, client), batch))
+            batch = [update for update, sent in zip(batch, results) if not sent]
+            if not batch:
+                break
+            self._client = None  # Rebuild the channel on the next attempt
+            if attempt < self.retries - 1:
+                sleep(self.retry_delay)
+        if batch and environ.get('ENABLE_STATUS_LOGS', False):
+            print(f'ERROR: Document status update failed for {", ".join(u["document_id"] for u in batch)}')
             print(f'INFO: Current config: (server_name={GRPC_STATUS_SERVER_HOST}, port={GRPC_STATUS_SERVER_PORT})')
             print(f'INFO: To change it set GRPC_STATUS_SERVER_HOST and GRPC_STATUS_SERVER_PORT environment variables')
-    
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                failed = self._send(batch)
+                self.sent += len(batch) - len(failed)
+                self.failed += len(failed)
+            with self._lock:
+                self._in_progress = 0
+                self._wakeup.notify_all()
+                if self._stop and not self._pending:
+                    self._executor.shutdown(wait=False)
+                    return
+
+    def flush(self, timeout: float = 5.0):
+        deadline = monotonic() + timeout
+        with self._lock:
+            if self._pid != getpid():
+                return
+            self._wakeup.notify_all()
+            while (self._pending or self._in_progress) and monotonic() < deadline:
+                self._wakeup.wait(deadline - monotonic())
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            if self._pid != getpid():
+                return
+            self._stop = True
+            self._wakeup.notify_all()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending) if self._pid == getpid() else 0
+        return {
+            'pending': pending,
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+
+_dispatcher: Optional[StatusDispatcher] = None
+
+
+def get_status_dispatcher() -> StatusDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = StatusDispatcher()
+    return _dispatcher
+
+
+def set_status_dispatcher(dispatcher: StatusDispatcher) -> Optional[StatusDispatcher]:
+    global _dispatcher
+    previous, _dispatcher = _dispatcher, dispatcher
+    return previous
+
 
 def set_document_status(
     document_id: str,
@@ -52,5 +211,4 @@ def set_document_status(
     organization: str,
     meta: str
 ):
-    proc = Process(target=_send_document_status, args=(document_id, status, description, organization, meta,))
-    proc.start()
+    get_status_dispatcher().submit(document_id, status, description, organization, meta)
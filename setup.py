@@ -9,14 +9,17 @@ setuptools.setup(
     author_email="ticketai@outlook.com",
     description="AIMachina library",
     url="https://github.com/aimachina/library",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["tests", "tests.*"]),
     classifiers=[
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.9",
     install_requires=[
         "redis==4.5.5",
         "hiredis==2.2.3",
     ],
+    extras_require={
+        "msgpack": ["msgpack>=1.0"],
+    },
 )
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Any, Callable, List
+
+import pytest
+import yaml
+
+from aim_library.events import redisstream
+from aim_library.events.asyncredisstream import AsyncRedisStream
+from aim_library.events.memorybroker import InMemoryBroker, install_memory_broker
+from aim_library.events.metrics import metrics
+from aim_library.events.redisstream import RedisStream, consumer_context, consumer_stop, event_context
+
+
+def reset_stream_state() -> None:
+    # RedisStream caches what it read from the config in class attributes, once per process.
+    sink = RedisStream.get_log_sink() if RedisStream._RedisStream__log_sink_loaded else None
+    if sink is not None:
+        sink.close()
+    for name in list(vars(RedisStream)):
+        if name.startswith("_RedisStream__"):
+            setattr(RedisStream, name, False if name.endswith("_loaded") else None)
+    AsyncRedisStream.set_broker(None)
+
+
+# Writes an events-stream config for the test and points DEFAULT_CONFIG at it, then installs a fresh in-memory
+# broker: configure(retry={...}, partitions={...}) returns the broker.
+@pytest.fixture
+def configure(tmp_path, monkeypatch) -> Callable[..., InMemoryBroker]:
+    monkeypatch.setenv("HOME", str(tmp_path))  # Consumers touch a file per stream there
+
+    def configure(**events_stream) -> InMemoryBroker:
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text(yaml.safe_dump({"events-stream": {"broker": {}, **events_stream}}))
+        monkeypatch.setenv("DEFAULT_CONFIG", str(config_file))
+        reset_stream_state()
+        return install_memory_broker()
+
+    yield configure
+    reset_stream_state()
+
+
+@pytest.fixture
+def broker(configure) -> InMemoryBroker:
+    return configure()
+
+
+# Log and error events go through aim_common; the tests only look at what would have been produced.
+@pytest.fixture(autouse=True)
+def emitted(monkeypatch) -> List[Any]:
+    emitted: List[Any] = []
+    monkeypatch.setattr(redisstream, "produce_log_event", lambda result, *args, **kwargs: emitted.append(result))
+    monkeypatch.setattr(redisstream, "produce_error_event", lambda _, __, result, **kwargs: emitted.append(result))
+    return emitted
+
+
+@pytest.fixture(autouse=True)
+def isolated_contexts():
+    consumer_token, event_token = consumer_context.set({}), event_context.set(None)
+    metrics.clear()
+    yield
+    consumer_context.reset(consumer_token)
+    event_context.reset(event_token)
+    consumer_stop.clear()
+
+
+# Runs `start(*args, **kwargs)` (a consumer entry point) in a thread until `done()` holds, then stops it the way a
+# SIGTERM would. Returns the exception the consumer raised, if any.
+@pytest.fixture
+def run_consumer() -> Callable[..., Any]:
+    def run(start: Callable, *args, done: Callable[[], bool], timeout: float = 10.0, **kwargs):
+        errors: List[Exception] = []
+
+        def target():
+            try:
+                start(*args, **kwargs)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + timeout
+        while thread.is_alive() and not done() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        consumer_stop.set()
+        thread.join(timeout)
+        consumer_stop.clear()
+        assert not thread.is_alive(), "The consumer did not stop"
+        return errors[0] if errors else None
+
+    return run
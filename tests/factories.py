@@ -0,0 +1,39 @@
+from typing import Any, Dict, List, Tuple
+
+from aim_library.events.events import DocumentEvent, EventType, MLEvent
+from aim_library.events.redisstream import encode_stream_entry
+
+
+def document_event(document_id: str = "DOC-0001", event_type: EventType = None, **kwargs) -> DocumentEvent:
+    return DocumentEvent(document_id=document_id, event_type=event_type, **kwargs)
+
+
+def ml_event(source_id: str = "DOC-0001", user_id: str = "", **kwargs) -> MLEvent:
+    return MLEvent(user_id=user_id, source_id=source_id, **kwargs)
+
+
+# What XREADGROUP returns for the events: [(id, fields)], as bytes.
+def read_entries(broker, stream: str, group: str = "g", consumer: str = "c", count: int = 100) -> List[Tuple]:
+    found = broker.xreadgroup(group, consumer, {stream: ">"}, count=count)
+    return found[0][1] if found else []
+
+
+def entry_fields(stream: str, event: Any) -> Dict[bytes, bytes]:
+    return {key.encode("utf-8"): value for key, value in encode_stream_entry(stream, event).items()}
+
+
+# A handler recording what it was given, raising `fail` (once per call) while `fail` is set.
+class RecordingHandler:
+    def __init__(self, name: str = "handle", fail: Exception = None):
+        self.__name__ = name
+        self.fail = fail
+        self.calls: List[Tuple[str, Any, Any]] = []
+
+    def __call__(self, stream_name, event_or_batch, event_id):
+        self.calls.append((stream_name, event_or_batch, event_id))
+        if self.fail is not None:
+            raise self.fail
+
+    @property
+    def events(self) -> List[Any]:
+        return [event for _, batch, _ in self.calls for event in (batch if isinstance(batch, list) else [batch])]
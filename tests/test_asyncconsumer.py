@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from aim_library.events.asyncredisstream import produce_many_async, produce_one_async, reap, start_async_redis_consumer
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import produce_many
+
+from tests.factories import document_event
+
+CONFIG = {"name": "g", "streams": ["s"], "batch_size": 10}
+
+
+def test_coroutine_handlers_run_concurrently_and_in_order_per_document(broker, run_consumer):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(f"DOC-{d}", data={"seq": seq}) for seq in range(3) for d in range(4)])
+    running, handled = set(), []
+    overlap = []
+
+    async def handle(stream_name, event, event_id):
+        key = (event.document_id, event.data["seq"])
+        assert not any(document_id == event.document_id for document_id, _ in running)
+        running.add(key)
+        overlap.append(len(running))
+        await asyncio.sleep(0.01)
+        running.discard(key)
+        handled.append(key)
+
+    error = run_consumer(
+        start_async_redis_consumer,
+        CONFIG,
+        {EventType.DOCUMENT_CREATED: handle},
+        consumer_id="a",
+        concurrency=8,
+        done=lambda: len(handled) == 12,
+    )
+    assert error is None
+    assert max(overlap) > 1
+    for d in range(4):
+        assert [seq for document_id, seq in handled if document_id == f"DOC-{d}"] == [0, 1, 2]
+    assert broker.xpending("s", "g")["pending"] == 0
+
+
+def test_failing_event_stays_pending_with_the_rest_of_its_document(broker, run_consumer, emitted):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    ids = produce_many("s", [document_event("DOC-0", data={"seq": seq}) for seq in range(2)] + [document_event("B")])
+    handled = []
+
+    async def handle(stream_name, event, event_id):
+        handled.append(event.document_id)
+        if event.data.get("seq") == 0:
+            raise ValueError("boom")
+
+    # Runs until the failure stops the consumer
+    error = run_consumer(start_async_redis_consumer, CONFIG, {EventType.DOCUMENT_CREATED: handle}, done=lambda: False)
+    assert isinstance(error, ValueError)
+    assert handled.count("DOC-0") == 1 and "B" in handled
+    assert [entry["message_id"] for entry in broker.xpending_range("s", "g", "-", "+", 10)] == ids[:2]
+
+
+def test_reap_raises_once_the_other_tasks_have_settled():
+    finished = []
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        finished.append(True)
+
+    async def main():
+        tasks = {asyncio.create_task(fail()), asyncio.create_task(slow())}
+        await asyncio.sleep(0)
+        with pytest.raises(ValueError):
+            await reap(tasks)
+        assert finished == [True] and not tasks
+
+    asyncio.run(main())
+
+
+def test_async_producers(broker):
+    async def main():
+        one = await produce_one_async("s", document_event())
+        many = await produce_many_async("s", [document_event(), document_event()])
+        return [one, *many]
+
+    ids = asyncio.run(main())
+    assert [id_ for id_, _ in broker.xrange("s")] == ids
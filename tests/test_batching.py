@@ -0,0 +1,61 @@
+from aim_library.events.batching import AdaptiveBatchSize, entries_size, make_batch_size_controller
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import produce_many, start_redis_consumer
+
+from tests.factories import RecordingHandler, document_event
+
+
+def test_slow_batches_shrink_the_count_right_away():
+    sizes = AdaptiveBatchSize(100, target_latency=1.0)
+    sizes.observe(100, 10.0)  # 0.1s per event: 10 fit in a second
+    assert sizes.next_size() == 10
+
+
+def test_count_grows_by_steps_only_while_there_is_a_backlog():
+    sizes = AdaptiveBatchSize(10, max_size=1000, target_latency=1.0, max_step=2.0)
+    sizes.set_lag(0)
+    sizes.observe(10, 0.01)
+    assert sizes.next_size() == 10  # Fast, but nothing waiting
+    sizes.set_lag(10000)
+    sizes.observe(10, 0.01)
+    assert sizes.next_size() == 20
+    sizes.observe(20, 0.02)
+    assert sizes.next_size() == 40
+
+
+def test_full_batches_stand_for_the_backlog_without_lag():
+    sizes = AdaptiveBatchSize(10, target_latency=1.0)
+    sizes.observe(5, 0.005)
+    assert sizes.next_size() == 10
+    sizes.observe(10, 0.01)
+    assert sizes.next_size() == 20
+
+
+def test_memory_budget_bounds_the_count_and_pauses_reads():
+    sizes = AdaptiveBatchSize(100, target_latency=60.0, memory_budget=10000)
+    sizes.observe(10, 0.01, nbytes=1000)  # 100 bytes per event
+    assert sizes.next_size(in_flight_bytes=5000) == 50
+    assert not sizes.can_pull(in_flight_bytes=10000)
+    assert sizes.stats()["throttled"] == 1
+    assert entries_size([{"k": b"abc"}, {"k": b"de"}]) == 5
+
+
+def test_controller_is_only_made_when_configured():
+    assert make_batch_size_controller({"name": "g", "batch_size": 10}) is None
+    sizes = make_batch_size_controller({"name": "g", "batch_size": 10, "adaptive_batching": True, "retry_after": 8000})
+    assert sizes.target_latency == 2.0
+
+
+def test_batch_consumer_handles_everything_with_adaptive_batches(broker, run_consumer):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(f"DOC-{i}") for i in range(50)])
+    handler = RecordingHandler()
+    config = {"name": "g", "streams": ["s"], "batch_size": 4, "adaptive_batching": {"max_size": 16}}
+
+    error = run_consumer(
+        start_redis_consumer, config, {EventType.DOCUMENT_CREATED: handler}, done=lambda: len(handler.events) == 50
+    )
+
+    assert error is None
+    assert [event.document_id for event in handler.events] == [f"DOC-{i}" for i in range(50)]
+    assert max(len(batch) for _, batch, _ in handler.calls) > 4
@@ -0,0 +1,51 @@
+from aim_library.events.causalchain import TRACE_KEY, CausalChain, make_causal_chain
+from aim_library.events.codecs import decode_event
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import digest_event, get_event_context, produce_one
+
+from tests.factories import document_event
+
+
+def test_causations_keep_the_last_hops():
+    chain = CausalChain(max_causations=2)
+    causations = None
+    for hop in range(5):
+        causations = chain.causations(causations, {"s": f"{hop}-0"})
+    assert causations == [{"s": "3-0"}, {"s": "4-0"}]
+    assert len(CausalChain(max_causations=0).causations([{"s": "0-0"}] * 20, {"s": "1-0"})) == 21
+
+
+def test_correlations_keep_the_root_streams():
+    chain = CausalChain(max_correlations=2)
+    correlations = chain.correlations({"a": "1-0", "b": "2-0"}, {"c": "3-0"})
+    assert correlations == {"a": "1-0", "b": "2-0"}
+    assert chain.correlations(correlations, {"b": "4-0"}) == {"a": "1-0", "b": "4-0"}
+
+
+def test_trace_id_is_started_once_and_inherited():
+    ids = iter(["TRACE-1", "TRACE-2"])
+    chain = CausalChain(max_correlations=1, trace=True, make_trace_id=lambda: next(ids))
+    root = chain.correlations(None, {"a": "1-0"})
+    assert root == {TRACE_KEY: "TRACE-1", "a": "1-0"}  # The trace id doesn't count against max_correlations
+    assert chain.correlations(root, {"b": "2-0"})[TRACE_KEY] == "TRACE-1"
+    assert chain.root_correlations() == {TRACE_KEY: "TRACE-2"}
+    assert CausalChain().root_correlations() == {}
+
+
+def test_config_bounds_every_produced_event(configure):
+    broker = configure(causal_chain={"max_causations": 1, "trace": True})
+    produce_one("s", document_event("DOC-1"))
+    traces = []
+
+    def handle(stream_name, event, event_id):
+        traces.append(get_event_context().trace_id)
+        produce_one("s", document_event("DOC-1"))
+
+    for _ in range(3):
+        id_, fields = broker.xrange("s")[-1]
+        digest_event("s", decode_event(next(iter(fields.values()))), id_, {EventType.DOCUMENT_CREATED: handle})
+    events = [decode_event(next(iter(fields.values()))) for _, fields in broker.xrange("s")]
+    assert [len(event.causations) for event in events] == [0, 1, 1, 1]
+    assert events[-1].causations == [{"s": broker.xrange("s")[-2][0]}]
+    assert len({event.correlations[TRACE_KEY] for event in events} | set(traces)) == 1
+    assert make_causal_chain(None).max_causations == 16
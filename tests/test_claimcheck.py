@@ -0,0 +1,50 @@
+import pytest
+
+from aim_library.events.claimcheck import BlobRef, ClaimCheck, raw_value
+from aim_library.events.redisstream import bytes_to_event, produce_one
+
+from tests.factories import ml_event
+
+LARGE = {"lines": ["some text on a line"] * 500}
+
+
+@pytest.fixture
+def claim_checked(configure, tmp_path):
+    return configure(claim_check={"store": "local", "path": str(tmp_path / "blobs"), "threshold": 1024})
+
+
+def test_large_fields_travel_by_reference(claim_checked, tmp_path):
+    event = ml_event(data=LARGE)
+    produce_one("s", event)
+    [(_, fields)] = claim_checked.xrange("s")
+    payload = next(iter(fields.values()))
+    assert len(payload) < 1024
+    assert event.data == LARGE  # The producer's event is left alone
+    assert list((tmp_path / "blobs").rglob("*"))
+
+    consumed = bytes_to_event(payload)
+    assert isinstance(raw_value(consumed, "data"), BlobRef)
+    assert consumed.data == LARGE
+
+
+def test_small_fields_stay_inline(claim_checked):
+    produce_one("s", ml_event(data={"lines": ["short"]}))
+    [(_, fields)] = claim_checked.xrange("s")
+    consumed = bytes_to_event(next(iter(fields.values())))
+    assert not isinstance(raw_value(consumed, "data"), BlobRef)
+    assert consumed.data == {"lines": ["short"]}
+
+
+def test_reproduced_event_keeps_its_reference(claim_checked):
+    produce_one("s", ml_event(data=LARGE))
+    [(_, fields)] = claim_checked.xrange("s")
+    consumed = bytes_to_event(next(iter(fields.values())))
+    ref = raw_value(consumed, "data")
+    produce_one("t", consumed)
+    [(_, fields)] = claim_checked.xrange("t")
+    assert raw_value(bytes_to_event(next(iter(fields.values()))), "data") == ref
+
+
+def test_unknown_store_is_rejected():
+    with pytest.raises(ValueError):
+        ClaimCheck(store="ftp")
@@ -0,0 +1,57 @@
+import pickle
+
+import pytest
+
+from aim_library.events.codecs import available_codecs, decode_event, encode_event, get_codec
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import RedisStream, bytes_to_event, produce_one
+
+from tests.factories import document_event, ml_event
+
+
+@pytest.mark.parametrize("codec", ["pickle", "msgpack"])
+def test_events_round_trip(codec):
+    for event in (document_event(data={"nested": {"a": [1.5]}}, user_id="u"), ml_event(data={"lines": ["x"]})):
+        decoded = decode_event(encode_event(event, codec))
+        assert type(decoded) is type(event)
+        assert decoded == event
+
+
+def test_msgpack_returns_tuples_as_lists():
+    event = document_event(data={"pages": (1, 2)})
+    assert decode_event(encode_event(event, "msgpack")).data == {"pages": [1, 2]}
+
+
+def test_entries_written_before_codecs_are_still_read():
+    event = document_event()
+    assert decode_event(pickle.dumps(event)).uuid == event.uuid
+
+
+def test_msgpack_entries_are_tagged_with_their_codec():
+    assert encode_event(document_event(), "msgpack")[0] == get_codec("msgpack").codec_id
+
+
+def test_dropped_and_unknown_codecs_are_rejected():
+    assert available_codecs() == ["pickle", "msgpack"]
+    with pytest.raises(ValueError, match="Unknown event codec 'compact'"):
+        get_codec("compact")
+    with pytest.raises(ValueError, match="Unknown event codec id 0x1"):
+        decode_event(b"\x01payload")
+
+
+def test_codec_is_configured_per_stream(configure):
+    broker = configure(codecs={"fast": "msgpack"})
+    event = document_event(event_type=EventType.DOCUMENT_UPDATED)
+    produce_one("fast", event)
+    produce_one("other", event)
+    [(_, fast_fields)] = broker.xrange("fast")
+    [(_, other_fields)] = broker.xrange("other")
+    assert next(iter(fast_fields.values()))[0] == get_codec("msgpack").codec_id
+    assert next(iter(other_fields.values()))[0] == pickle.PROTO[0]
+    assert bytes_to_event(next(iter(fast_fields.values()))).event_type == EventType.DOCUMENT_UPDATED
+
+
+def test_unknown_configured_codec_fails_when_loading_the_config(configure):
+    configure(codecs={"s": "compact"})
+    with pytest.raises(ValueError):
+        RedisStream.get_stream_codecs()
@@ -0,0 +1,74 @@
+import pytest
+
+from aim_library.events.correlationindex import CorrelationIndex
+from aim_library.events.redisstream import (
+    BatchProducer,
+    RedisStream,
+    find_events,
+    produce_log,
+    produce_many,
+    produce_one,
+)
+
+from tests.factories import document_event, ml_event
+
+
+@pytest.fixture
+def indexed(configure):
+    return configure(
+        correlation_index={"exclude_streams": []},
+        log_sink={"flush_interval": 0.01},
+        retention={"streams": {"short": {"max_age": 3600.5}, "logs": {"maxlen": 1000}}},
+    )
+
+
+def test_every_producer_indexes_what_it_writes(indexed):
+    produce_one("a", document_event("DOC-1"))
+    produce_many("b", [ml_event("DOC-1"), document_event("DOC-2")])
+    with BatchProducer() as producer:
+        producer.produce("c", document_event("DOC-1"))
+    produce_log("logs", document_event("DOC-1"))
+    RedisStream.get_log_sink().close()
+
+    found = find_events("DOC-1")
+    assert [stream for stream, _, _ in found] == ["a", "b", "c", "logs"]
+    assert all(event.uuid for _, _, event in found)
+    assert [stream for stream, _, _ in find_events("DOC-1", streams=["b", "c"])] == ["b", "c"]
+    assert [event.document_id for _, _, event in find_events("DOC-2")] == ["DOC-2"]
+
+
+def test_trimmed_entries_are_dropped_from_the_index(indexed):
+    ids = [produce_one("a", document_event("DOC-1")) for _ in range(3)]
+    indexed.xdel("a", ids[0])
+    assert [id_ for _, id_, _ in find_events("DOC-1")] == [id_.decode() for id_ in ids[1:]]
+    index = RedisStream.get_correlation_index()
+    assert indexed.zcard(index.key("DOC-1")) == 2
+
+
+def test_index_lives_as_long_as_the_longest_retention(indexed):
+    index = RedisStream.get_correlation_index()
+    produce_one("short", document_event("DOC-1"))
+    assert indexed.ttl(index.key("DOC-1")) == 3601
+    produce_one("a", document_event("DOC-1"))
+    assert indexed.ttl(index.key("DOC-1")) == index.ttl
+    produce_one("short", document_event("DOC-1"))
+    assert indexed.ttl(index.key("DOC-1")) == index.ttl
+
+
+def test_index_keeps_the_latest_entries(broker):
+    index = CorrelationIndex(max_entries=2)
+    ids = [index.xadd(broker, "a", {"k": "v"}, "DOC-1") for _ in range(3)]
+    assert index.find(broker, "DOC-1") == [("a", id_.decode()) for id_ in ids[1:]]
+
+
+def test_excluded_streams_and_events_without_correlation_are_not_indexed(broker):
+    index = CorrelationIndex()
+    index.xadd(broker, "logs", {"k": "v"}, "DOC-1")
+    index.xadd(broker, "a", {"k": "v"}, "")
+    assert index.find(broker, "DOC-1") == []
+    assert broker.xlen("logs") == broker.xlen("a") == 1
+
+
+def test_lookup_needs_the_index(broker):
+    with pytest.raises(RuntimeError):
+        find_events("DOC-1")
@@ -0,0 +1,48 @@
+import time
+
+from aim_library.events import dedupe
+from aim_library.events.dedupe import DedupeWindow, make_dedupe_window, uuid_from_key
+from aim_library.events.events import EventType
+from aim_library.events.metrics import metrics
+from aim_library.events.redisstream import RedisStream, handle_messages, produce_one, set_consumer_context
+
+from tests.factories import RecordingHandler, document_event, read_entries
+
+
+def test_processed_uuids_are_seen_by_their_group_only(broker):
+    window = DedupeWindow(lambda: broker, window=60, bucket=10)
+    window.record("g", ["a", "b"])
+    assert window.seen("g", ["a", "c", "a"]) == {"a"}
+    assert window.seen("other", ["a"]) == set()
+
+
+def test_uuids_are_forgotten_once_the_window_passed(broker, monkeypatch):
+    now = [time.time()]  # The broker expires the buckets in real time
+    monkeypatch.setattr(dedupe, "time", lambda: now[0])
+    window = DedupeWindow(lambda: broker, window=60, bucket=10)
+    window.record("g", ["a"])
+    now[0] += 60
+    assert window.seen("g", ["a"]) == {"a"}
+    now[0] += 20
+    assert window.seen("g", ["a"]) == set()
+
+
+def test_redelivered_event_is_acknowledged_without_running_the_handler(broker):
+    RedisStream.set_dedupe_window(make_dedupe_window(lambda: broker, True))
+    set_consumer_context("c", "g")
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    event = document_event()
+    produce_one("s", event)
+    produce_one("s", event)  # e.g. produced again by a retry of its producer
+    handler = RecordingHandler()
+    handlers = {EventType.DOCUMENT_CREATED: handler}
+    for id_, fields in read_entries(broker, "s"):
+        handle_messages(broker, "s", "g", [(id_, fields)], [EventType.DOCUMENT_CREATED.name], handlers)
+    assert len(handler.events) == 1
+    assert broker.xpending("s", "g")["pending"] == 0
+    assert metrics.counter("duplicates_skipped_total", stream="s").value == 1
+
+
+def test_uuid_is_read_from_the_entry_key():
+    assert uuid_from_key(b"DOCUMENT_CREATED:DOC-EVENT-1") == "DOC-EVENT-1"
+    assert uuid_from_key("no-type") is None
@@ -0,0 +1,62 @@
+import pytest
+
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import group_by_event_type, handle_messages, produce_many
+from aim_library.events.workers import HandlerPool
+
+from tests.factories import RecordingHandler, document_event, ml_event, read_entries
+
+HANDLER_NAMES = [EventType.DOCUMENT_CREATED.name, EventType.TEXT_LINES_CLASSIFIED.name]
+
+
+def mixed_batch(broker) -> list:
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    events = [document_event("DOC-0"), ml_event("ML-0"), document_event("DOC-1"), ml_event("ML-1")]
+    ids = produce_many("s", events)
+    return list(zip(ids, events))
+
+
+def pending_ids(broker) -> list:
+    return [entry["message_id"] for entry in broker.xpending_range("s", "g", "-", "+", 100)]
+
+
+def test_events_are_grouped_by_type_in_order_of_first_appearance():
+    events = [document_event("DOC-0"), ml_event("ML-0"), document_event("DOC-1")]
+    groups = group_by_event_type(["1", "2", "3"], events, ["f1", "f2", "f3"])
+    assert [(ids, entries) for ids, _, entries in groups] == [(["1", "3"], ["f1", "f3"]), (["2"], ["f2"])]
+
+
+def test_each_type_goes_to_its_own_handler(broker):
+    mixed_batch(broker)
+    documents, ml = RecordingHandler("documents"), RecordingHandler("ml")
+    handlers = {EventType.DOCUMENT_CREATED: documents, EventType.TEXT_LINES_CLASSIFIED: ml}
+    assert handle_messages(broker, "s", "g", read_entries(broker, "s"), HANDLER_NAMES, handlers)
+    assert [e.document_id for e in documents.events] == ["DOC-0", "DOC-1"]
+    assert [e.source_id for e in ml.events] == ["ML-0", "ML-1"]
+    assert len(documents.calls) == len(ml.calls) == 1
+    assert pending_ids(broker) == []
+
+
+def test_a_failing_type_only_leaves_its_own_entries_pending(broker, emitted):
+    produced = mixed_batch(broker)
+    documents, ml = RecordingHandler("documents"), RecordingHandler("ml", fail=ValueError("boom"))
+    handlers = {EventType.DOCUMENT_CREATED: documents, EventType.TEXT_LINES_CLASSIFIED: ml}
+    with pytest.raises(ValueError):
+        handle_messages(broker, "s", "g", read_entries(broker, "s"), HANDLER_NAMES, handlers)
+    assert len(documents.events) == 2
+    assert pending_ids(broker) == [produced[1][0], produced[3][0]]  # The ML events
+
+
+def test_types_run_concurrently_on_a_pool_and_are_acknowledged_on_their_own(broker):
+    produced = mixed_batch(broker)
+    documents, ml = RecordingHandler("documents"), RecordingHandler("ml", fail=ValueError("boom"))
+    handlers = {EventType.DOCUMENT_CREATED: documents, EventType.TEXT_LINES_CLASSIFIED: ml}
+    pool = HandlerPool(broker, "g", workers=2)
+    try:
+        handle_messages(broker, "s", "g", read_entries(broker, "s"), HANDLER_NAMES, handlers, pool)
+        with pytest.raises(ValueError):
+            pool.drain()
+    finally:
+        pool.executor.shutdown()
+    assert len(documents.events) == 2
+    assert pending_ids(broker) == [produced[1][0], produced[3][0]]
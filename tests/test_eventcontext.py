@@ -0,0 +1,65 @@
+import pytest
+
+from aim_library.events.codecs import decode_event
+from aim_library.events.eventcontext import EventContext
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import (
+    correlations_context,
+    current_event_context,
+    digest_event,
+    event_context,
+    get_event_context,
+    produce_one,
+)
+
+from tests.factories import document_event
+
+
+def test_context_is_a_mapping_of_the_fields_set():
+    ctx = EventContext(correlation_id="DOC-1", stream_name="s", custom="value")
+    assert dict(ctx) == ctx.as_dict() == {"correlation_id": "DOC-1", "stream_name": "s", "custom": "value"}
+    assert "event_id" not in ctx and ctx.get("event_id", "none") == "none"
+    ctx["event_id"] = "1-0"
+    del ctx["custom"]
+    assert (len(ctx), ctx.event_id) == (3, "1-0")
+    with pytest.raises(KeyError):
+        ctx["handler"]
+
+
+def test_lineage_extends_the_parent_with_this_hop():
+    ctx = EventContext({"a": "1-0"}, [{"a": "1-0"}], {"b": "2-0"})
+    assert ctx.correlations == {"a": "1-0", "b": "2-0"}
+    assert ctx.causations == [{"a": "1-0"}, {"b": "2-0"}]
+    assert EventContext().correlations == {} and EventContext().causations == []
+
+
+def test_handler_sees_one_context_per_event_and_its_products(broker):
+    contexts = []
+
+    def handle(stream_name, event, event_id):
+        contexts.append(get_event_context())
+        produce_one("out", document_event())
+
+    event = document_event("DOC-1")
+    event.correlations = {"documents": "1-0"}
+    digest_event("s", event, b"5-0", {EventType.DOCUMENT_CREATED: handle})
+    digest_event("s", document_event("DOC-2"), b"6-0", {EventType.DOCUMENT_CREATED: handle})
+
+    first, second = contexts
+    assert first is not second
+    assert (first.correlation_id, first.event_id, first.handler) == ("DOC-1", "5-0", "handle")
+    assert first.end_time is not None
+    assert [produced["stream"] for produced in first.produced_events] == ["out"]
+    (_, fields), _ = broker.xrange("out")
+    produced = decode_event(next(iter(fields.values())))
+    assert produced.correlations == {"documents": "1-0", "s": b"5-0"}
+    assert produced.causations == [{"s": b"5-0"}]
+
+
+def test_deprecated_context_vars_read_the_event_context():
+    event_context.set(EventContext({"a": "1-0"}))
+    with pytest.warns(DeprecationWarning):
+        assert correlations_context.get() == {"a": "1-0"}
+    with pytest.warns(DeprecationWarning):
+        correlations_context.set({"b": "2-0"})
+    assert current_event_context().correlations == {"b": "2-0"}
@@ -0,0 +1,44 @@
+import copy
+import pickle
+from dataclasses import fields
+
+from aim_library.events.events import BaseEvent, DocumentEvent, EventType, MLEvent
+
+from tests.factories import document_event
+
+
+def test_fields_live_in_slots():
+    event = document_event("DOC-1", signature="sig")
+    assert event.__dict__ == {}
+    assert "document_id" in DocumentEvent.__slots__ and "uuid" not in DocumentEvent.__slots__  # Inherited
+    assert event.uuid and event.event_type is EventType.DOCUMENT_CREATED
+    event.note = "set by a handler"
+    assert event.__dict__ == {"note": "set by a handler"}
+
+
+def test_state_is_the_dict_events_had_before_slots():
+    event = document_event("DOC-1")
+    event.note = "extra"
+    state = event.__getstate__()
+    assert set(state) == {f.name for f in fields(DocumentEvent)} | {"note"}
+    assert state["document_id"] == "DOC-1"
+
+
+def test_pickles_round_trip_both_ways():
+    event = MLEvent(user_id="USER-1", source_id="DOC-1", data={"lines": [1, 2]})
+    event.note = "extra"
+    loaded = pickle.loads(pickle.dumps(event))
+    assert loaded == event and loaded.note == "extra"
+    assert copy.deepcopy(event) == event
+
+    # What a pickle of an event with an instance __dict__ restores, including an attribute dropped since
+    legacy = DocumentEvent.__new__(DocumentEvent)
+    legacy.__setstate__({**document_event("DOC-2").__getstate__(), "removed_field": 1})
+    assert legacy.document_id == "DOC-2" and legacy.__dict__ == {"removed_field": 1}
+
+
+def test_causations_keep_the_last_hops():
+    event = BaseEvent(causations=[{"a": "1-0"}, {"b": "2-0"}])
+    assert event.update_causations({"c": "3-0"}, limit=2) == [{"b": "2-0"}, {"c": "3-0"}]
+    assert len(event.update_causations({"c": "3-0"}, limit=0)) == 3
+    assert event.update_correlations({"c": "3-0"}) == {"c": "3-0"} and event.correlations == {}
@@ -0,0 +1,65 @@
+import time
+
+from aim_library.events.janitor import PelJanitor
+from aim_library.events.redisstream import produce_one
+from aim_library.events.retries import BackoffPolicy, RetryScheduler
+
+from tests.factories import document_event, entry_fields, read_entries
+
+
+def deliver(broker, stream: str, n: int, consumer: str = "c", times: int = 1) -> list:
+    ids = [produce_one(stream, document_event(f"DOC-{i}")) for i in range(n)]
+    read_entries(broker, stream, consumer=consumer)
+    for _ in range(times - 1):
+        broker.xreadgroup("g", consumer, {stream: "0"})  # Delivered again from the PEL
+    return ids
+
+
+def test_run_discards_entries_delivered_too_many_times(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    deliver(broker, "s", 3, times=3)
+    janitor = PelJanitor(broker, "g", "c", ["s"], max_retries=2, retry_after=60000)
+    janitor.run()
+    assert broker.xpending("s", "g")["pending"] == 0
+    assert janitor.stats()["streams"]["s"]["discarded"] == 3
+
+
+def test_discard_scan_resumes_where_the_previous_run_stopped(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    deliver(broker, "s", 3, times=3)
+    janitor = PelJanitor(broker, "g", "c", ["s"], max_retries=2, retry_after=60000, batch_size=1, scan_limit=2)
+    assert len(janitor.discard_max_retries("s")) == 2
+    assert len(janitor.discard_max_retries("s")) == 1
+    assert broker.xpending("s", "g")["pending"] == 0
+
+
+def test_idle_entries_of_other_consumers_are_claimed_across_calls(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    ids = deliver(broker, "s", 3, consumer="dead")
+    janitor = PelJanitor(broker, "g", "c", ["s"], max_retries=10, retry_after=0, interval=60, claim_count=2)
+    first = janitor.run()
+    assert [len(claimed) for _, claimed in first] == [2]
+    assert janitor.claim_backlog == {"s"}
+    # Not due again for a minute, but the claim that stopped at claim_count carries on
+    second = janitor.maybe_run()
+    claimed_ids = [id_ for _, claimed in first + second for id_, _ in claimed]
+    assert claimed_ids == ids
+    assert janitor.claim_backlog == set()
+    assert janitor.maybe_run() == []
+
+
+def test_recent_entries_are_left_to_their_consumer(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    deliver(broker, "s", 2, consumer="busy")
+    janitor = PelJanitor(broker, "g", "c", ["s"], max_retries=10, retry_after=60000)
+    assert janitor.run() == []
+
+
+def test_due_retries_are_handed_out_with_claimed_entries(broker):
+    retries = RetryScheduler(lambda: broker, default_policy=BackoffPolicy(base=0.01, jitter=0))
+    fields = entry_fields("s", document_event())
+    retries.schedule("g", "handle", [("s", b"1-0", fields)])
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    janitor = PelJanitor(broker, "g", "c", ["s"], max_retries=10, retry_after=60000, retries=retries)
+    time.sleep(0.02)
+    assert janitor.run() == [("s", [(b"1-0", fields)])]
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from aim_library.events.logsink import LogSink
+from aim_library.events.redisstream import RedisStream, produce_log
+
+from tests.factories import document_event, entry_fields
+
+
+# A broker factory that blocks the sink thread on its first batch until released.
+class StalledBroker:
+    def __init__(self, broker):
+        self.broker = broker
+        self.stalled = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.stalled.set()
+        self.release.wait(5)
+        return self.broker
+
+
+def test_logs_are_written_in_the_background_and_flushed_on_close(configure):
+    broker = configure(log_sink={"flush_interval": 0.01}, retention={"streams": {"logs": {"maxlen": 5}}})
+    for i in range(20):
+        produce_log("logs", document_event(f"DOC-{i}"))
+    sink = RedisStream.get_log_sink()
+    sink.close()
+    assert sink.stats()["sent"] == 20
+    assert broker.xlen("logs") == 5  # The retention of the stream applies
+
+
+@pytest.mark.parametrize("overflow, kept", [("drop_newest", "DOC-0"), ("drop_oldest", "DOC-2")])
+def test_full_queue_drops_by_policy(broker, overflow, kept):
+    stalled = StalledBroker(broker)
+    sink = LogSink(stalled, max_queue=3, overflow=overflow, sample_above=1, sample_rate=1)
+    sink.put("logs", entry_fields("logs", document_event("first")))
+    assert stalled.stalled.wait(5)
+    for i in range(5):
+        sink.put("logs", entry_fields("logs", document_event(f"DOC-{i}")))
+    stalled.release.set()
+    sink.close()
+    assert sink.stats()["dropped"] == 2
+    assert broker.xlen("logs") == 4
+    assert kept.encode() in b"".join(next(iter(fields.values())) for _, fields in broker.xrange("logs"))
+
+
+def test_priority_entries_are_never_sampled_out(broker):
+    sink = LogSink(lambda: broker, sample_above=0, sample_rate=0)
+    sink.put("logs", entry_fields("logs", document_event()))
+    sink.put("logs", entry_fields("logs", document_event()), priority=True)
+    sink.close()
+    assert sink.stats()["sampled_out"] == 1
+    assert broker.xlen("logs") == 1
+
+
+def test_unknown_overflow_policy(broker):
+    with pytest.raises(ValueError):
+        LogSink(lambda: broker, overflow="drop_all")
@@ -0,0 +1,100 @@
+import pytest
+from redis.exceptions import ResponseError
+
+from aim_library.events.benchmarks import AckTimingBroker, consume, numbered_events
+from aim_library.events.memorybroker import InMemoryBroker, install_memory_broker
+from aim_library.events.redisstream import RedisStream, produce_one
+
+from tests.factories import document_event
+
+
+def test_group_delivers_new_entries_then_keeps_them_pending():
+    broker = InMemoryBroker()
+    ids = [broker.xadd("s", {"n": i}) for i in range(3)]
+    broker.xgroup_create("s", "g", id="0")
+    assert [id_ for id_, _ in broker.xreadgroup("g", "a", {"s": ">"}, count=2)[0][1]] == ids[:2]
+    assert [id_ for id_, _ in broker.xreadgroup("g", "b", {"s": ">"})[0][1]] == ids[2:]
+    assert broker.xreadgroup("g", "a", {"s": ">"}) == []
+    history = broker.xreadgroup("g", "a", {"s": "0"})[0][1]
+    assert history == [(ids[0], {b"n": b"0"}), (ids[1], {b"n": b"1"})]
+    assert broker.xack("s", "g", ids[0], ids[0]) == 1
+    pending = broker.xpending("s", "g")
+    assert (pending["pending"], pending["min"]) == (2, ids[1])
+    assert broker.xinfo_groups("s")[0]["lag"] == 0
+
+
+def test_stream_commands_fail_like_redis():
+    broker = InMemoryBroker()
+    broker.xadd("s", {"k": "v"}, id="5-0")
+    with pytest.raises(ResponseError):
+        broker.xadd("s", {"k": "v"}, id="4-0")
+    broker.xgroup_create("s", "g")
+    with pytest.raises(ResponseError, match="BUSYGROUP"):
+        broker.xgroup_create("s", "g")
+    with pytest.raises(ResponseError):
+        broker.xgroup_create("missing", "g")
+    assert broker.xadd("missing", {"k": "v"}, nomkstream=True) is None
+
+
+def test_trimming_and_ranges():
+    broker = InMemoryBroker()
+    ids = [broker.xadd("s", {"n": i}, id=f"{i + 1}-0") for i in range(5)]
+    last = broker.xadd("s", {"n": 5}, maxlen=4)
+    assert broker.xlen("s") == 4
+    assert broker.xtrim("s", minid="4-0") == 1
+    assert [id_ for id_, _ in broker.xrange("s", "4", "5")] == ids[3:5]
+    assert broker.xrevrange("s", count=1) == [(last, {b"n": b"5"})]
+
+
+def test_idle_entries_are_autoclaimed_and_deleted_ones_dropped():
+    broker = InMemoryBroker()
+    ids = [broker.xadd("s", {"n": i}) for i in range(3)]
+    broker.xgroup_create("s", "g", id="0")
+    broker.xreadgroup("g", "gone", {"s": ">"})
+    broker.xdel("s", ids[1])
+    next_id, claimed, deleted = broker.xautoclaim("s", "g", "c", 0, count=10)
+    assert (next_id, [id_ for id_, _ in claimed], deleted) == (b"0-0", [ids[0], ids[2]], [ids[1]])
+    assert [entry["times_delivered"] for entry in broker.xpending_range("s", "g", "-", "+", 10)] == [2, 2]
+    assert broker.xautoclaim("s", "g", "c", 60000)[1] == []
+
+
+def test_keys_expire():
+    broker = InMemoryBroker()
+    broker.set("k", "v", ex=100)
+    assert broker.ttl("k") == 100 and broker.ttl("missing") == -2
+    broker.expireat("k", 0)
+    assert broker.get("k") is None
+
+
+def test_pipeline_runs_its_commands_together_and_raises_after():
+    broker = InMemoryBroker()
+    with broker.pipeline() as pipe:
+        pipe.set("k", "v").incr("n").hset("h", "f", 1)
+        assert len(pipe) == 3
+        assert pipe.execute() == [True, 1, 1]
+    pipe = broker.pipeline()
+    pipe.incr("n").xgroup_create("missing", "g").incr("n")
+    with pytest.raises(ResponseError):
+        pipe.execute()
+    assert broker.get("n") == b"3"
+
+
+def test_unknown_scripts_are_refused():
+    with pytest.raises(ResponseError):
+        InMemoryBroker().eval("return 1", 0)
+
+
+def test_installed_broker_serves_the_streams(broker):
+    assert RedisStream.get_broker() is broker
+    id_ = produce_one("s", document_event())
+    assert broker.xrange("s")[0][0] == id_
+    other = install_memory_broker(InMemoryBroker())
+    assert RedisStream.get_broker() is other and other.xlen("s") == 0
+
+
+def test_consumer_benchmark_acknowledges_every_event(configure):
+    configure()
+    broker = install_memory_broker(AckTimingBroker())
+    assert len({event.uuid for event in numbered_events(10)}) == 10
+    result = consume(broker, 20, 5, "pickle", timeout=10)
+    assert len(broker.acked_at) == 20 and result["events_per_s"] > 0
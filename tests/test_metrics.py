@@ -0,0 +1,60 @@
+import pytest
+
+from aim_library.events import metrics as metrics_module
+from aim_library.events.events import EventType
+from aim_library.events.metrics import Histogram, collect_group_stats, collect_pool_stats, metrics
+from aim_library.events.redisstream import handle_messages, produce_many
+
+from tests.factories import RecordingHandler, document_event, read_entries
+
+
+def test_handlers_are_timed_per_event_type(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(), document_event()])
+    handlers = {EventType.DOCUMENT_CREATED: RecordingHandler()}
+    handle_messages(broker, "s", "g", read_entries(broker, "s"), [EventType.DOCUMENT_CREATED.name], handlers)
+    exported = metrics.to_prometheus()
+    assert 'aim_events_processed_total{event_type="DOCUMENT_CREATED",outcome="ok"} 2' in exported
+    assert 'aim_handler_latency_seconds_count{event_type="DOCUMENT_CREATED"} 1' in exported
+    assert "# TYPE aim_ack_latency_seconds histogram" in exported
+
+
+def test_group_backlog_is_reported(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event() for _ in range(3)])
+    read_entries(broker, "s", count=1)
+    stats = collect_group_stats(broker, "g", ["s"])
+    assert stats["s"]["pending"] == 1
+    assert metrics.gauge("pending_entries", stream="s", group="g").value == 1
+    if stats["s"]["lag"] is not None:
+        assert stats["s"]["lag"] == 2
+
+
+def test_pool_counters_only_go_up_across_a_reset(monkeypatch):
+    monkeypatch.setattr(metrics_module, "_pool_totals", {})
+    totals = {"created": 5, "waits": 0, "wait_seconds": 0.0, "timeouts": 0}
+    pool = {"events-stream.broker": {**totals, "in_use": 2, "max_in_use": 3, "max_connections": None}}
+    monkeypatch.setattr(metrics_module, "pool_stats", lambda: pool)
+    collect_pool_stats()
+    pool["events-stream.broker"]["created"] = 7
+    collect_pool_stats()
+    pool["events-stream.broker"]["created"] = 1  # A new pool after a fork
+    collect_pool_stats()
+    assert metrics.counter("redis_pool_created_total", pool="events-stream.broker").value == 8
+    assert metrics.gauge("redis_pool_in_use", pool="events-stream.broker").value == 2
+    assert "redis_pool_max_connections" not in metrics.snapshot()
+
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float("inf")
+
+
+def test_a_name_keeps_its_kind():
+    metrics.counter("things")
+    with pytest.raises(ValueError):
+        metrics.gauge("things")
@@ -0,0 +1,43 @@
+from aim_library.events.events import EventType
+from aim_library.events.memorybroker import InMemoryBroker, install_memory_broker
+from aim_library.events.redisstream import order_streams, produce_one, start_redis_consumer
+
+from tests.factories import RecordingHandler, document_event
+
+STREAMS = ["high", "mid", "low"]
+
+
+class ReadCountingBroker(InMemoryBroker):
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def xreadgroup(self, groupname, consumername, streams, *args, **kwargs):
+        self.reads.append(list(streams))
+        return super().xreadgroup(groupname, consumername, streams, *args, **kwargs)
+
+
+def test_one_xreadgroup_per_poll_for_every_stream(configure, run_consumer):
+    configure()
+    broker = install_memory_broker(ReadCountingBroker())
+    for stream in STREAMS:
+        broker.xgroup_create(stream, "g", id="0", mkstream=True)
+    for stream in reversed(STREAMS):
+        produce_one(stream, document_event(stream))
+    handler = RecordingHandler()
+    config = {"name": "g", "streams": STREAMS, "batch_size": 1, "polling": "multi_stream", "block": 10}
+
+    error = run_consumer(
+        start_redis_consumer, config, {EventType.DOCUMENT_CREATED: handler}, done=lambda: len(handler.events) == 3
+    )
+
+    assert error is None
+    assert broker.reads and all(streams == STREAMS for streams in broker.reads)
+    # Produced last, read in the same poll: handled first all the same
+    assert [event.document_id for event in handler.events] == STREAMS
+    assert all(broker.xpending(stream, "g")["pending"] == 0 for stream in STREAMS)
+
+
+def test_weighted_ordering_keeps_configured_order_on_ties():
+    assert order_streams(STREAMS, "weighted", {"low": 5, "mid": 5}) == ["mid", "low", "high"]
+    assert order_streams(STREAMS, "priority") == STREAMS
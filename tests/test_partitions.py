@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import (
+    assign_partitions,
+    bytes_to_event,
+    deprioritize_partition,
+    partition_stream,
+    partition_streams,
+    produce_many,
+    start_redis_consumer,
+)
+
+from tests.factories import RecordingHandler, document_event
+
+PARTITIONS = ["s:{0}", "s:{1}", "s:{2}", "s:{3}"]
+
+
+def interleaved_events(documents: int = 6, per_document: int = 4) -> list:
+    return [
+        document_event(f"DOC-{d}", data={"seq": seq}) for seq in range(per_document) for d in range(documents)
+    ]
+
+
+def test_events_of_a_document_share_a_partition_in_order(configure):
+    broker = configure(partitions={"s": 4})
+    assert partition_streams("s") == PARTITIONS
+    events = interleaved_events()
+    produce_many("s", events)
+    found = defaultdict(list)
+    for stream in PARTITIONS:
+        for _, fields in broker.xrange(stream):
+            event = bytes_to_event(next(iter(fields.values())))
+            found[event.document_id].append((stream, event.data["seq"]))
+    assert len(found) == 6
+    for entries in found.values():
+        assert len({stream for stream, _ in entries}) == 1
+        assert [seq for _, seq in entries] == [0, 1, 2, 3]
+    assert broker.xlen("s") == 0
+
+
+def test_unpartitioned_streams_are_left_alone(configure):
+    configure(partitions={"s": 4})
+    assert partition_streams("other") == ["other"]
+    assert partition_stream("other", document_event()) == "other"
+
+
+def test_workers_split_the_partitions_and_share_unpartitioned_streams(configure):
+    configure(partitions={"s": 4})
+    config = {"name": "g", "streams": ["s", "other"], "worker_count": 2}
+    first = assign_partitions({**config, "worker_index": 0})["streams"]
+    second = assign_partitions({**config, "worker_index": 1})["streams"]
+    assert first == ["s:{0}", "s:{2}", "other"]
+    assert second == ["s:{1}", "s:{3}", "other"]
+
+
+def test_handled_partition_goes_after_its_siblings():
+    streams = ["high", "s:{0}", "s:{1}", "s:{2}", "low"]
+    assert deprioritize_partition(streams, "s:{0}") == ["high", "s:{1}", "s:{2}", "s:{0}", "low"]
+    assert deprioritize_partition(streams, "high") == streams
+
+
+def test_each_document_is_handled_in_order_by_a_single_worker(configure, run_consumer):
+    broker = configure(partitions={"s": 4})
+    for stream in PARTITIONS:
+        broker.xgroup_create(stream, "g", id="0", mkstream=True)
+    events = interleaved_events()
+    produce_many("s", events)
+    handled_by = {}
+    for worker in range(2):
+        handler = RecordingHandler()
+        config = {
+            "name": "g",
+            "streams": ["s"],
+            "batch_size": 10,
+            "polling": "multi_stream",
+            "block": 10,
+            "worker_index": worker,
+            "worker_count": 2,
+        }
+        owned = assign_partitions(config)["streams"]
+        expected = sum(broker.xlen(stream) for stream in owned)
+        error = run_consumer(
+            start_redis_consumer,
+            config,
+            {EventType.DOCUMENT_CREATED: handler},
+            consumer_id=f"w{worker}",
+            done=lambda: len(handler.events) >= expected,
+        )
+        assert error is None
+        assert len(handler.events) == expected
+        for event in handler.events:
+            handled_by.setdefault(event.document_id, []).append((worker, event.data["seq"]))
+    assert len(handled_by) == 6
+    for handled in handled_by.values():
+        assert len({worker for worker, _ in handled}) == 1
+        assert [seq for _, seq in handled] == [0, 1, 2, 3]
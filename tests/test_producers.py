@@ -0,0 +1,67 @@
+import time
+
+from aim_library.events.redisstream import BatchProducer, RedisStream, current_event_context, produce_many, produce_one
+
+from tests.factories import document_event
+
+
+# Counts round trips: every command sent directly and every pipeline executed.
+class CountingBroker:
+    def __init__(self, broker):
+        self.broker = broker
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        self.round_trips += 1
+        return getattr(self.broker, name)
+
+    def pipeline(self, transaction=True):
+        pipe = self.broker.pipeline(transaction)
+        execute = pipe.execute
+
+        def counted():
+            self.round_trips += 1
+            return execute()
+
+        pipe.execute = counted
+        return pipe
+
+
+def test_produce_many_sends_one_pipeline_in_order(broker):
+    counting = CountingBroker(broker)
+    RedisStream.set_broker(counting)
+    events = [document_event(f"DOC-{i}") for i in range(20)]
+    ids = produce_many("s", events)
+    assert counting.round_trips == 1
+    assert [id_ for id_, _ in broker.xrange("s")] == ids
+    assert produce_many("s", []) == []
+
+
+def test_produced_ids_are_reported_in_the_handler_log(broker):
+    ctx = current_event_context()
+    one = produce_one("s", document_event())
+    many = produce_many("t", [document_event(), document_event()])
+    assert [(p["stream"], p["redis_id"]) for p in ctx.produced_events] == [
+        ("s", one.decode()),
+        ("t", many[0].decode()),
+        ("t", many[1].decode()),
+    ]
+
+
+def test_batch_producer_flushes_when_full_and_on_exit(broker):
+    with BatchProducer(max_batch_size=3, max_delay=60) as producer:
+        for i in range(4):
+            producer.produce("s", document_event(f"DOC-{i}"))
+        assert broker.xlen("s") == 3 and len(producer) == 1
+    assert broker.xlen("s") == 4
+    assert len(producer.produced_ids) == 4
+
+
+def test_batch_producer_flushes_a_batch_that_stopped_growing(broker):
+    producer = BatchProducer(max_batch_size=100, max_delay=0.02)
+    producer.produce("s", document_event())
+    assert broker.xlen("s") == 0
+    deadline = time.monotonic() + 2
+    while broker.xlen("s") == 0 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert broker.xlen("s") == 1 and len(producer) == 0
@@ -0,0 +1,49 @@
+import pytest
+import redis
+
+from aim_library.utils import redisclients
+from aim_library.utils.redisclients import get_async_redis_client, get_redis_client, make_pool, pool_stats
+
+CONFIG = {"host": "localhost", "port": 6379, "db": 0, "password": None}
+
+
+@pytest.fixture(autouse=True)
+def no_clients():
+    redisclients.reset_clients()
+    yield
+    redisclients.reset_clients()
+
+
+# Connections that never touch the network, to exercise the pool alone.
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(redis.connection.Connection, "connect", lambda self: None)
+    monkeypatch.setattr(redis.connection.Connection, "can_read", lambda self, timeout=0: False)
+
+
+def test_pools_are_unbounded_unless_capped():
+    assert isinstance(make_pool(CONFIG), redisclients.InstrumentedConnectionPool)
+    assert not isinstance(make_pool(CONFIG), redis.BlockingConnectionPool)
+    bounded = make_pool({**CONFIG, "pool": {"max_connections": 4, "timeout": 1}})
+    assert isinstance(bounded, redisclients.InstrumentedBlockingConnectionPool)
+    assert (bounded.max_connections, bounded.timeout) == (4, 1)
+    assert isinstance(make_pool(CONFIG, asyncio=True), redisclients.InstrumentedAsyncConnectionPool)
+
+
+def test_one_client_per_section():
+    client = get_redis_client("events-stream", "broker", config=CONFIG)
+    assert get_redis_client("events-stream", "broker") is client
+    assert get_async_redis_client("events-stream", "broker", config=CONFIG) is not client
+    assert set(pool_stats()) == {"events-stream.broker", "events-stream.broker.async"}
+    assert pool_stats()["events-stream.broker"]["max_connections"] is None
+
+
+def test_bounded_pool_counts_checkouts_and_timeouts(offline):
+    pool = make_pool({**CONFIG, "pool": {"max_connections": 1, "timeout": 0.01}})
+    connection = pool.get_connection("PING")
+    with pytest.raises(redis.ConnectionError):
+        pool.get_connection("PING")
+    pool.release(connection)
+    pool.release(pool.get_connection("PING"))
+    stats = pool.stats.as_dict()
+    assert (stats["created"], stats["in_use"], stats["max_in_use"], stats["timeouts"]) == (1, 0, 1, 1)
@@ -0,0 +1,53 @@
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import produce_many
+from aim_library.events.replay import CHECKPOINTS_KEY, clear_checkpoint, get_checkpoint, replay, scan_stream
+
+from tests.factories import document_event, ml_event
+
+
+def produce_mixed() -> list:
+    events = [document_event("DOC-1"), ml_event("DOC-1"), document_event("DOC-2"), document_event("DOC-1")]
+    return produce_many("dead-letter:s", events)
+
+
+def test_matching_entries_go_back_unchanged(broker):
+    ids = produce_mixed()
+    summary = replay(
+        "dead-letter:s",
+        target_stream="s",
+        event_types=[EventType.DOCUMENT_CREATED],
+        filters={"document_id": "DOC-1"},
+        page_size=2,
+    )
+    assert (summary["scanned"], summary["matched"], summary["produced"]) == (4, 2, 2)
+    source = dict(broker.xrange("dead-letter:s"))
+    assert [fields for _, fields in broker.xrange("s")] == [source[ids[0]], source[ids[3]]]
+
+
+def test_dry_run_only_counts(broker):
+    produce_mixed()
+    summary = replay("dead-letter:s", target_stream="s", dry_run=True)
+    assert summary["matched"] == 4 and summary["produced"] == 0
+    assert broker.xlen("s") == 0
+
+
+def test_replay_into_the_scanned_stream_stops_at_its_end(broker):
+    produce_mixed()
+    assert replay("dead-letter:s", page_size=1)["produced"] == 4
+    assert broker.xlen("dead-letter:s") == 8
+
+
+def test_interrupted_replay_resumes_after_its_checkpoint(broker):
+    ids = produce_mixed()
+    broker.hset(CHECKPOINTS_KEY, mapping={"run": ids[1], "run:end": ids[2]})  # Stopped after the second page
+    summary = replay("dead-letter:s", target_stream="s", checkpoint="run", page_size=2)
+    assert summary["produced"] == 1 and summary["last_id"] == ids[2].decode()
+    assert get_checkpoint("run") == (ids[2], ids[2])
+    clear_checkpoint("run")
+    assert replay("dead-letter:s", target_stream="s", checkpoint="run")["produced"] == 4
+
+
+def test_scan_yields_decoded_matches(broker):
+    ids = produce_mixed()
+    found = list(scan_stream("dead-letter:s", filters={"document_id": "DOC-2"}))
+    assert [(id_, event.document_id) for id_, event in found] == [(ids[2], "DOC-2")]
@@ -0,0 +1,52 @@
+from aim_library.events.memorybroker import InMemoryBroker
+from aim_library.events.redisstream import produce_many, produce_one
+from aim_library.events.retention import (
+    Retention,
+    RetentionPolicy,
+    StreamTrimmer,
+    make_retention,
+    make_stream_trimmer,
+)
+
+from tests.factories import document_event
+
+
+def test_policies_by_stream_and_partition(broker):
+    retention = make_retention({"streams": {"s": 10, "default": {"max_age": 60}}})
+    assert retention.xadd_args("s:{3}") == {"maxlen": 10, "approximate": True}
+    assert retention.xadd_args("other") == {"maxlen": None, "approximate": True}
+    assert retention.xadd_args("s", maxlen=5) == {"maxlen": 5, "approximate": False}  # The producer's own maxlen
+    assert retention.trimmed_streams(["other"]) == ["s", "other"]
+
+
+def test_only_logs_are_trimmed_without_config():
+    retention = make_retention(None)
+    assert retention.policy("logs").maxlen == 1000 and not retention.policy("s").trims()
+    assert make_stream_trimmer(InMemoryBroker, retention, {"enabled": False}) is None
+
+
+def test_producers_apply_the_maxlen(configure):
+    broker = configure(retention={"streams": {"s": {"maxlen": 3, "approximate": False}}})
+    produce_many("s", [document_event() for _ in range(4)])
+    produce_one("s", document_event())
+    assert broker.xlen("s") == 3
+
+
+def test_old_entries_are_trimmed_unless_undelivered(broker):
+    ids = [broker.xadd("s", {"n": i}, id=f"{i + 1}-0") for i in range(4)]
+    broker.xgroup_create("s", "g", id=ids[1])  # Has not read the last two entries yet
+    trimmer = StreamTrimmer(lambda: broker, Retention({"s": RetentionPolicy(max_age=60)}), batch_size=1)
+    assert trimmer.run() == {"s": 2}
+    assert [id_ for id_, _ in broker.xrange("s")] == ids[2:]
+
+    broker.xgroup_setid("s", "g", "$")
+    assert trimmer.run() == {}  # Another run within the interval: the lock is still held
+    broker.delete("events:trim:s")
+    assert trimmer.run() == {"s": 2} and trimmer.trimmed == {"s": 4}
+
+
+def test_every_process_shares_the_lock(broker):
+    retention = Retention({"s": RetentionPolicy(maxlen=0, approximate=False)})
+    broker.xadd("s", {"n": 0})
+    first, second = (StreamTrimmer(lambda: broker, retention) for _ in range(2))
+    assert first.run() == {"s": 1} and second.run() == {}
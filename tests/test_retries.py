@@ -0,0 +1,101 @@
+import time
+
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import RedisStream, handle_messages, produce_one, set_consumer_context
+from aim_library.events.retries import DEAD_LETTER, SCHEDULED, BackoffPolicy, RetryScheduler
+
+from tests.factories import RecordingHandler, document_event, entry_fields, read_entries
+
+FAST = {"base": 0.01, "factor": 1, "jitter": 0, "max_attempts": 2}
+
+
+def scheduler(broker, **kwargs) -> RetryScheduler:
+    return RetryScheduler(lambda: broker, default_policy=BackoffPolicy(**FAST), **kwargs)
+
+
+def test_retry_is_handed_back_with_its_original_bytes(broker):
+    retries = scheduler(broker)
+    fields = entry_fields("s", document_event())
+    [(outcome, due)] = retries.schedule("g", "handle", [("s", b"1-0", fields)])
+    assert outcome == SCHEDULED and due > time.time()
+    assert retries.take_due("g", ["s"]) == []
+    time.sleep(0.02)
+    assert retries.take_due("g", ["s"]) == [("s", [(b"1-0", fields)])]
+    assert retries.stats("g", ["s"]) == {"scheduled": 0, "processing": 1}
+
+
+def test_retries_only_go_back_to_their_group(broker):
+    retries = scheduler(broker)
+    retries.schedule("g", "handle", [("s", b"1-0", entry_fields("s", document_event()))])
+    time.sleep(0.02)
+    assert retries.take_due("other", ["s"]) == []
+    assert retries.take_due("g", ["other-stream"]) == []
+
+
+def test_acked_retry_frees_its_payload(broker):
+    retries = scheduler(broker)
+    retries.schedule("g", "handle", [("s", b"1-0", entry_fields("s", document_event()))])
+    time.sleep(0.02)
+    retries.take_due("g", ["s"])
+    retries.acked("g", "s", [b"1-0"])
+    assert retries.stats("g", ["s"]) == {"scheduled": 0, "processing": 0}
+    assert broker.hgetall(retries.payloads_key("g")) == {}
+
+
+def test_retry_whose_lease_ran_out_is_taken_again(broker):
+    retries = scheduler(broker, lease=0.05)
+    fields = entry_fields("s", document_event())
+    retries.schedule("g", "handle", [("s", b"1-0", fields)])
+    time.sleep(0.02)
+    assert retries.take_due("g", ["s"])
+    assert retries.take_due("g", ["s"]) == []  # Still leased
+    time.sleep(0.06)
+    assert retries.take_due("g", ["s"]) == [("s", [(b"1-0", fields)])]
+
+
+def test_entry_out_of_attempts_goes_to_the_dead_letter_stream_unchanged(broker):
+    retries = scheduler(broker)
+    fields = entry_fields("s", document_event())
+    outcomes = []
+    for _ in range(3):  # Each retry is taken, then fails again
+        outcomes.append(retries.schedule("g", "handle", [("s", b"1-0", fields)])[0][0])
+        time.sleep(0.02)
+        retries.take_due("g", ["s"])
+    assert outcomes == [SCHEDULED, SCHEDULED, DEAD_LETTER]
+    [(_, dead_letter_fields)] = broker.xrange("dead-letter:s")
+    assert dead_letter_fields == fields
+    assert broker.hgetall(retries.payloads_key("g")) == {}
+    assert retries.stats("g", ["s"]) == {"scheduled": 0, "processing": 0}
+
+
+def test_handler_policy_overrides_the_default(broker):
+    retries = scheduler(broker, policies={"flaky": BackoffPolicy(max_attempts=0)})
+    fields = entry_fields("s", document_event())
+    assert retries.schedule("g", "flaky", [("s", b"1-0", fields)])[0][0] == DEAD_LETTER
+    assert retries.schedule("g", "handle", [("s", b"2-0", fields)])[0][0] == SCHEDULED
+
+
+def test_failing_handler_schedules_a_retry_and_acknowledges_the_entry(configure, emitted):
+    broker = configure(retry={"default": FAST})
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    set_consumer_context("c", "g")
+    event = document_event()
+    produce_one("s", event)
+    failing = RecordingHandler(fail=ValueError("boom"))
+    handlers = {EventType.DOCUMENT_CREATED: failing}
+    [(id_, fields)] = read_entries(broker, "s")
+
+    handle_messages(broker, "s", "g", [(id_, fields)], [EventType.DOCUMENT_CREATED.name], handlers)
+
+    assert broker.xpending("s", "g")["pending"] == 0
+    assert isinstance(emitted[-1].value, ValueError)
+    retries = RedisStream.get_retry_scheduler()
+    time.sleep(0.02)
+    [(stream, due)] = retries.take_due("g", ["s"])
+    assert stream == "s" and due == [(id_, fields)]
+
+    succeeding = RecordingHandler()
+    handle_messages(broker, "s", "g", due, [EventType.DOCUMENT_CREATED.name], {EventType.DOCUMENT_CREATED: succeeding})
+    assert [e.uuid for e in succeeding.events] == [event.uuid]
+    assert retries.stats("g", ["s"]) == {"scheduled": 0, "processing": 0}
+    assert broker.hgetall(retries.payloads_key("g")) == {}
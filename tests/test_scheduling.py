@@ -0,0 +1,86 @@
+from aim_library.events.events import EventType
+from aim_library.events.redisstream import handle_messages, produce_many, release_deferred
+from aim_library.events.scheduling import TenantLimiter, WeightedRoundRobin, make_stream_scheduler
+
+from tests.factories import RecordingHandler, document_event, read_entries
+
+HANDLER_NAMES = [EventType.DOCUMENT_CREATED.name]
+
+
+def serve(scheduler: WeightedRoundRobin, turns: int, empty=()) -> list:
+    served = []
+    for _ in range(turns):
+        stream = next(s for s in scheduler.order() if s not in empty)
+        scheduler.served(stream)
+        served.append(stream)
+    return served
+
+
+def admit(limiter: TenantLimiter, events: list) -> list:
+    ids = [f"{i}-0".encode("utf-8") for i in range(len(events))]
+    return limiter.admit("s", ids, events, [1] * len(events), [{}] * len(events))
+
+
+def test_streams_are_served_by_weight_interleaved():
+    served = serve(WeightedRoundRobin(["a", "b"], {"a": 3, "b": 1}), 8)
+    assert served.count("a") == 6 and served.count("b") == 2
+    assert "aaaa" not in "".join(served)
+
+
+def test_partitions_take_the_weight_of_their_stream():
+    served = serve(WeightedRoundRobin(["s:{0}", "s:{1}", "low"], {"s": 2}), 10)
+    assert served.count("low") == 2
+
+
+def test_empty_streams_do_not_use_up_turns():
+    scheduler = WeightedRoundRobin(["a", "b"], {"a": 1, "b": 1})
+    assert serve(scheduler, 100, empty={"a"}) == ["b"] * 100
+    # The credit "a" built meanwhile and the debt of "b" are capped at one round: "b" isn't starved now
+    assert serve(scheduler, 6) == ["a", "a", "b", "a", "b", "a"]
+
+
+def test_round_robin_is_only_used_when_configured():
+    assert make_stream_scheduler({"stream_ordering": "priority"}, ["a"]) is None
+    assert isinstance(make_stream_scheduler({"stream_ordering": "weighted_round_robin"}, ["a"]), WeightedRoundRobin)
+
+
+def test_a_flooding_tenant_is_deferred_without_holding_back_others():
+    limiter = TenantLimiter(rate=0.001, burst=2, tenant_key="user_id")
+    flood = [document_event(f"DOC-{i}", user_id="org-a") for i in range(5)]
+    other = [document_event("DOC-b", user_id="org-b"), document_event("DOC-none")]
+    admitted = admit(limiter, flood + other)
+    assert [event.document_id for _, event, _, _ in admitted] == ["DOC-0", "DOC-1", "DOC-b", "DOC-none"]
+    assert limiter.deferred_count == 3
+    assert limiter.release() == []
+    [(stream, released)] = limiter.release(drain=True)
+    assert stream == "s" and [event.document_id for _, event, _, _ in released] == ["DOC-2", "DOC-3", "DOC-4"]
+    assert limiter.deferred_count == 0
+
+
+def test_deferred_events_go_once_overdue():
+    limiter = TenantLimiter(rate=0.001, burst=1, tenant_key="user_id", max_delay=0)
+    admit(limiter, [document_event(f"DOC-{i}", user_id="org-a") for i in range(3)])
+    [(_, released)] = limiter.release()
+    assert len(released) == 2
+
+
+def test_tenant_with_its_own_limits():
+    limiter = TenantLimiter(rate=0.001, burst=1, tenants={"big": {"rate": 0.001, "burst": 3}}, tenant_key="user_id")
+    assert len(admit(limiter, [document_event(user_id="big") for _ in range(4)])) == 3
+
+
+def test_fully_deferred_messages_stay_pending_until_released(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(f"DOC-{i}", user_id="org-a") for i in range(3)])
+    limiter = TenantLimiter(rate=0.001, burst=1, tenant_key="user_id")
+    limiter.bucket("org-a").take()  # Used up by an earlier batch
+    handler = RecordingHandler()
+    handlers = {EventType.DOCUMENT_CREATED: handler}
+
+    handled = handle_messages(broker, "s", "g", read_entries(broker, "s"), HANDLER_NAMES, handlers, tenants=limiter)
+
+    assert handled is False  # The stream scheduler isn't charged a turn for it
+    assert handler.calls == [] and broker.xpending("s", "g")["pending"] == 3
+    release_deferred(broker, "g", handlers, limiter, drain=True)
+    assert [event.document_id for event in handler.events] == ["DOC-0", "DOC-1", "DOC-2"]
+    assert broker.xpending("s", "g")["pending"] == 0
@@ -0,0 +1,81 @@
+import threading
+
+from aim_library.utils import status
+from aim_library.utils.status import InMemoryStatusClient, StatusDispatcher, set_document_status
+
+
+class FlakyStatusClient(InMemoryStatusClient):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self._lock = threading.Lock()
+
+    def update_document_status(self, **update):
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("unavailable")
+        super().update_document_status(**update)
+
+
+def update(document_id: str, status_: str) -> dict:
+    return dict(document_id=document_id, status=status_, description="", organization="org", meta="")
+
+
+def test_updates_of_a_document_are_coalesced_and_sent_on_one_client():
+    client = InMemoryStatusClient()
+    factory_calls = []
+    dispatcher = StatusDispatcher(lambda: factory_calls.append(1) or client, flush_interval=0.2)
+    try:
+        dispatcher.submit(**update("DOC-1", "STARTED"))
+        dispatcher.submit(**update("DOC-1", "DONE"))
+        dispatcher.submit(**update("DOC-2", "STARTED"))
+        dispatcher.flush()
+        dispatcher.submit(**update("DOC-3", "STARTED"))
+        dispatcher.flush()
+    finally:
+        dispatcher.close()
+    assert [(u["document_id"], u["status"]) for u in client.updates] == [
+        ("DOC-1", "DONE"),
+        ("DOC-2", "STARTED"),
+        ("DOC-3", "STARTED"),
+    ]
+    assert factory_calls == [1]
+    assert dispatcher.stats()["coalesced"] == 1
+
+
+def test_failed_updates_are_retried_together():
+    client = FlakyStatusClient(failures=2)
+    dispatcher = StatusDispatcher(lambda: client, flush_interval=0.01, retry_delay=0.01, retries=3)
+    try:
+        for i in range(3):
+            dispatcher.submit(**update(f"DOC-{i}", "DONE"))
+        dispatcher.flush()
+    finally:
+        dispatcher.close()
+    assert sorted(u["document_id"] for u in client.updates) == ["DOC-0", "DOC-1", "DOC-2"]
+    assert dispatcher.stats()["sent"] == 3 and dispatcher.stats()["failed"] == 0
+
+
+def test_oldest_update_is_dropped_when_too_many_are_pending():
+    client = InMemoryStatusClient()
+    dispatcher = StatusDispatcher(lambda: client, max_pending=2, flush_interval=0.2)
+    try:
+        for i in range(3):
+            dispatcher.submit(**update(f"DOC-{i}", "DONE"))
+        dispatcher.flush()
+    finally:
+        dispatcher.close()
+    assert [u["document_id"] for u in client.updates] == ["DOC-1", "DOC-2"]
+
+
+def test_set_document_status_goes_through_the_dispatcher():
+    client = InMemoryStatusClient()
+    previous = status.set_status_dispatcher(StatusDispatcher(lambda: client, flush_interval=0.01))
+    try:
+        set_document_status("DOC-1", "DONE", "", "org", "")
+        status.get_status_dispatcher().flush()
+        status.get_status_dispatcher().close()
+    finally:
+        status.set_status_dispatcher(previous)
+    assert client.updates == [update("DOC-1", "DONE")]
@@ -0,0 +1,59 @@
+from aim_library.events.redisstream import produce_many
+from aim_library.events.supervisor import ConsumerSupervisor, reap_dead_consumers, stable_consumer_name
+
+from tests.factories import document_event, read_entries
+
+
+class ExitedProcess:
+    exitcode = 1
+
+    def is_alive(self) -> bool:
+        return False
+
+
+def supervisor(monkeypatch, **kwargs) -> ConsumerSupervisor:
+    supervisor = ConsumerSupervisor({"name": "g", "streams": ["s"]}, {}, **kwargs)
+    monkeypatch.setattr(supervisor, "start_worker", lambda index: supervisor.started.append(index))
+    supervisor.started = []
+    return supervisor
+
+
+def test_consumer_names_are_stable_per_worker(monkeypatch):
+    monkeypatch.setenv("HOSTNAME", "pod-a")
+    assert stable_consumer_name("g", 1) == "pod-a-1"
+    assert ConsumerSupervisor({"name": "g", "streams": ["s"]}, {}, workers=2).consumer_names == ["pod-a-0", "pod-a-1"]
+
+
+def test_workers_of_every_pod_share_the_partitions():
+    config = {"name": "g", "streams": ["s"], "pod_index": 1, "pods": 2, "metrics_port": 9000}
+    worker = ConsumerSupervisor(config, {}, workers=3).worker_config(2)
+    assert (worker["worker_index"], worker["worker_count"], worker["metrics_port"]) == (5, 6, 9002)
+
+
+def test_crashing_worker_is_restarted_with_backoff(monkeypatch):
+    workers = supervisor(monkeypatch, workers=2, restart_delay=0, max_restart_delay=60)
+    workers.check_workers()
+    assert workers.started == [0, 1]
+    workers.processes = [ExitedProcess(), None]
+    workers.started_at[0] = workers.started_at[1] = float("inf")  # Crashed right after starting
+    workers.check_workers()
+    assert workers.started == [0, 1, 0, 1] and workers.restarts == [1, 0]
+
+    workers = supervisor(monkeypatch, restart_delay=30, max_restart_delay=60)
+    workers.processes = [ExitedProcess()]
+    workers.started_at[0] = float("inf")
+    workers.check_workers()
+    assert workers.started == [] and workers.restarts == [1]  # Waits restart_delay first
+
+
+def test_dead_consumers_hand_their_entries_over(broker):
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(), document_event()])
+    read_entries(broker, "s", consumer="gone", count=1)
+    read_entries(broker, "s", consumer="pod-a-1", count=1)
+    reaped = reap_dead_consumers(broker, "g", ["s"], "pod-a-0", ["pod-a-0", "pod-a-1"], dead_after=0, retry_after=0)
+    assert reaped == {"s": ["gone"]}
+    owners = sorted(entry["consumer"] for entry in broker.xpending_range("s", "g", "-", "+", 10))
+    assert owners == [b"pod-a-0", b"pod-a-1"]
+    names = [consumer["name"] for consumer in broker.xinfo_consumers("s", "g")]
+    assert b"gone" not in names
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from aim_library.events.redisstream import produce_many
+from aim_library.events.workers import AckTracker, HandlerPool, make_handler_pool
+
+from tests.factories import document_event, read_entries
+
+
+def delivered(broker, n: int) -> list:
+    broker.xgroup_create("s", "g", id="0", mkstream=True)
+    produce_many("s", [document_event(f"DOC-{i}") for i in range(n)])
+    return [id_ for id_, _ in read_entries(broker, "s")]
+
+
+def pending(broker) -> list:
+    return [entry["message_id"] for entry in broker.xpending_range("s", "g", "-", "+", 100)]
+
+
+def test_finished_entries_are_acknowledged_in_batches(broker):
+    ids = delivered(broker, 3)
+    acks = AckTracker(broker, "g", batch_size=2, interval=60)
+    acks.finished("s", ids[:1])
+    acks.maybe_flush()
+    assert pending(broker) == ids
+    acks.finished("s", ids[1:])
+    acks.maybe_flush()
+    assert pending(broker) == []
+
+
+def test_pool_keeps_at_most_max_in_flight(broker):
+    ids = delivered(broker, 6)
+    release, running, peak = threading.Event(), [], []
+    lock = threading.Lock()
+
+    def handle():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        release.wait(1)
+        with lock:
+            running.pop()
+
+    pool = HandlerPool(broker, "g", workers=4, max_in_flight=2)
+    threading.Timer(0.05, release.set).start()
+    for id_ in ids:
+        pool.submit("s", [id_], handle)
+    pool.shutdown()
+    assert max(peak) <= 2
+    assert pending(broker) == []
+
+
+def test_failed_entry_stays_pending_and_the_others_are_acknowledged(broker):
+    ids = delivered(broker, 3)
+
+    def handle(fail):
+        if fail:
+            raise ValueError("boom")
+
+    pool = HandlerPool(broker, "g", workers=2)
+    for id_, fail in zip(ids, (False, True, False)):
+        pool.submit("s", [id_], handle, fail)
+    with pytest.raises(ValueError):
+        pool.drain()
+    pool.executor.shutdown()
+    assert pending(broker) == [ids[1]]
+
+
+def test_pool_is_only_made_when_configured(broker):
+    assert make_handler_pool(broker, {"name": "g"}) is None
+    with pytest.raises(ValueError):
+        make_handler_pool(broker, {"name": "g", "executor": {"type": "fiber"}})